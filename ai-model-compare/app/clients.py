@@ -12,6 +12,7 @@ import httpx
 from .config import settings
 import logging
 from .formatting import normalize_single_line
+from .quota import acquire_quota, settle_quota
 
 
 async def call_ragflow_with_image(image_bytes: bytes, filename: str) -> str:
@@ -33,6 +34,7 @@ async def call_ragflow_with_image(image_bytes: bytes, filename: str) -> str:
 				image_bytes=image_bytes,
 				filename=filename,
 				system_prompt=system_prompt,
+				provider="ragflow",
 			)
 		except Exception:
 			pass
@@ -47,6 +49,7 @@ async def call_ragflow_with_image(image_bytes: bytes, filename: str) -> str:
 			image_bytes=image_bytes,
 			filename=filename,
 			system_prompt=system_prompt,
+			provider="fallback",
 		)
 
 	raise RuntimeError("No RagFlow or fallback OpenAI-compatible endpoint configured")
@@ -59,8 +62,12 @@ async def _call_openai_like(
 	image_bytes: bytes,
 	filename: str,
 	system_prompt: str,
+	provider: str = "",
 ) -> str:
-	"""Call an OpenAI-compatible chat.completions API that supports image_url/base64."""
+	"""Call an OpenAI-compatible chat.completions API that supports image_url/base64.
+
+	Each request first draws from the shared per-key quota (see app/quota.py).
+	"""
 	# We encode the image as base64 data URL
 	b64 = base64.b64encode(image_bytes).decode("utf-8")
 	data_url = f"data:image/{_suffix_of(filename)};base64,{b64}"
@@ -122,6 +129,8 @@ async def _call_openai_like(
 			]
 		last_error: Optional[Exception] = None
 		for path in path_candidates:
+			quota_key, estimated = await acquire_quota(provider, api_key, user_text)
+			data = None
 			try:
 				_log_outgoing_request(lower, path, headers, payload)
 				resp = await client.post(path, json=payload, headers=headers)
@@ -144,6 +153,8 @@ async def _call_openai_like(
 					pass
 				last_error = e
 				continue
+			finally:
+				await settle_quota(quota_key, estimated, data)
 		raise RuntimeError(f"No compatible chat.completions path succeeded: {last_error}")
 
 
@@ -155,6 +166,7 @@ async def _call_openai_like_with_user_text(
 	filename: str,
 	system_prompt: str,
 	user_text: str,
+	provider: str = "",
 ) -> str:
 	"""Same as _call_openai_like but allows custom user text in addition to image."""
 	b64 = base64.b64encode(image_bytes).decode("utf-8")
@@ -214,6 +226,8 @@ async def _call_openai_like_with_user_text(
 		last_error: Optional[Exception] = None
 		error_details = []
 		for path in path_candidates:
+			quota_key, estimated = await acquire_quota(provider, api_key, combined_text)
+			data = None
 			try:
 				_log_outgoing_request(lower, path, headers, payload)
 				resp = await client.post(path, json=payload, headers=headers)
@@ -234,6 +248,8 @@ async def _call_openai_like_with_user_text(
 				last_error = e
 				error_details.append((path, type(e).__name__, str(e)))
 				continue
+			finally:
+				await settle_quota(quota_key, estimated, data)
 		
 		# Only log detailed error after all paths have failed
 		if error_details:
@@ -280,6 +296,7 @@ async def compare_multiple_models(
 				filename=filename,
 				system_prompt=system_prompt,
 				user_text=user_prompt,
+				provider=provider,
 			)
 			elapsed = int((perf_counter() - start) * 1000)
 			return {
@@ -361,6 +378,7 @@ async def compare_across_providers(
 				filename=filename,
 				system_prompt=system_prompt,
 				user_text=user_prompt,
+				provider=provider,
 			)
 			elapsed = int((perf_counter() - start) * 1000)
 			return {"ok": True, "text": text, "elapsed_ms": elapsed}
@@ -40,6 +40,15 @@ class Settings(BaseSettings):
 	# HTTP timeout (seconds) for upstream model requests
 	http_timeout_seconds: int = Field(default=600, validation_alias="HTTP_TIMEOUT_SECONDS")
 
+	# Shared provider quota (token bucket per API key), shared with excelParseTools via the same SQLite file
+	quota_enabled: bool = Field(default=True, validation_alias="QUOTA_ENABLED")
+	quota_db_path: Optional[str] = Field(default=None, validation_alias="QUOTA_DB_PATH")
+	# JSON: {"kimi": {"rpm": 200, "tpm": 128000}}; unset providers keep limits registered by other processes
+	quota_limits: Optional[str] = Field(default=None, validation_alias="PROVIDER_QUOTA_LIMITS")
+	quota_image_tokens: int = Field(default=1000, validation_alias="QUOTA_IMAGE_TOKENS")
+	quota_completion_tokens: int = Field(default=1024, validation_alias="QUOTA_COMPLETION_TOKENS")
+	quota_wait_timeout_seconds: float = Field(default=600, validation_alias="QUOTA_WAIT_TIMEOUT")
+
 	# pydantic v2 configuration
 	model_config = {
 		"env_file": str(Path(__file__).resolve().parent.parent / ".env"),
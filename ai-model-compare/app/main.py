@@ -13,6 +13,7 @@ from .clients import call_ragflow_with_image, compare_across_providers
 from . import get_db
 from .formatting import normalize_single_line
 from .config import settings
+from .quota import get_quota
 
 app = FastAPI(title="RagFlow Image Composition Classifier", version="0.1.0")
 
@@ -76,6 +77,16 @@ async def debug_config() -> JSONResponse:
 	return JSONResponse(data)
 
 
+@router.get("/quota", response_class=JSONResponse)
+async def quota_usage(minutes: int = 60) -> JSONResponse:
+	"""Per-key provider quota usage shared by all services using QUOTA_DB_PATH."""
+	quota = get_quota()
+	if quota is None:
+		return JSONResponse({"enabled": False, "keys": []})
+	minutes = max(1, min(minutes, 7 * 24 * 60))
+	return JSONResponse({"enabled": True, "minutes": minutes, "keys": quota.usage(minutes)})
+
+
 @router.get("/history", response_class=JSONResponse)
 async def history_list(limit: int = 20, offset: int = 0) -> JSONResponse:
 	conn = get_db()
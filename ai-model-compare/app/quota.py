@@ -0,0 +1,317 @@
+"""Cross-process provider quota (token bucket) shared with excelParseTools.
+
+Every process calling a provider with the same API key draws request/token
+tokens from one bucket stored in SQLite (``QUOTA_DB_PATH``). The schema and
+the refill algorithm match ``excelParseTools/provider_quota.py``; point both
+services at the same file to share an account's RPM/TPM limits.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from .config import settings
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS quota_buckets (
+	key_id TEXT PRIMARY KEY,
+	label TEXT NOT NULL DEFAULT '',
+	rpm INTEGER NOT NULL DEFAULT 0,
+	tpm INTEGER NOT NULL DEFAULT 0,
+	request_tokens REAL NOT NULL DEFAULT 0,
+	token_tokens REAL NOT NULL DEFAULT 0,
+	updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS quota_usage (
+	key_id TEXT NOT NULL,
+	minute INTEGER NOT NULL,
+	client TEXT NOT NULL,
+	requests INTEGER NOT NULL DEFAULT 0,
+	tokens INTEGER NOT NULL DEFAULT 0,
+	waited REAL NOT NULL DEFAULT 0,
+	PRIMARY KEY (key_id, minute, client)
+);
+"""
+
+CLIENT_NAME = "ai-model-compare"
+
+# A CJK character (incl. full-width punctuation) is about one token, other characters about four per token
+# (same estimate as excelParseTools)
+_CJK = re.compile("[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff00-\uffef]")
+
+
+class QuotaExceeded(RuntimeError):
+	"""Raised when no quota could be acquired within the timeout."""
+
+
+def quota_key_id(api_key: str) -> str:
+	"""Stable id of an API key (hash prefix, the key itself is never stored)."""
+	return hashlib.sha256(str(api_key or "").encode("utf-8")).hexdigest()[:16]
+
+
+def estimate_text_tokens(text: str) -> float:
+	cjk = len(_CJK.findall(text or ""))
+	return cjk + (len(text or "") - cjk) / 4.0
+
+
+class ProviderQuota:
+	"""Token bucket per API key, shared through a lock-protected SQLite table."""
+
+	PRUNE_EVERY = 500  # prune expired usage rows every N grants
+
+	def __init__(self, db_path: Path, client: str = CLIENT_NAME, retention_minutes: int = 7 * 24 * 60) -> None:
+		self.db_path = Path(db_path)
+		self.db_path.parent.mkdir(parents=True, exist_ok=True)
+		self.client = client
+		self.retention_minutes = max(int(retention_minutes), 1)
+		self._grants = 0
+		self._grants_lock = threading.Lock()
+		self._local = threading.local()
+		conn = self._conn()
+		conn.execute("PRAGMA journal_mode=WAL")
+		conn.executescript(_SCHEMA)
+
+	def _conn(self) -> sqlite3.Connection:
+		conn = getattr(self._local, "conn", None)
+		if conn is None:
+			conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+			conn.row_factory = sqlite3.Row
+			self._local.conn = conn
+		return conn
+
+	def try_acquire(
+		self,
+		key_id: str,
+		tokens: float,
+		rpm: Optional[int] = None,
+		tpm: Optional[int] = None,
+		label: str = "",
+		waited: float = 0.0,
+	) -> float:
+		"""Take one request's quota. Returns 0 when granted, else seconds to wait.
+
+		rpm/tpm of 0 mean unlimited; None keeps the limits registered by other processes.
+		"""
+		now = time.time()
+		conn = self._conn()
+		# BEGIN IMMEDIATE takes the write lock before reading, so deductions from all processes are serialized
+		conn.execute("BEGIN IMMEDIATE")
+		try:
+			row = conn.execute("SELECT * FROM quota_buckets WHERE key_id = ?", (key_id,)).fetchone()
+			if row is None:
+				rpm, tpm = int(rpm or 0), int(tpm or 0)
+				requests_left, tokens_left = float(rpm), float(tpm)
+			else:
+				rpm = int(row["rpm"] if rpm is None else rpm)
+				tpm = int(row["tpm"] if tpm is None else tpm)
+				elapsed = max(now - row["updated_at"], 0.0)
+				requests_left = min(row["request_tokens"] + elapsed * rpm / 60.0, rpm)
+				tokens_left = min(row["token_tokens"] + elapsed * tpm / 60.0, tpm)
+			need = min(float(tokens), tpm) if tpm else 0.0
+			wait = 0.0
+			if rpm and requests_left < 1:
+				wait = (1 - requests_left) * 60.0 / rpm
+			if tpm and tokens_left < need:
+				wait = max(wait, (need - tokens_left) * 60.0 / tpm)
+			if wait == 0.0:
+				if rpm:
+					requests_left -= 1
+				if tpm:
+					tokens_left -= need
+			conn.execute(
+				"""
+				INSERT INTO quota_buckets (key_id, label, rpm, tpm, request_tokens, token_tokens, updated_at)
+				VALUES (?, ?, ?, ?, ?, ?, ?)
+				ON CONFLICT(key_id) DO UPDATE SET
+					label = CASE WHEN excluded.label != '' THEN excluded.label ELSE label END,
+					rpm = excluded.rpm, tpm = excluded.tpm, request_tokens = excluded.request_tokens,
+					token_tokens = excluded.token_tokens, updated_at = excluded.updated_at
+				""",
+				(key_id, label or "", rpm, tpm, requests_left, tokens_left, now),
+			)
+			if wait == 0.0:
+				self._record(conn, key_id, now, requests=1, waited=waited)
+			conn.execute("COMMIT")
+		except Exception:
+			conn.execute("ROLLBACK")
+			raise
+		if wait == 0.0:
+			with self._grants_lock:
+				self._grants += 1
+				prune = self._grants % self.PRUNE_EVERY == 0
+			if prune:
+				self.prune()
+		return wait
+
+	async def acquire(
+		self,
+		key_id: str,
+		tokens: float,
+		rpm: Optional[int] = None,
+		tpm: Optional[int] = None,
+		label: str = "",
+		timeout: Optional[float] = None,
+	) -> float:
+		"""Wait (without blocking the event loop) until quota is granted; returns seconds waited."""
+		start = time.monotonic()
+		waited = 0.0
+		while True:
+			wait = await asyncio.to_thread(self.try_acquire, key_id, tokens, rpm, tpm, label, waited)
+			if wait == 0.0:
+				return waited
+			if timeout is not None and waited + wait > timeout:
+				raise QuotaExceeded(f"quota wait exceeded {timeout}s for {label or key_id}")
+			await asyncio.sleep(min(wait, 1.0))
+			waited = time.monotonic() - start
+
+	def settle(self, key_id: str, estimated: float, actual: Optional[float]) -> None:
+		"""Refund (or charge) the difference between estimated and actual tokens."""
+		if actual is None:
+			actual = estimated
+		conn = self._conn()
+		conn.execute("BEGIN IMMEDIATE")
+		try:
+			conn.execute(
+				"UPDATE quota_buckets SET token_tokens = MIN(token_tokens + MIN(?, tpm) - ?, tpm) WHERE key_id = ? AND tpm > 0",
+				(float(estimated), float(actual), key_id),
+			)
+			self._record(conn, key_id, time.time(), tokens=int(actual))
+			conn.execute("COMMIT")
+		except Exception:
+			conn.execute("ROLLBACK")
+			raise
+
+	def usage(self, minutes: int = 60) -> List[Dict[str, Any]]:
+		"""Limits per key, per-client requests/tokens/wait seconds over the last minutes, and the current minute's usage."""
+		since = int(time.time() // 60) - max(int(minutes), 1) + 1
+		conn = self._conn()
+		keys = {
+			row["key_id"]: dict(row, requests=0, tokens=0, waited=0.0, clients={})
+			for row in conn.execute("SELECT key_id, label, rpm, tpm FROM quota_buckets ORDER BY label, key_id")
+		}
+		rows = conn.execute(
+			"""
+			SELECT key_id, client, SUM(requests) AS requests, SUM(tokens) AS tokens, SUM(waited) AS waited
+			FROM quota_usage WHERE minute >= ? GROUP BY key_id, client
+			""",
+			(since,),
+		)
+		for row in rows:
+			item = keys.get(row["key_id"])
+			if item is None:
+				continue
+			item["clients"][row["client"]] = {
+				"requests": row["requests"],
+				"tokens": row["tokens"],
+				"waited": round(row["waited"], 2),
+			}
+			item["requests"] += row["requests"]
+			item["tokens"] += row["tokens"]
+			item["waited"] = round(item["waited"] + row["waited"], 2)
+		# Usage in the current minute, to compare against the per-minute limits
+		current = {
+			row["key_id"]: (row["requests"], row["tokens"])
+			for row in conn.execute(
+				"SELECT key_id, SUM(requests) AS requests, SUM(tokens) AS tokens FROM quota_usage WHERE minute = ? GROUP BY key_id",
+				(int(time.time() // 60),),
+			)
+		}
+		for key_id, item in keys.items():
+			item["current_minute"] = dict(zip(("requests", "tokens"), current.get(key_id, (0, 0))))
+		return list(keys.values())
+
+	def prune(self) -> None:
+		"""Delete usage rows older than the retention period."""
+		self._conn().execute(
+			"DELETE FROM quota_usage WHERE minute < ?",
+			(int(time.time() // 60) - self.retention_minutes,),
+		)
+
+	def _record(self, conn: sqlite3.Connection, key_id: str, now: float, requests: int = 0, tokens: int = 0, waited: float = 0.0) -> None:
+		conn.execute(
+			"""
+			INSERT INTO quota_usage (key_id, minute, client, requests, tokens, waited) VALUES (?, ?, ?, ?, ?, ?)
+			ON CONFLICT(key_id, minute, client) DO UPDATE SET
+				requests = requests + excluded.requests, tokens = tokens + excluded.tokens,
+				waited = waited + excluded.waited
+			""",
+			(key_id, int(now // 60), self.client, requests, tokens, waited),
+		)
+
+
+def _resolve_quota_path() -> Path:
+	if settings.quota_db_path:
+		return Path(settings.quota_db_path).expanduser().resolve()
+	return Path(__file__).resolve().parent.parent / "data" / "provider_quota.db"
+
+
+def _parse_limits(raw: Optional[str]) -> Dict[str, Dict[str, int]]:
+	"""PROVIDER_QUOTA_LIMITS='{"kimi": {"rpm": 200, "tpm": 128000}}'"""
+	if not raw:
+		return {}
+	try:
+		data = json.loads(raw)
+		return {str(k): v for k, v in data.items() if isinstance(v, dict)}
+	except Exception as e:
+		logging.getLogger("app.quota").warning("Invalid PROVIDER_QUOTA_LIMITS: %s", e)
+		return {}
+
+
+_quota: Optional[ProviderQuota] = None
+_quota_lock = threading.Lock()
+_LIMITS = _parse_limits(settings.quota_limits)
+
+
+def get_quota() -> Optional[ProviderQuota]:
+	"""Shared quota store of this process (None when QUOTA_ENABLED is false)."""
+	global _quota
+	if not settings.quota_enabled:
+		return None
+	with _quota_lock:
+		if _quota is None:
+			_quota = ProviderQuota(_resolve_quota_path())
+		return _quota
+
+
+async def acquire_quota(provider: str, api_key: str, text: str) -> Tuple[Optional[str], float]:
+	"""Acquire quota for one image request; returns (key_id, estimated tokens) for settle_quota."""
+	quota = get_quota()
+	if quota is None:
+		return None, 0.0
+	key_id = quota_key_id(api_key)
+	estimated = estimate_text_tokens(text) + settings.quota_image_tokens + settings.quota_completion_tokens
+	limits = _LIMITS.get(provider or "", {})
+	waited = await quota.acquire(
+		key_id,
+		estimated,
+		limits.get("rpm"),
+		limits.get("tpm"),
+		label=provider or "",
+		timeout=settings.quota_wait_timeout_seconds,
+	)
+	if waited >= 1:
+		logging.getLogger("app.quota").info("waited %.1fs for %s quota", waited, provider)
+	return key_id, estimated
+
+
+async def settle_quota(key_id: Optional[str], estimated: float, data: Any) -> None:
+	"""Settle a request with the provider-reported usage (falls back to the estimate)."""
+	quota = get_quota()
+	if quota is None or key_id is None:
+		return
+	actual = None
+	if isinstance(data, dict) and isinstance(data.get("usage"), dict):
+		actual = data["usage"].get("total_tokens")
+	try:
+		await asyncio.to_thread(quota.settle, key_id, estimated, actual)
+	except Exception as e:
+		logging.getLogger("app.quota").warning("quota settle failed: %s", e)
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+任务持久化后台写入线程
+检查点段追加、导出文件写出与进度文件更新按提交顺序在独立线程中执行，
+批次处理不必等待磁盘I/O；队列有界，写入跟不上时提交方阻塞（背压），内存占用可控
+"""
+
+import queue
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+
+class BackgroundWriter:
+    """单线程有序写入队列：作业按提交顺序执行，任一作业失败后丢弃后续作业并在下次提交或 flush 时抛出异常"""
+
+    def __init__(self, name: str, max_queue: int):
+        """
+        Args:
+            name: 写入线程名称
+            max_queue: 排队作业上限（不含正在执行的作业）
+        """
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max(int(max_queue), 1))
+        self._pending: deque = deque()  # 未完成作业的提交时间（先进先出）
+        self._closed = False
+        self.error: Optional[BaseException] = None
+        self.completed = 0
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, func: Callable, *args: Any):
+        """提交一个写入作业；队列已满时阻塞直到有空位"""
+        self.raise_if_failed()
+        if self._closed:
+            raise RuntimeError('后台写入线程已关闭')
+        self._pending.append(time.time())
+        self._queue.put((func, args))
+
+    def flush(self):
+        """等待已提交的作业全部完成，有作业失败时抛出其异常"""
+        self._queue.join()
+        self.raise_if_failed()
+
+    def close(self):
+        """执行完已提交的作业后停止写入线程（可重复调用，不抛出作业异常）"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+
+    def raise_if_failed(self):
+        if self.error is not None:
+            raise RuntimeError(f'后台写入失败: {self.error}') from self.error
+
+    def stats(self) -> Dict[str, Any]:
+        """队列深度（含正在执行与阻塞等待入队的作业）与写入滞后（最早未完成作业已等待的秒数）"""
+        pending = list(self._pending)
+        return {
+            'queue_depth': len(pending),
+            'lag_seconds': round(time.time() - pending[0], 3) if pending else 0.0,
+            'completed': self.completed,
+            'failed': self.error is not None,
+        }
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+            func, args = item
+            try:
+                # 作业之间有先后依赖（段序号、导出行序），失败后不再执行后续作业
+                if self.error is None:
+                    func(*args)
+                    self.completed += 1
+            except BaseException as e:
+                self.error = e
+            finally:
+                self._pending.popleft()
+                self._queue.task_done()
@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+命令行批量处理
+不经过Web界面，按规则模板处理目录中的所有数据文件：各文件的任务在同一个全局调度器中并行运行，
+共用 --concurrency 个大模型请求槽位；输出目录中的状态文件记录每个输入文件对应的任务，
+重新运行同一命令时已完成的文件直接跳过，未完成的任务从最后一个检查点继续。
+全部文件处理完成时退出码为0，有文件失败时为1，被中断（Ctrl+C，任务暂停以便下次继续）时为130
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from config import Config
+from data_readers import is_supported
+from result_writers import OUTPUT_FORMATS, DEFAULT_OUTPUT_FORMAT, output_suffix
+
+STATE_FILE = ".batch_state.json"
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_INTERRUPTED = 130
+
+
+def add_run_arguments(arg_parser: argparse.ArgumentParser):
+    """run 子命令的参数"""
+    arg_parser.add_argument("--rules", required=True, help="规则模板JSON文件（格式同 rule_templates/medical_record_rules.json）")
+    arg_parser.add_argument("--input", required=True, help="输入目录（递归查找 xlsx/xls/csv/tsv/parquet）或单个文件")
+    arg_parser.add_argument("--out", required=True, help="输出目录，保持输入目录的子目录结构")
+    arg_parser.add_argument("--concurrency", type=int, default=None,
+                            help="所有文件共用的大模型并发请求数（默认为当前提供方的 PROVIDER_CONCURRENCY）")
+    arg_parser.add_argument("--max-files", type=int, default=None,
+                            help="同时处理的文件数（默认与 --concurrency 相同，不超过文件数）")
+    arg_parser.add_argument("--threads", type=int, default=None,
+                            help="单个文件的并发请求数上限（默认与 --concurrency 相同）")
+    arg_parser.add_argument("--format", default=DEFAULT_OUTPUT_FORMAT, choices=list(OUTPUT_FORMATS),
+                            help="输出格式")
+    arg_parser.add_argument("--chunk-size", type=int, default=0, help="大于0时分块流式导入与处理")
+    arg_parser.add_argument("--sheet", default=None, help="Excel工作表名称，默认第一个工作表")
+    arg_parser.add_argument("--index-column", default=None, help="索引列，默认使用规则模板推荐的索引列")
+    arg_parser.add_argument("--checkpoint-every", type=int, default=None, help="每处理多少行保存一次检查点")
+    arg_parser.add_argument("--restart", action="store_true", help="忽略输出目录中的状态，所有文件重新处理")
+    arg_parser.add_argument("--progress-interval", type=float, default=10.0, help="打印进度的间隔秒数")
+
+
+def load_rule_template(path: str) -> Dict[str, Any]:
+    """读取规则模板，返回 {'rules': [...], 'settings': {...}}"""
+    with open(path, "r", encoding="utf-8") as f:
+        template = json.load(f)
+    rules = template.get("rules") if isinstance(template, dict) else template
+    if not rules:
+        raise ValueError(f"规则模板中没有规则: {path}")
+    for rule in rules:
+        for key in ("source_column", "target_columns", "prompt"):
+            if not rule.get(key):
+                raise ValueError(f"规则缺少字段 {key}: {rule.get('rule_name') or rule}")
+    settings = template.get("recommended_settings", {}) if isinstance(template, dict) else {}
+    return {"rules": rules, "settings": settings}
+
+
+def find_input_files(input_path: str) -> List[Path]:
+    """输入目录下所有支持的数据文件（按路径排序，跳过Excel的临时锁文件）"""
+    root = Path(input_path)
+    if root.is_file():
+        return [root]
+    if not root.is_dir():
+        raise ValueError(f"输入路径不存在: {input_path}")
+    return sorted(p for p in root.rglob("*")
+                  if p.is_file() and is_supported(p.name) and not p.name.startswith("~$"))
+
+
+def output_names(files: List[Path], root: Path, suffix: str) -> Dict[Path, str]:
+    """输出文件的相对路径：同目录下主文件名相同的输入（如 a.xlsx 与 a.csv）保留原扩展名以免覆盖"""
+    stems: Dict[str, int] = {}
+    for path in files:
+        key = str(path.relative_to(root).with_suffix(""))
+        stems[key] = stems.get(key, 0) + 1
+    names = {}
+    for path in files:
+        rel = path.relative_to(root)
+        stem = str(rel.with_suffix(""))
+        names[path] = (stem if stems[stem] == 1 else str(rel)) + suffix
+    return names
+
+
+class BatchRunner:
+    """在一个进程内批量处理多个数据文件"""
+
+    def __init__(self, parser, rule_template: Dict[str, Any], out_dir: str, output_format: str = DEFAULT_OUTPUT_FORMAT,
+                 threads: int = 1, chunk_size: int = 0, sheet_name: Optional[str] = None,
+                 index_column: Optional[str] = None, checkpoint_every: Optional[int] = None):
+        """
+        Args:
+            parser: ExcelStructuredParser（inline 执行，任务在本进程的调度器中运行）
+            rule_template: load_rule_template 的返回值
+        """
+        self.parser = parser
+        settings = rule_template["settings"]
+        self.rule_dicts = rule_template["rules"]
+        self.rules = [parser.create_parsing_rule(r["source_column"], r["target_columns"], r["prompt"],
+                                                 r.get("column_types")) for r in self.rule_dicts]
+        self.out_dir = Path(out_dir)
+        self.output_format = output_format
+        self.suffix = output_suffix(output_format)
+        self.threads = max(int(threads), 1)
+        self.chunk_size = max(int(chunk_size or 0), 0)
+        self.sheet_name = sheet_name
+        self.index_column = index_column if index_column is not None else settings.get("index_column")
+        self.checkpoint_every = int(checkpoint_every or settings.get("checkpoint_every") or 50)
+        self.state_file = self.out_dir / STATE_FILE
+        self.state: Dict[str, Dict[str, Any]] = {}
+        # 规则与输出格式的摘要：改动后之前的任务不再续用
+        self.digest = hashlib.sha256(json.dumps(
+            [self.rule_dicts, output_format, self.chunk_size, self.sheet_name, self.index_column],
+            ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+    def run(self, files: List[Path], root: Path, restart: bool = False, progress_interval: float = 10.0) -> Dict[str, Any]:
+        """
+        处理所有文件直到结束，返回汇总信息
+
+        文件依次导入并提交到调度器，先提交的文件在后续文件导入期间就已开始处理。
+        """
+        from excel_structured_parser import TaskStatus
+
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        self.state = {} if restart else self._load_state()
+        names = output_names(files, root, self.suffix)
+        started = time.time()
+        results: Dict[str, Dict[str, Any]] = {}
+        pending: Dict[str, str] = {}  # 任务ID -> 输入文件相对路径
+        last_report = started
+
+        try:
+            for path in files:
+                rel = str(path.relative_to(root)) if path != root else path.name
+                result = {"file": rel, "output": str(self.out_dir / names[path]), "rows": 0,
+                          "resumed_from": 0, "status": None, "error": None}
+                results[rel] = result
+                try:
+                    task_id = self._submit(path, rel, result)
+                except Exception as e:
+                    result.update(status=TaskStatus.FAILED.value, error=str(e))
+                    print(f"[失败] {rel}: {e}")
+                    continue
+                if task_id is not None:
+                    pending[task_id] = rel
+                if time.time() - last_report >= progress_interval:
+                    self._report(results, pending, started)
+                    last_report = time.time()
+
+            while pending:
+                for task_id, rel in list(pending.items()):
+                    task = self.parser.get_task_status(task_id)
+                    if task is not None and task.status in (TaskStatus.PENDING, TaskStatus.PROCESSING):
+                        continue
+                    del pending[task_id]
+                    if task is None:
+                        results[rel].update(status=TaskStatus.FAILED.value, error="任务记录已被删除")
+                        continue
+                    self._finish(task, results[rel])
+                if pending:
+                    if time.time() - last_report >= progress_interval:
+                        self._report(results, pending, started)
+                        last_report = time.time()
+                    time.sleep(0.5)
+        except KeyboardInterrupt:
+            # 暂停未完成的任务，已完成的行已落盘为检查点，下次运行同一命令时继续
+            print("\n收到中断，正在暂停未完成的任务...")
+            for task_id, rel in pending.items():
+                try:
+                    self.parser.control_task(task_id, 'pause')
+                except ValueError:
+                    pass
+            for task_id, rel in pending.items():
+                self.parser.wait_stopped(task_id, 30)
+                task = self.parser.get_task_status(task_id)
+                results[rel].update(status=task.status.value if task else None, rows=self._done_rows(task, results[rel]))
+            return self._summary(results, started, interrupted=True)
+        return self._summary(results, started)
+
+    def _submit(self, path: Path, rel: str, result: Dict[str, Any]) -> Optional[str]:
+        """导入并提交一个文件；已完成的文件直接复制结果并返回None，未完成的任务从检查点继续"""
+        from excel_structured_parser import TaskStatus
+
+        stat = path.stat()
+        entry = self.state.get(rel)
+        if entry and (entry.get("digest") != self.digest or entry.get("size") != stat.st_size
+                      or entry.get("mtime") != stat.st_mtime):
+            entry = None
+        if entry:
+            meta = self.parser._load_task_meta(entry["task_id"])
+            status = meta.get("status")
+            if status == TaskStatus.COMPLETED.value:
+                if os.path.exists(result["output"]) or os.path.exists(meta.get("output_file") or ""):
+                    if not os.path.exists(result["output"]):
+                        self._copy_output(meta["output_file"], result["output"])
+                    result.update(status="skipped", rows=0)
+                    print(f"[跳过] {rel}: 已完成")
+                    return None
+            elif meta and os.path.exists(meta.get("input_file") or ""):
+                # 状态文件中的任务只由批量处理运行；上次进程崩溃时的任务不必等待其心跳超时
+                result["resumed_from"] = int(meta.get("processed_records") or 0)
+                self.parser.run_locally(self.parser._task_from_meta(entry["task_id"], meta))
+                print(f"[继续] {rel}: 从第 {result['resumed_from']} 行继续")
+                return entry["task_id"]
+
+        import_id = self.parser.import_excel(str(path), index_column=self.index_column, chunk_size=self.chunk_size,
+                                             sheet_name=self.sheet_name)
+        task_id = self.parser.start_processing_task(
+            import_id, self.rules, threads=self.threads, checkpoint_every=self.checkpoint_every, name=rel,
+            chunk_size=self.chunk_size, output_format=self.output_format)
+        self.state[rel] = {"task_id": task_id, "size": stat.st_size, "mtime": stat.st_mtime, "digest": self.digest}
+        self._save_state()
+        print(f"[提交] {rel}: 任务 {task_id}")
+        return task_id
+
+    def _finish(self, task, result: Dict[str, Any]):
+        """任务结束：完成的复制结果到输出目录"""
+        from excel_structured_parser import TaskStatus
+
+        result["status"] = task.status.value
+        result["rows"] = self._done_rows(task, result)
+        if task.status == TaskStatus.COMPLETED:
+            try:
+                self._copy_output(task.output_file, result["output"])
+                print(f"[完成] {result['file']} -> {result['output']}")
+            except Exception as e:
+                result.update(status=TaskStatus.FAILED.value, error=f"复制结果失败: {e}")
+                print(f"[失败] {result['file']}: {result['error']}")
+        else:
+            result["error"] = task.error_message
+            print(f"[{task.status.value}] {result['file']}: {task.error_message or ''}")
+
+    def _done_rows(self, task, result: Dict[str, Any]) -> int:
+        """本次运行处理的行数（不含续用检查点之前已完成的行）"""
+        if task is None:
+            return 0
+        return max(int(task.processed_records) - int(result["resumed_from"]), 0)
+
+    def _copy_output(self, source: str, dest: str):
+        """先写临时文件再原子替换，中断时不留下不完整的输出"""
+        Path(dest).parent.mkdir(parents=True, exist_ok=True)
+        tmp = f"{dest}.part"
+        shutil.copyfile(source, tmp)
+        os.replace(tmp, dest)
+
+    def _report(self, results: Dict[str, Dict[str, Any]], pending: Dict[str, str], started: float):
+        """打印整体进度"""
+        rows = sum(r["rows"] for r in results.values() if r["status"] is not None)
+        total = 0
+        for task_id, rel in pending.items():
+            task = self.parser.get_task_status(task_id)
+            if task is not None:
+                rows += self._done_rows(task, results[rel])
+                total += task.total_records
+        done = sum(1 for r in results.values() if r["status"] is not None)
+        elapsed = max(time.time() - started, 1e-6)
+        stats = self.parser.scheduler.stats()
+        in_flight = sum(p["in_flight"] for p in stats["providers"].values())
+        print(f"[进度] 文件 {done}/{len(results)}, 运行中 {len(stats['running'])}, 排队 {len(stats['queued'])}, "
+              f"并发请求 {in_flight}, 本次已处理 {rows} 行, {rows / elapsed:.1f} 行/秒")
+
+    def _summary(self, results: Dict[str, Dict[str, Any]], started: float, interrupted: bool = False) -> Dict[str, Any]:
+        elapsed = time.time() - started
+        rows = sum(r["rows"] for r in results.values())
+        counts: Dict[str, int] = {}
+        for r in results.values():
+            counts[r["status"] or "unknown"] = counts.get(r["status"] or "unknown", 0) + 1
+        return {
+            "files": list(results.values()),
+            "counts": counts,
+            "rows": rows,
+            "elapsed": elapsed,
+            "rows_per_second": rows / elapsed if elapsed > 0 else 0.0,
+            "interrupted": interrupted,
+        }
+
+    def _load_state(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.state_file, "r", encoding="utf-8") as f:
+                return json.load(f).get("files", {})
+        except Exception:
+            return {}
+
+    def _save_state(self):
+        tmp = f"{self.state_file}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"files": self.state}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.state_file)
+
+
+def print_summary(summary: Dict[str, Any]):
+    """打印吞吐汇总"""
+    print("=" * 60)
+    for r in summary["files"]:
+        line = f"{r['status'] or '-':<10} {r['rows']:>8} 行  {r['file']}"
+        if r["error"]:
+            line += f"  ({r['error']})"
+        print(line)
+    print("-" * 60)
+    counts = ", ".join(f"{status}: {n}" for status, n in sorted(summary["counts"].items()))
+    print(f"文件: {len(summary['files'])} ({counts})")
+    print(f"本次处理: {summary['rows']} 行, 用时 {summary['elapsed']:.1f} 秒, "
+          f"吞吐 {summary['rows_per_second']:.1f} 行/秒 ({summary['rows_per_second'] * 60:.0f} 行/分钟)")
+    if summary["interrupted"]:
+        print("已中断：未完成的任务已暂停，重新运行同一命令从检查点继续")
+    print("=" * 60)
+
+
+def run_batch(args: argparse.Namespace) -> int:
+    """执行 run 子命令，返回进程退出码"""
+    from excel_structured_parser import ExcelStructuredParser
+
+    template = load_rule_template(args.rules)
+    files = find_input_files(args.input)
+    if not files:
+        print(f"输入路径中没有支持的数据文件: {args.input}")
+        return EXIT_FAILED
+    root = Path(args.input) if Path(args.input).is_dir() else Path(args.input).parent
+
+    # 所有文件的任务在本进程的调度器中运行，共用同一个提供方的请求槽位
+    concurrency = max(int(args.concurrency or Config.PROVIDER_CONCURRENCY.get(Config.LLM_PROVIDER,
+                                                                               Config.DEFAULT_PROVIDER_CONCURRENCY)), 1)
+    Config.TASK_EXECUTOR = 'inline'
+    Config.PROVIDER_CONCURRENCY = dict(Config.PROVIDER_CONCURRENCY, **{Config.LLM_PROVIDER: concurrency})
+    Config.MAX_RUNNING_TASKS = max(min(int(args.max_files or concurrency), len(files)), 1)
+    parser = ExcelStructuredParser()
+    runner = BatchRunner(parser, template, args.out, args.format, threads=args.threads or concurrency,
+                         chunk_size=args.chunk_size, sheet_name=args.sheet, index_column=args.index_column,
+                         checkpoint_every=args.checkpoint_every)
+    print(f"文件数: {len(files)}, 并发请求: {concurrency}, 同时处理文件: {Config.MAX_RUNNING_TASKS}, "
+          f"执行模式: {Config.EXECUTION_MODE}, 输出目录: {args.out}")
+    summary = runner.run(files, root, restart=args.restart, progress_interval=args.progress_interval)
+    print_summary(summary)
+    if summary["interrupted"]:
+        return EXIT_INTERRUPTED
+    ok = all(r["status"] in ("completed", "skipped") for r in summary["files"])
+    return EXIT_OK if ok else EXIT_FAILED
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+目标列类型声明与转换
+规则模板可为目标列声明类型（int/float/date/category），合并批次结果时把大模型返回的文本
+转换为可空数值、日期或分类类型，无法转换的值按行记录到“类型转换错误”列
+"""
+
+import re
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# 类型名 -> pandas 数据类型；string 为默认类型（保持大模型返回的文本）
+COLUMN_TYPES = {
+    'string': object,
+    'int': 'Int64',
+    'float': 'Float64',
+    'date': 'datetime64[ns]',
+    'category': 'category',
+}
+COERCION_ERROR_COLUMN = '类型转换错误'
+
+_NUMBER_NOISE = re.compile(r'[\s,，]')
+_DATE_SEPARATORS = re.compile(r'[年月/.]')
+# 同一列中混有多种日期写法时逐个推断格式：pandas 2.0 起需显式指定 format='mixed'，
+# 更早的版本未指定 format 时本就逐个解析（传入 'mixed' 会被当作格式串导致全部解析失败）
+_MIXED_DATE_FORMAT = {'format': 'mixed'} if int(pd.__version__.split('.')[0]) >= 2 else {}
+
+
+def normalize_column_types(column_types: Optional[Dict[str, str]], target_columns: List[str]) -> Dict[str, str]:
+    """校验规则声明的列类型，返回去掉 string 类型后的 {列名: 类型}"""
+    result = {}
+    for col, col_type in (column_types or {}).items():
+        col_type = str(col_type).strip().lower()
+        if col_type not in COLUMN_TYPES:
+            raise ValueError(f"不支持的列类型: {col}={col_type}，可选: {', '.join(COLUMN_TYPES)}")
+        if col not in target_columns:
+            raise ValueError(f"声明类型的列不在目标列中: {col}")
+        if col_type != 'string':
+            result[col] = col_type
+    return result
+
+
+def empty_column(col_type: Optional[str], length: int):
+    """创建指定类型、全部为缺失值的列（string 类型填空字符串的object数组）"""
+    if not col_type or col_type == 'string':
+        return np.full(length, '', dtype=object)
+    if col_type == 'category':
+        return pd.Categorical([None] * length)
+    return pd.array([None] * length, dtype=COLUMN_TYPES[col_type])
+
+
+def coerce_values(values: np.ndarray, col_type: str) -> Tuple[object, np.ndarray]:
+    """
+    把一列文本值转换为目标类型
+
+    Returns:
+        (转换后的数组, 转换失败的行掩码)；空值不算失败
+    """
+    raw = pd.Series(values, dtype=object)
+    text = raw.map(lambda v: '' if v is None or (isinstance(v, float) and np.isnan(v)) else str(v).strip())
+    blank = (text == '').to_numpy()
+    if col_type == 'category':
+        return pd.Categorical(text.where(~blank, None)), np.zeros(len(raw), dtype=bool)
+    if col_type in ('int', 'float'):
+        numbers = pd.to_numeric(text.str.replace(_NUMBER_NOISE, '', regex=True).where(~blank, None), errors='coerce')
+        if col_type == 'int':
+            numbers = numbers.where(numbers % 1 == 0)
+        converted = pd.array(numbers.astype(float), dtype=COLUMN_TYPES[col_type])
+    elif col_type == 'date':
+        # 兼容“2024年03月15日”“2024/03/15”等写法
+        normalized = text.str.replace(_DATE_SEPARATORS, '-', regex=True).str.replace('日', '', regex=False)
+        converted = pd.to_datetime(normalized.where(~blank, None), errors='coerce', **_MIXED_DATE_FORMAT).array
+    else:
+        raise ValueError(f"不支持的列类型: {col_type}")
+    failed = ~blank & np.asarray(pd.isna(converted), dtype=bool)
+    return converted, failed
+
+
+def assign_values(result_df: pd.DataFrame, col: str, offset: int, values):
+    """把一段值按行位置写入结果DataFrame的一列，保持该列的数据类型"""
+    position = result_df.columns.get_loc(col)
+    if isinstance(result_df[col].dtype, pd.CategoricalDtype):
+        new_categories = pd.Index(pd.unique(pd.Series(values, dtype=object).dropna()))
+        new_categories = new_categories.difference(result_df[col].cat.categories)
+        if len(new_categories):
+            result_df[col] = result_df[col].cat.add_categories(new_categories)
+        values = np.asarray(values, dtype=object)
+    result_df.iloc[offset:offset + len(values), position] = values
@@ -16,7 +16,14 @@ class Config:
     
     # 文件上传配置
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB
-    ALLOWED_EXTENSIONS = {'.xlsx', '.xls'}
+    ALLOWED_EXTENSIONS = {'.xlsx', '.xls', '.csv', '.tsv', '.parquet'}
+    # 分片上传：大文件按分片上传（每个分片受 MAX_CONTENT_LENGTH 限制），支持断点续传
+    UPLOAD_CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024))  # 8MB
+    MAX_UPLOAD_SIZE = int(os.environ.get('MAX_UPLOAD_SIZE', 2 * 1024 * 1024 * 1024))  # 2GB
+    
+    # 结果下载：设置后返回 X-Accel-Redirect 内部跳转，由nginx直接发送 exports 目录下的文件
+    # （需在nginx中配置同名的 internal location 指向 excel_parser_data/exports/），留空则由应用发送
+    DOWNLOAD_ACCEL_PREFIX = os.environ.get('DOWNLOAD_ACCEL_PREFIX', '')
     
     # API配置
     MOONSHOT_API_KEY = os.environ.get('MOONSHOT_API_KEY') or "gJrVzbTcTtitntvY5sdNE2tMHdM2O8AH8j9l5q48TV3gJNkh"
@@ -25,11 +32,97 @@ class Config:
     MOONSHOT_TEMPERATURE = 0.6
     MOONSHOT_MAX_TOKENS = 127000
     
+    # 全局调度：同时运行的任务数上限，以及每个大模型提供方同时进行的请求数上限（多个任务按权重公平分配）
+    MAX_RUNNING_TASKS = int(os.environ.get('MAX_RUNNING_TASKS', 4))
+    LLM_PROVIDER = os.environ.get('LLM_PROVIDER', 'moonshot')
+    PROVIDER_CONCURRENCY = {
+        'moonshot': int(os.environ.get('MOONSHOT_CONCURRENCY', 8)),
+    }
+    DEFAULT_PROVIDER_CONCURRENCY = int(os.environ.get('DEFAULT_PROVIDER_CONCURRENCY', 4))
+    
+    # 跨进程共享的提供方配额（令牌桶）：使用同一API密钥的所有进程与服务（含 ai-model-compare）
+    # 从 QUOTA_DB_PATH 中的同一个桶取令牌；默认位于数据目录下的 provider_quota.db
+    QUOTA_ENABLED = os.environ.get('QUOTA_ENABLED', 'true').lower() == 'true'
+    QUOTA_DB_PATH = os.environ.get('QUOTA_DB_PATH', '')
+    # 账户的每分钟请求数/token数上限，0 表示不限；未设置时沿用其他进程登记的上限
+    MOONSHOT_RPM = int(os.environ['MOONSHOT_RPM']) if os.environ.get('MOONSHOT_RPM') else None
+    MOONSHOT_TPM = int(os.environ['MOONSHOT_TPM']) if os.environ.get('MOONSHOT_TPM') else None
+    QUOTA_COMPLETION_TOKENS = int(os.environ.get('QUOTA_COMPLETION_TOKENS', 1024))  # 取令牌时预估的输出token数，请求完成后按实际用量结算
+    QUOTA_WAIT_TIMEOUT = float(os.environ.get('QUOTA_WAIT_TIMEOUT', 600))  # 等待配额的最长秒数
+    
     # 处理配置
     DEFAULT_BATCH_SIZE = 10
     MAX_RETRIES = 5
     RETRY_DELAY = 0.2  # 秒
     
+    # 分块（流式）处理配置：大文件按固定行数分块读写，内存占用与文件大小无关
+    CHUNK_SIZE = int(os.environ.get('CHUNK_SIZE', 20000))  # 每块行数
+    CHUNKED_IMPORT_THRESHOLD = int(os.environ.get('CHUNKED_IMPORT_THRESHOLD', 50 * 1024 * 1024))  # 超过该字节数的上传文件自动分块导入
+    
+    # 进程内存预算：任务与整表导入开始前按估算预留内存，超出预算时排队等待（queue）或立即失败（fail）
+    # MEMORY_BUDGET 为 0 时取容器内存上限的 MEMORY_BUDGET_FRACTION，没有容器上限时不限制（仍记录各任务的内存占用）
+    MEMORY_BUDGET = int(os.environ.get('MEMORY_BUDGET', 0))
+    MEMORY_BUDGET_FRACTION = float(os.environ.get('MEMORY_BUDGET_FRACTION', 0.8))
+    MEMORY_ADMISSION = os.environ.get('MEMORY_ADMISSION', 'queue')  # queue 或 fail
+    MEMORY_WAIT_TIMEOUT = float(os.environ.get('MEMORY_WAIT_TIMEOUT', 300))  # 导入等待可用内存的最长时间（秒）
+    TASK_BASE_MEMORY = int(os.environ.get('TASK_BASE_MEMORY', 32 * 1024 * 1024))  # 每个任务的固定开销估算
+    MEMORY_DEFAULT_CELL_CHARS = int(os.environ.get('MEMORY_DEFAULT_CELL_CHARS', 200))  # 没有列画像时的平均单元格字符数
+    MEMORY_RESULT_CELL_CHARS = int(os.environ.get('MEMORY_RESULT_CELL_CHARS', 32))  # 结果单元格的平均字符数
+    
+    # 导入时列画像的抽样行数（空值率、平均文本长度、估算token数）
+    PROFILE_SAMPLE_ROWS = int(os.environ.get('PROFILE_SAMPLE_ROWS', 10000))
+    
+    # 检查点段日志配置
+    SEGMENT_COMPACT_FANOUT = int(os.environ.get('SEGMENT_COMPACT_FANOUT', 8))  # 同层级段达到该数量时合并
+    SEGMENT_MAX_ROWS = int(os.environ.get('SEGMENT_MAX_ROWS', 100000))  # 合并后单个段的最大行数
+    WRITER_QUEUE_SIZE = int(os.environ.get('WRITER_QUEUE_SIZE', 4))  # 后台写入线程排队的检查点上限，写满时批次处理等待
+    
+    # 数据目录回收：每个目录的保留时长（小时）与容量上限（字节），0 表示不限制；运行中任务引用的文件不会被删除
+    RETENTION_INTERVAL = int(os.environ.get('RETENTION_INTERVAL', 600))  # 扫描间隔（秒），0 表示不启动后台回收
+    RETENTION_POLICIES = {
+        'imports': {'max_age_hours': float(os.environ.get('IMPORTS_MAX_AGE_HOURS', 7 * 24)),
+                    'max_bytes': int(os.environ.get('IMPORTS_MAX_BYTES', 20 * 1024 ** 3))},
+        'temp': {'max_age_hours': float(os.environ.get('TEMP_MAX_AGE_HOURS', 3 * 24)),
+                 'max_bytes': int(os.environ.get('TEMP_MAX_BYTES', 20 * 1024 ** 3))},
+        'exports': {'max_age_hours': float(os.environ.get('EXPORTS_MAX_AGE_HOURS', 14 * 24)),
+                    'max_bytes': int(os.environ.get('EXPORTS_MAX_BYTES', 50 * 1024 ** 3))},
+    }
+    RETENTION_MIN_FREE_BYTES = int(os.environ.get('RETENTION_MIN_FREE_BYTES', 2 * 1024 ** 3))  # 数据卷剩余空间下限
+    RETENTION_PINNED = ['imports/best_practice_sample_50.xlsx']  # 永不回收的文件（相对数据目录）
+    
+    # 任务注册表（SQLite，WAL模式）；默认位于数据目录下的 tasks.db
+    TASK_DB_PATH = os.environ.get('TASK_DB_PATH', '')
+    # 是否同时写出旧版进度JSON文件（temp/{task_id}_progress.json），供外部脚本读取
+    WRITE_PROGRESS_FILES = os.environ.get('WRITE_PROGRESS_FILES', 'false').lower() == 'true'
+    # 执行中任务同步实时进度到注册表的最小间隔（秒），其他Web工作进程据此显示进度
+    PROGRESS_SYNC_INTERVAL = float(os.environ.get('PROGRESS_SYNC_INTERVAL', 1.0))
+    # 执行中任务在批次间检查其他进程提出的暂停/取消/抢占请求的最小间隔（秒）
+    CONTROL_POLL_INTERVAL = float(os.environ.get('CONTROL_POLL_INTERVAL', 1.0))
+    # 任务事件流（SSE）：进度事件的最小发布间隔、跨进程事件的轮询间隔、保留的事件数，
+    # 单个事件流连接的最长时间（到期后浏览器按 Last-Event-ID 自动重连）与心跳间隔
+    EVENT_PROGRESS_INTERVAL = float(os.environ.get('EVENT_PROGRESS_INTERVAL', 0.5))
+    EVENT_POLL_INTERVAL = float(os.environ.get('EVENT_POLL_INTERVAL', 0.5))
+    EVENT_RETENTION = int(os.environ.get('EVENT_RETENTION', 20000))
+    EVENT_STREAM_MAX_SECONDS = float(os.environ.get('EVENT_STREAM_MAX_SECONDS', 300))
+    EVENT_HEARTBEAT_INTERVAL = float(os.environ.get('EVENT_HEARTBEAT_INTERVAL', 15))
+
+    # 任务执行位置：inline 在接收请求的Web进程内运行；external 由 run.py --executor 启动的独立执行进程领取运行
+    # （Web层以多个WSGI工作进程运行时使用 external）
+    TASK_EXECUTOR = os.environ.get('TASK_EXECUTOR', 'inline')
+    EXECUTOR_POLL_INTERVAL = float(os.environ.get('EXECUTOR_POLL_INTERVAL', 1.0))  # 执行进程领取排队任务的轮询间隔
+    OWNER_HEARTBEAT_INTERVAL = float(os.environ.get('OWNER_HEARTBEAT_INTERVAL', 10))  # 执行进程刷新任务心跳的间隔
+    OWNER_TIMEOUT = float(os.environ.get('OWNER_TIMEOUT', 60))  # 超过该时间没有心跳的执行进程视为已退出
+    # 启动时接管持有进程已退出的排队与执行中任务，按优先级重新排队并从最后一个检查点继续
+    RECOVER_ON_STARTUP = os.environ.get('RECOVER_ON_STARTUP', 'true').lower() == 'true'
+
+    # 执行模式：local 在Web进程内处理；distributed 把任务切分为行区间，由 run.py --worker 启动的工作进程领取处理
+    EXECUTION_MODE = os.environ.get('EXECUTION_MODE', 'local')
+    LEASE_ROWS = int(os.environ.get('LEASE_ROWS', 500))  # 每个区间的行数
+    LEASE_TTL = float(os.environ.get('LEASE_TTL', 60))  # 租约有效期（秒），工作进程每 1/3 有效期续约一次
+    LEASE_POLL_INTERVAL = float(os.environ.get('LEASE_POLL_INTERVAL', 1.0))  # 没有可领取/可合并区间时的轮询间隔
+    LEASE_MAX_ATTEMPTS = int(os.environ.get('LEASE_MAX_ATTEMPTS', 3))  # 区间处理出错的最多尝试次数
+    WORKER_THREADS = int(os.environ.get('WORKER_THREADS', 2))  # 每个工作进程同时处理的区间数
+    
     # 目录配置
     BASE_DIR = Path(os.getcwd())
     DATA_DIR = BASE_DIR / "excel_parser_data"
@@ -50,7 +143,11 @@ class Config:
     ENABLE_DETAILED_LOGGING = os.environ.get('ENABLE_DETAILED_LOGGING', 'False').lower() == 'true'  # 是否启用详细日志
     LOG_API_REQUESTS = os.environ.get('LOG_API_REQUESTS', 'True').lower() == 'true'  # 是否记录API请求详情
     LOG_API_RESPONSES = os.environ.get('LOG_API_RESPONSES', 'False').lower() == 'true'  # 是否记录API响应详情
-    
+
+    # 日志索引（SQLite）：日志查看接口的数据与日志开关在多个进程间共享；默认位于日志目录下的 log_index.db
+    LOG_INDEX_ENABLED = os.environ.get('LOG_INDEX_ENABLED', 'true').lower() == 'true'
+    LOG_INDEX_PATH = os.environ.get('LOG_INDEX_PATH', '')
+
     # Web服务配置
     HOST = os.environ.get('HOST', '0.0.0.0')
     PORT = int(os.environ.get('PORT', 5001))
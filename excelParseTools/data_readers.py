@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据文件流式读取工具
+支持 Excel（含工作表选择）、CSV/TSV（自动识别UTF-8/GBK编码）与 Parquet，
+按固定行数分块读取，避免将整个文件加载到内存
+"""
+
+import codecs
+from pathlib import Path
+from typing import Iterator, List, Optional, Union
+
+import pandas as pd
+
+EXCEL_EXTENSIONS = {'.xlsx', '.xls'}
+DELIMITED_EXTENSIONS = {'.csv': ',', '.tsv': '\t'}
+PARQUET_EXTENSIONS = {'.parquet'}
+SUPPORTED_EXTENSIONS = EXCEL_EXTENSIONS | set(DELIMITED_EXTENSIONS) | PARQUET_EXTENSIONS
+
+# 按顺序尝试的编码：GB18030 是 GBK 的超集，可兼容国内系统导出的CSV
+CANDIDATE_ENCODINGS = ('utf-8', 'gb18030')
+ENCODING_SAMPLE_BYTES = 1024 * 1024
+
+SheetName = Union[str, int, None]
+
+# 未指定索引列时使用的行号索引列名
+ROW_INDEX_NAME = 'Row_Index'
+
+
+def _suffix(path: str) -> str:
+    return Path(path).suffix.lower()
+
+
+def is_supported(filename: str) -> bool:
+    """判断文件扩展名是否受支持"""
+    return _suffix(filename) in SUPPORTED_EXTENSIONS
+
+
+def detect_encoding(path: str) -> str:
+    """
+    识别文本文件编码
+
+    读取文件开头的样本依次尝试候选编码（增量解码，避免样本截断在多字节字符中间误判）。
+    带BOM的UTF-8返回 utf-8-sig。
+    """
+    with open(path, 'rb') as f:
+        sample = f.read(ENCODING_SAMPLE_BYTES)
+    if sample.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    for encoding in CANDIDATE_ENCODINGS:
+        try:
+            codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    return CANDIDATE_ENCODINGS[-1]
+
+
+def _csv_options(path: str) -> dict:
+    return {'sep': DELIMITED_EXTENSIONS[_suffix(path)], 'encoding': detect_encoding(path)}
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ValueError("读取Parquet文件需要安装 pyarrow")
+    return pq
+
+
+def list_sheets(path: str) -> List[str]:
+    """列出Excel文件的工作表名称，非Excel文件返回空列表"""
+    suffix = _suffix(path)
+    if suffix == '.xlsx':
+        from openpyxl import load_workbook
+        workbook = load_workbook(path, read_only=True)
+        try:
+            return list(workbook.sheetnames)
+        finally:
+            workbook.close()
+    if suffix == '.xls':
+        return [str(name) for name in pd.ExcelFile(path).sheet_names]
+    return []
+
+
+def read_header(path: str, sheet_name: SheetName = None) -> List[str]:
+    """读取文件表头（列名列表）"""
+    suffix = _suffix(path)
+    if suffix in DELIMITED_EXTENSIONS:
+        return [str(c) for c in pd.read_csv(path, nrows=0, **_csv_options(path)).columns]
+    if suffix in PARQUET_EXTENSIONS:
+        names = _require_pyarrow().read_schema(path).names
+        return [str(c) for c in names if not str(c).startswith('__index_level_')]
+    return [str(c) for c in pd.read_excel(path, nrows=0, sheet_name=sheet_name or 0).columns]
+
+
+def read_frame(path: str, columns: Optional[List[str]] = None, sheet_name: SheetName = None) -> pd.DataFrame:
+    """整体读取文件，可只读取指定列"""
+    suffix = _suffix(path)
+    if suffix in DELIMITED_EXTENSIONS:
+        return pd.read_csv(path, usecols=columns, **_csv_options(path))
+    if suffix in PARQUET_EXTENSIONS:
+        _require_pyarrow()
+        return pd.read_parquet(path, columns=columns).reset_index(drop=True)
+    return pd.read_excel(path, usecols=columns, sheet_name=sheet_name or 0)
+
+
+def read_rows(path: str, start: int, end: int, columns: Optional[List[str]] = None,
+              sheet_name: SheetName = None) -> pd.DataFrame:
+    """
+    读取第 [start, end) 行（不含表头，使用默认的RangeIndex）
+
+    只解析所需的行：CSV/TSV 跳过前面的行不构建数据，Parquet 只读取覆盖该区间的行组，
+    Excel 读到 end 行为止；与 iter_chunks 的行号一致。
+    """
+    start, end = max(int(start), 0), max(int(end), 0)
+    if end <= start:
+        return pd.DataFrame(columns=columns if columns is not None else read_header(path, sheet_name))
+    suffix = _suffix(path)
+    if suffix in PARQUET_EXTENSIONS:
+        return _read_parquet_rows(path, start, end, columns)
+    # 跳过表头与前 start 行（整数行数由解析器直接跳过），列名取自表头
+    options = {'header': None, 'names': read_header(path, sheet_name), 'usecols': columns,
+               'skiprows': start + 1, 'nrows': end - start}
+    if suffix in DELIMITED_EXTENSIONS:
+        return pd.read_csv(path, **options, **_csv_options(path))
+    return pd.read_excel(path, sheet_name=sheet_name or 0, **options)
+
+
+def _read_parquet_rows(path: str, start: int, end: int, columns: Optional[List[str]]) -> pd.DataFrame:
+    """只读取与 [start, end) 相交的行组，再截取区间"""
+    pq = _require_pyarrow()
+    parquet_file = pq.ParquetFile(path)
+    if columns is not None:
+        wanted = set(columns)
+        columns = [c for c in parquet_file.schema_arrow.names if c in wanted]
+    groups = []
+    group_start = first_row = 0
+    for i in range(parquet_file.metadata.num_row_groups):
+        group_end = group_start + parquet_file.metadata.row_group(i).num_rows
+        if group_end > start and group_start < end:
+            if not groups:
+                first_row = group_start
+            groups.append(i)
+        group_start = group_end
+    if not groups:
+        return pd.DataFrame(columns=columns if columns is not None else parquet_file.schema_arrow.names)
+    table = parquet_file.read_row_groups(groups, columns=columns)
+    return table.slice(start - first_row, end - start).to_pandas().reset_index(drop=True)
+
+
+def iter_chunks(path: str, chunk_size: int, columns: Optional[List[str]] = None,
+                sheet_name: SheetName = None) -> Iterator[pd.DataFrame]:
+    """
+    按固定行数分块读取文件
+
+    Args:
+        path: 文件路径（.xlsx/.xls/.csv/.tsv/.parquet）
+        chunk_size: 每块行数
+        columns: 只读取的列名，None表示全部列（保持文件中的列顺序）
+        sheet_name: Excel工作表名称或序号，None表示第一个工作表
+
+    Yields:
+        每块数据的DataFrame（使用默认的RangeIndex）
+    """
+    chunk_size = max(1, int(chunk_size))
+    suffix = _suffix(path)
+    if suffix in DELIMITED_EXTENSIONS:
+        for chunk in pd.read_csv(path, usecols=columns, chunksize=chunk_size, **_csv_options(path)):
+            yield chunk.reset_index(drop=True)
+    elif suffix in PARQUET_EXTENSIONS:
+        yield from _iter_parquet_chunks(path, chunk_size, columns)
+    elif suffix == '.xlsx':
+        yield from _iter_xlsx_chunks(path, chunk_size, columns, sheet_name)
+    else:
+        # .xls 等格式不支持流式读取，退化为整体读取后切块
+        df = read_frame(path, columns, sheet_name)
+        for start in range(0, len(df), chunk_size):
+            yield df.iloc[start:start + chunk_size].reset_index(drop=True)
+
+
+def _iter_parquet_chunks(path: str, chunk_size: int, columns: Optional[List[str]]) -> Iterator[pd.DataFrame]:
+    """按记录批次读取Parquet，再拼成固定行数的块"""
+    pq = _require_pyarrow()
+    parquet_file = pq.ParquetFile(path)
+    if columns is not None:
+        wanted = set(columns)
+        columns = [c for c in parquet_file.schema_arrow.names if c in wanted]
+    buffer: List[pd.DataFrame] = []
+    buffered = 0
+    for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=columns):
+        buffer.append(batch.to_pandas().reset_index(drop=True))
+        buffered += batch.num_rows
+        while buffered >= chunk_size:
+            merged = pd.concat(buffer, ignore_index=True)
+            yield merged.iloc[:chunk_size].reset_index(drop=True)
+            rest = merged.iloc[chunk_size:]
+            buffer = [rest] if len(rest) else []
+            buffered = len(rest)
+    if buffered:
+        yield pd.concat(buffer, ignore_index=True)
+
+
+def _iter_xlsx_chunks(path: str, chunk_size: int, columns: Optional[List[str]],
+                      sheet_name: SheetName) -> Iterator[pd.DataFrame]:
+    """使用openpyxl只读模式逐行读取xlsx"""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        if isinstance(sheet_name, str):
+            worksheet = workbook[sheet_name]
+        else:
+            worksheet = workbook.worksheets[sheet_name or 0]
+        rows = worksheet.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        header = [str(h) if h is not None else f"Unnamed: {i}" for i, h in enumerate(header)]
+        if columns is None:
+            positions = list(range(len(header)))
+        else:
+            wanted = set(columns)
+            positions = [i for i, h in enumerate(header) if h in wanted]
+        names = [header[i] for i in positions]
+
+        buffer = []
+        blank_rows = 0  # 与pandas一致：中间空行保留，末尾空行丢弃
+        for row in rows:
+            if row is None or all(v is None for v in row):
+                blank_rows += 1
+                continue
+            buffer.extend([None] * len(positions) for _ in range(blank_rows))
+            blank_rows = 0
+            buffer.append([row[i] if i < len(row) else None for i in positions])
+            while len(buffer) >= chunk_size:
+                yield pd.DataFrame(buffer[:chunk_size], columns=names)
+                buffer = buffer[chunk_size:]
+        if buffer:
+            yield pd.DataFrame(buffer, columns=names)
+    finally:
+        workbook.close()
+
+
+def apply_index_column(df: pd.DataFrame, index_column: Optional[str], start: int = 0) -> pd.DataFrame:
+    """
+    按导入元数据中的索引列重新排布导入副本的数据块
+
+    导入副本的第一列是导入时选定的索引列；修改索引列只记录在元数据中，读取时再调整。
+    index_column 为 None 表示保持导入时的索引列，空字符串表示使用行号（start 为块的起始行号）。
+    返回的DataFrame第一列为索引列。
+    """
+    if index_column is None or not len(df.columns):
+        return df
+    index_column = index_column or ROW_INDEX_NAME
+    if df.columns[0] == index_column:
+        return df
+    if df.columns[0] == ROW_INDEX_NAME:
+        # 导入时使用的行号不是原始数据列
+        df = df.iloc[:, 1:]
+    if index_column == ROW_INDEX_NAME:
+        df = df.copy()
+        df.insert(0, ROW_INDEX_NAME, range(start, start + len(df)))
+        return df
+    if index_column not in df.columns:
+        raise ValueError(f"索引列不存在: {index_column}")
+    return df[[index_column] + [c for c in df.columns if c != index_column]]
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据目录磁盘回收
+后台定期扫描 imports/、temp/、exports/，按每个目录的保留时长与容量上限删除最旧的文件，
+数据卷剩余空间不足时跨目录继续回收；运行中任务引用的文件永不删除
+"""
+
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+# 作为整体回收的子目录：其下每个条目（如每个上传会话）单独计算大小与时间
+NESTED_UNITS = {'temp': ['uploads']}
+
+
+class DiskJanitor:
+    """按目录配额回收数据目录中的文件"""
+
+    def __init__(self, base_dir: str, policies: Dict[str, Dict[str, float]],
+                 referenced: Callable[[], Iterable[str]], min_free_bytes: int = 0, grace_seconds: float = 300,
+                 on_delete: Optional[Callable[[str], None]] = None, log_manager=None):
+        """
+        Args:
+            base_dir: 数据目录
+            policies: {子目录: {'max_age_hours': 保留时长, 'max_bytes': 容量上限}}，0 表示不限制
+            referenced: 返回当前被引用的路径或路径前缀（运行中任务的输入、检查点、导出等），每次删除前重新获取
+            min_free_bytes: 数据卷剩余空间低于该值时忽略保留时长，跨目录从最旧的文件开始回收
+            grace_seconds: 最近修改过的文件不回收，避免删除刚上传或正在写入的文件
+            on_delete: 删除一个条目后的回调（参数为路径）
+        """
+        self.base_dir = Path(base_dir)
+        self.policies = policies
+        self.referenced = referenced
+        self.min_free_bytes = int(min_free_bytes)
+        self.grace_seconds = grace_seconds
+        self.on_delete = on_delete
+        self.log_manager = log_manager
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.last_sweep: Optional[Dict[str, Any]] = None
+
+    def start(self, interval: float):
+        """启动后台回收线程（每 interval 秒扫描一次）"""
+        if self._thread is not None:
+            return
+
+        def loop():
+            while True:
+                try:
+                    self.sweep()
+                except Exception as e:
+                    self._log_error(f"磁盘回收失败: {e}")
+                time.sleep(interval)
+
+        self._thread = threading.Thread(target=loop, name='disk-janitor', daemon=True)
+        self._thread.start()
+
+    def sweep(self) -> Dict[str, Any]:
+        """执行一次回收，返回删除的条目数与释放的字节数"""
+        with self._lock:
+            started = time.time()
+            deleted: List[Dict[str, Any]] = []
+            units = {name: self._scan(name) for name in self.policies}
+            for name, policy in self.policies.items():
+                entries = units[name]
+                max_age = float(policy.get('max_age_hours') or 0) * 3600
+                if max_age:
+                    for entry in [e for e in entries if started - e['mtime'] > max_age]:
+                        self._delete(entry, 'expired', entries, deleted)
+                max_bytes = int(policy.get('max_bytes') or 0)
+                total = sum(e['bytes'] for e in entries)
+                if max_bytes and total > max_bytes:
+                    for entry in sorted(entries, key=lambda e: e['mtime']):
+                        if total <= max_bytes:
+                            break
+                        if self._delete(entry, 'quota', entries, deleted):
+                            total -= entry['bytes']
+            # 数据卷空间不足：跨目录从最旧的开始回收
+            if self.min_free_bytes and self._free_bytes() < self.min_free_bytes:
+                pool = sorted((e for entries in units.values() for e in entries), key=lambda e: e['mtime'])
+                for entry in pool:
+                    if self._free_bytes() >= self.min_free_bytes:
+                        break
+                    self._delete(entry, 'low_disk', units[entry['dir']], deleted)
+            freed = sum(e['bytes'] for e in deleted)
+            self.last_sweep = {
+                'time': datetime.fromtimestamp(started).isoformat(),
+                'duration_seconds': round(time.time() - started, 3),
+                'deleted': len(deleted),
+                'freed_bytes': freed,
+            }
+            if deleted:
+                self._log_info(f"磁盘回收完成，删除 {len(deleted)} 项，释放 {freed} 字节")
+            return self.last_sweep
+
+    def report(self) -> Dict[str, Any]:
+        """各目录的占用、被引用的占用、最旧条目时间与配额，以及数据卷空间"""
+        refs = self._referenced()
+        directories = {}
+        for name, policy in self.policies.items():
+            entries = self._scan(name)
+            directories[name] = {
+                'bytes': sum(e['bytes'] for e in entries),
+                'entries': len(entries),
+                'referenced_bytes': sum(e['bytes'] for e in entries if self._is_referenced(e['path'], refs)),
+                'oldest': datetime.fromtimestamp(min(e['mtime'] for e in entries)).isoformat() if entries else None,
+                'max_age_hours': policy.get('max_age_hours') or 0,
+                'max_bytes': policy.get('max_bytes') or 0,
+            }
+        usage = shutil.disk_usage(self.base_dir)
+        return {
+            'directories': directories,
+            'volume': {'total_bytes': usage.total, 'used_bytes': usage.used, 'free_bytes': usage.free,
+                       'min_free_bytes': self.min_free_bytes},
+            'last_sweep': self.last_sweep,
+        }
+
+    def _scan(self, name: str) -> List[Dict[str, Any]]:
+        """列出目录下的回收单元（文件或目录）及其大小与最后修改时间"""
+        directory = self.base_dir / name
+        nested = set(NESTED_UNITS.get(name, []))
+        entries = []
+        if not directory.is_dir():
+            return entries
+        for path in directory.iterdir():
+            if path.name in nested and path.is_dir():
+                entries.extend(self._measure(child, name) for child in path.iterdir())
+            else:
+                entries.append(self._measure(path, name))
+        return [e for e in entries if e is not None]
+
+    def _measure(self, path: Path, name: str) -> Optional[Dict[str, Any]]:
+        try:
+            if path.is_dir():
+                size, mtime = 0, path.stat().st_mtime
+                for root, _, files in os.walk(path):
+                    for file in files:
+                        stat = os.stat(os.path.join(root, file))
+                        size += stat.st_size
+                        mtime = max(mtime, stat.st_mtime)
+            else:
+                stat = path.stat()
+                size, mtime = stat.st_size, stat.st_mtime
+        except OSError:
+            # 扫描期间被删除
+            return None
+        return {'path': str(path), 'dir': name, 'bytes': size, 'mtime': mtime}
+
+    def _delete(self, entry: Dict[str, Any], reason: str, entries: List[Dict[str, Any]],
+                deleted: List[Dict[str, Any]]) -> bool:
+        """删除一个回收单元，被引用、处于保护期或已删除时跳过；返回是否删除"""
+        if entry not in entries or time.time() - entry['mtime'] < self.grace_seconds:
+            return False
+        # 每次删除前重新获取引用，避免删除刚启动的任务所用的文件
+        if self._is_referenced(entry['path'], self._referenced()):
+            return False
+        try:
+            if os.path.isdir(entry['path']):
+                shutil.rmtree(entry['path'])
+            else:
+                os.remove(entry['path'])
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            self._log_error(f"删除失败 {entry['path']}: {e}")
+            return False
+        entries.remove(entry)
+        deleted.append(entry)
+        self._log_info(f"磁盘回收（{reason}）: {entry['path']}, {entry['bytes']} 字节")
+        if self.on_delete:
+            self.on_delete(entry['path'])
+        return True
+
+    def _referenced(self) -> List[str]:
+        return [os.path.abspath(p) for p in self.referenced() if p]
+
+    @staticmethod
+    def _is_referenced(path: str, refs: List[str]) -> bool:
+        """条目本身、条目内的路径或以引用前缀开头的条目均视为被引用"""
+        path = os.path.abspath(path)
+        return any(path.startswith(ref) or ref.startswith(path + os.sep) for ref in refs)
+
+    def _free_bytes(self) -> int:
+        return shutil.disk_usage(self.base_dir).free
+
+    def _log_info(self, message: str):
+        if self.log_manager:
+            self.log_manager.info(message)
+
+    def _log_error(self, message: str):
+        if self.log_manager:
+            self.log_manager.error(message)
@@ -7,6 +7,8 @@ Excel半结构化数据解析工具
 
 import os
 import sys
+import shutil
+import numpy as np
 import pandas as pd
 import requests
 import json
@@ -14,7 +16,7 @@ import time
 import re
 import asyncio
 import threading
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable
 import logging
 from datetime import datetime
 from pathlib import Path
@@ -25,6 +27,23 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # 导入日志管理器
 from logger_manager import LogManager
+from data_readers import (read_header, read_frame, read_rows, iter_chunks, list_sheets, apply_index_column,
+                          EXCEL_EXTENSIONS, ROW_INDEX_NAME)
+from segment_log import SegmentLog
+from column_types import (normalize_column_types, empty_column, coerce_values, assign_values,
+                          COERCION_ERROR_COLUMN)
+from result_writers import IncrementalExporter, output_suffix, DEFAULT_OUTPUT_FORMAT
+from background_writer import BackgroundWriter
+from disk_janitor import DiskJanitor
+from column_profile import ColumnProfiler, estimate_text_tokens
+from task_scheduler import TaskScheduler, TaskInterrupted, CONTROL_ACTIONS
+from task_registry import TaskRegistry, ImportRegistry
+from provider_quota import ProviderQuota, quota_key_id
+import task_events
+from task_events import TaskEventLog
+from job_leases import LeaseTable, default_worker_id, DONE as LEASE_DONE, FAILED as LEASE_FAILED
+from memory_budget import (MemoryBudget, MemoryBudgetExceeded, current_rss, default_budget_bytes, format_bytes,
+                           frame_nbytes, import_memory_estimate)
 
 class TaskStatus(Enum):
     """任务状态枚举"""
@@ -32,6 +51,8 @@ class TaskStatus(Enum):
     PROCESSING = "processing"
     COMPLETED = "completed"
     FAILED = "failed"
+    PAUSED = "paused"  # 在检查点处暂停，可继续
+    CANCELLED = "cancelled"  # 已取消，保留已落盘的部分结果
 
 @dataclass
 class ParsingRule:
@@ -40,10 +61,12 @@ class ParsingRule:
     target_columns: List[str]  # 目标列名列表
     prompt: str  # 解析提示词
     rule_id: str = None  # 规则ID
+    column_types: Dict[str, str] = None  # 目标列类型 {列名: int/float/date/category}，未声明的列为文本
     
     def __post_init__(self):
         if self.rule_id is None:
             self.rule_id = str(uuid.uuid4())
+        self.column_types = normalize_column_types(self.column_types, self.target_columns)
 
 @dataclass
 class ProcessingTask:
@@ -64,10 +87,22 @@ class ProcessingTask:
     partial_output_file: Optional[str] = None
     progress_file: Optional[str] = None
     name: str = ""
+    chunk_size: int = 0  # >0 时启用分块（流式）处理，每块行数
+    checkpoint_seq: int = 0  # 最近一次检查点的段序号
+    output_format: str = DEFAULT_OUTPUT_FORMAT  # 导出格式: xlsx/csv/csv.gz/parquet/jsonl
+    index_column: Optional[str] = None  # 索引列，None表示导入副本的第一列，空字符串表示行号
+    priority: int = 0  # 调度优先级，越大越先运行
+    weight: float = 1.0  # 与其他运行中任务争用请求槽位时的分配权重
+    memory_estimate: int = 0  # 运行时的内存估算（字节），开始运行前按此预留
+
+# Python 字符串对象的固定开销（字节），中文字符按每字符2字节计
+STR_OBJECT_BYTES = 50
 
 class ExcelStructuredParser:
     """Excel半结构化数据解析器"""
     
+    BATCH_SIZE = 10  # 每次API调用处理的记录数
+    
     def __init__(self, api_key: str = None, base_dir: str = None):
         """
         初始化解析器
@@ -99,16 +134,87 @@ class ExcelStructuredParser:
         self.tasks: Dict[str, ProcessingTask] = {}
         self._tasks_lock = threading.Lock()
         
-        # 存储导入的Excel数据
-        self.excel_data: Dict[str, pd.DataFrame] = {}
+        # 任务注册表（SQLite）：任务元数据与进度的持久化存储，任务列表直接分页查询
+        self.registry = TaskRegistry(Config.TASK_DB_PATH or self.base_dir / "tasks.db")
+        
+        # 导入元数据：导入副本路径、源文件、工作表、行数、预览行与列画像；保存在注册表数据库中，多个Web工作进程共享。
+        # 导入的数据只保存在磁盘上的导入副本，不驻留内存，任务运行时按列从导入副本加载
+        self.import_meta = ImportRegistry(self.registry.db_path)
+        
+        # 正在后台生成的部分结果导出 {任务ID: 线程}
+        self._partial_exports: Dict[str, threading.Thread] = {}
+        self._partial_lock = threading.Lock()
+        
+        # 运行中任务的后台写入线程 {任务ID: 写入器}
+        self._writers: Dict[str, BackgroundWriter] = {}
+        
+        # 内存预算：任务开始运行前按估算预留内存，不足时在调度队列中等待（或提交时立即失败），
+        # 整表导入在读取前预留（导入的数据只写出导入副本，任务运行时按列从副本加载，不常驻内存）
+        self.memory = MemoryBudget(default_budget_bytes(Config.MEMORY_BUDGET, Config.MEMORY_BUDGET_FRACTION),
+                                   baseline_bytes=current_rss())
+        self._memory_waiting: Dict[str, float] = {}  # 等待内存的任务ID -> 开始等待的时间
+        
+        # 全局任务调度：限制同时运行的任务数，并按提供方限制、按权重分配大模型请求槽位
+        self.provider = Config.LLM_PROVIDER
+        self.scheduler = TaskScheduler(self._process_task, Config.MAX_RUNNING_TASKS,
+                                       Config.PROVIDER_CONCURRENCY, Config.DEFAULT_PROVIDER_CONCURRENCY,
+                                       admit=self._admit_task)
+        self.memory.on_release(self.scheduler.wake)
+        
+        # 跨进程共享的提供方配额：同一API密钥的所有进程（及 ai-model-compare 服务）共用一个令牌桶
+        self.quota = ProviderQuota(Config.QUOTA_DB_PATH or self.base_dir / "provider_quota.db",
+                                   'excel-parse-tools') if Config.QUOTA_ENABLED else None
+        self.quota_key = quota_key_id(self.headers["Authorization"].split(" ", 1)[-1])
+        
+        self._migrate_progress_files()
+        
+        # 任务执行：inline 在本进程的调度器中运行；external 只登记到注册表，由 run.py --executor 领取运行
+        self.owner_id = default_worker_id()
+        self.inline_execution = Config.TASK_EXECUTOR != 'external'
+        self._live_synced: Dict[str, float] = {}  # 任务ID -> 最近一次同步实时进度的时间
+        # 执行中任务的中断请求（暂停/取消/让出运行位置），批次处理在每个批次前检查
+        self._controls: Dict[str, str] = {}  # 任务ID -> 操作
+        self._control_checked: Dict[str, float] = {}  # 任务ID -> 最近一次从注册表读取中断请求的时间
+        # 任务心跳线程：本进程第一次运行任务时启动，只登记任务的Web进程与工作进程不启动
+        self._heartbeat: Optional[threading.Thread] = None
+        
+        # 分布式执行的行区间租约表（与任务注册表共用数据库），由 run.py --worker 启动的工作进程领取
+        self.leases = LeaseTable(self.registry.db_path, Config.LEASE_MAX_ATTEMPTS)
+        
+        # 任务事件（进度、批次完成、错误、状态变化），任务页面通过 /events 订阅
+        self.events = TaskEventLog(self.registry.db_path, Config.EVENT_RETENTION)
+        self._status_published: Dict[str, str] = {}  # 任务ID -> 最近一次发布的状态
+        self._progress_published: Dict[str, float] = {}  # 任务ID -> 最近一次发布进度事件的时间
+    
+    def _start_owner_heartbeat(self):
+        """后台定期刷新本进程所持有任务的心跳，其他进程据此判断任务是否仍在运行（调用方持有 _tasks_lock）"""
+        from config import Config
+        
+        if self._heartbeat is not None:
+            return
+        interval = Config.OWNER_HEARTBEAT_INTERVAL
+        
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    if self.tasks:
+                        self.registry.touch_owner(self.owner_id)
+                except Exception as e:
+                    self.log_manager.error(f"刷新任务心跳失败: {e}")
+        
+        self._heartbeat = threading.Thread(target=loop, name="owner-heartbeat", daemon=True)
+        self._heartbeat.start()
     
-    def import_excel(self, file_path: str, index_column: str = None) -> str:
+    def import_excel(self, file_path: str, index_column: str = None, chunk_size: int = 0, sheet_name: str = None) -> str:
         """
-        导入Excel文件
+        导入数据文件（Excel/CSV/TSV/Parquet）
         
         Args:
-            file_path: Excel文件路径
+            file_path: 数据文件路径
             index_column: 索引列名，如果为None则使用行号作为索引
+            chunk_size: 大于0时按该行数分块流式导入，数据不加载到内存
+            sheet_name: Excel工作表名称，None表示第一个工作表
             
         Returns:
             导入ID
@@ -117,36 +223,131 @@ class ExcelStructuredParser:
             # 生成唯一导入ID
             import_id = str(uuid.uuid4())
             
-            # 读取Excel文件
-            self.log_manager.info(f"正在导入Excel文件: {file_path}")
-            df = pd.read_excel(file_path)
-            
-            # 设置索引列
-            if index_column and index_column in df.columns:
-                df.set_index(index_column, inplace=True)
-                self.log_manager.info(f"使用列 '{index_column}' 作为索引")
-            else:
-                # 如果没有指定索引列，使用行号作为索引
-                df.index.name = 'Row_Index'
-                self.log_manager.info("使用行号作为索引")
-            
-            # 保存到临时目录
-            temp_file = self.base_dir / "imports" / f"{import_id}.xlsx"
-            df.to_excel(temp_file, index=True)
-            
-            # 存储数据
-            self.excel_data[import_id] = df
+            if chunk_size and chunk_size > 0:
+                return self._import_chunked(import_id, file_path, index_column, int(chunk_size), sheet_name)
             
-            self.log_manager.info(f"Excel文件导入成功，导入ID: {import_id}")
-            self.log_manager.info(f"数据形状: {df.shape}")
-            self.log_manager.info(f"列名: {list(df.columns)}")
-            
-            return import_id
+            # 整表读入内存前预留内存：不足时按配置等待或立即失败，写出导入副本后释放
+            from config import Config
+            memory_key = f"import:{import_id}"
+            timeout = Config.MEMORY_WAIT_TIMEOUT if Config.MEMORY_ADMISSION == 'queue' else 0
+            self.memory.reserve(memory_key, import_memory_estimate(file_path), f"导入 {Path(file_path).name} ", timeout)
+            try:
+                return self._import_in_memory(import_id, file_path, index_column, sheet_name)
+            finally:
+                self.memory.release(memory_key)
             
         except Exception as e:
             self.log_manager.error(f"导入Excel文件失败: {e}")
             raise
     
+    def _import_in_memory(self, import_id: str, file_path: str, index_column: Optional[str],
+                          sheet_name: Optional[str] = None) -> str:
+        """整表导入：读入内存、写出导入副本并计算列画像"""
+        # 读取数据文件
+        self.log_manager.info(f"正在导入文件: {file_path}" + (f", 工作表: {sheet_name}" if sheet_name else ""))
+        df = read_frame(file_path, sheet_name=sheet_name)
+        
+        # 设置索引列
+        if index_column and index_column in df.columns:
+            df.set_index(index_column, inplace=True)
+            self.log_manager.info(f"使用列 '{index_column}' 作为索引")
+        else:
+            # 如果没有指定索引列，使用行号作为索引
+            index_column = ""
+            df.index.name = ROW_INDEX_NAME
+            self.log_manager.info("使用行号作为索引")
+        
+        # 保存导入副本：Excel来源保持xlsx，其余格式写CSV（避免xlsx行数上限与写入开销）
+        temp_file = self.base_dir / "imports" / f"{import_id}{self._import_copy_suffix(file_path)}"
+        self._write_import_copy(df, str(temp_file))
+        
+        # 只保留元数据、预览行与列画像，数据帧在导入结束后释放
+        profiler = self._new_profiler()
+        profiler.add(df)
+        self.import_meta[import_id] = self._build_import_meta(str(temp_file), file_path, sheet_name, chunked=False,
+                                                              index_column=index_column, profiler=profiler)
+        
+        self.log_manager.info(f"Excel文件导入成功，导入ID: {import_id}")
+        self.log_manager.info(f"数据形状: {df.shape}")
+        self.log_manager.info(f"列名: {list(df.columns)}")
+        
+        return import_id
+    
+    def _import_copy_suffix(self, file_path: str) -> str:
+        return ".xlsx" if Path(file_path).suffix.lower() in EXCEL_EXTENSIONS else ".csv"
+    
+    def _write_import_copy(self, df: pd.DataFrame, path: str):
+        """按扩展名写出导入副本（索引作为第一列）"""
+        if path.endswith(".csv"):
+            df.to_csv(path, index=True, encoding='utf-8')
+        else:
+            df.to_excel(path, index=True)
+    
+    def _new_profiler(self) -> ColumnProfiler:
+        from config import Config
+        return ColumnProfiler(Config.PROFILE_SAMPLE_ROWS)
+    
+    def _build_import_meta(self, input_file: str, source_file: str, sheet_name: Optional[str], chunked: bool,
+                           index_column: str = "", profiler: ColumnProfiler = None) -> Dict[str, Any]:
+        return {
+            "input_file": input_file,
+            "source_file": source_file,
+            "sheet_name": sheet_name,
+            "sheets": list_sheets(source_file),
+            "chunked": chunked,
+            # 当前索引列（空字符串表示行号）；修改索引列只更新该字段，读取与导出时再应用
+            "index_column": index_column,
+            # 导入时计算一次的行数、预览行与抽样列画像，文件信息接口直接使用，不访问完整数据
+            "rows": profiler.rows,
+            "sample": self._encode_sample(profiler.preview),
+            "dtypes": profiler.dtypes,
+            "profile": profiler.profile(),
+            # 按索引列缓存渲染好的预览 {索引列: 预览信息}
+            "preview_cache": {}
+        }
+    
+    def _encode_sample(self, df: pd.DataFrame) -> Dict[str, Any]:
+        """把预览行编码为可JSON序列化的形式（第一列为导入副本的索引列）"""
+        flat = df.reset_index()
+        return {
+            "columns": [str(c) for c in flat.columns],
+            "data": flat.astype(object).where(flat.notna(), None).values.tolist(),
+        }
+    
+    def _sample_frame(self, meta: Dict[str, Any]) -> pd.DataFrame:
+        """还原导入元数据中的预览行（以导入副本第一列为索引）"""
+        sample = meta["sample"]
+        df = pd.DataFrame(sample["data"], columns=sample["columns"], dtype=object)
+        return df.set_index(sample["columns"][0])
+    
+    def _import_chunked(self, import_id: str, file_path: str, index_column: Optional[str], chunk_size: int,
+                        sheet_name: Optional[str] = None) -> str:
+        """分块流式导入：逐块写入CSV导入副本，只在内存中保留元数据与预览"""
+        self.log_manager.info(f"正在分块导入文件: {file_path}, 块大小: {chunk_size}")
+        header = read_header(file_path, sheet_name)
+        use_index = bool(index_column and index_column in header)
+        dest_file = self.base_dir / "imports" / f"{import_id}.csv"
+        
+        total_rows = 0
+        profiler = self._new_profiler()
+        for chunk in iter_chunks(file_path, chunk_size, sheet_name=sheet_name):
+            if use_index:
+                chunk = chunk.set_index(index_column)
+            else:
+                chunk.index = pd.RangeIndex(total_rows, total_rows + len(chunk), name=ROW_INDEX_NAME)
+            chunk.to_csv(dest_file, mode='a', header=(total_rows == 0), index=True, encoding='utf-8')
+            profiler.add(chunk)
+            total_rows += len(chunk)
+        
+        if total_rows == 0:
+            raise ValueError("文件中没有数据行")
+        
+        self.import_meta[import_id] = self._build_import_meta(str(dest_file), file_path, sheet_name, chunked=True,
+                                                              index_column=index_column if use_index else "",
+                                                              profiler=profiler)
+        self.log_manager.info(f"分块导入成功，导入ID: {import_id}, 记录数: {total_rows}")
+        return import_id
+    
     def get_excel_info(self, import_id: str) -> Dict[str, Any]:
         """
         获取导入的Excel文件信息
@@ -157,21 +358,66 @@ class ExcelStructuredParser:
         Returns:
             Excel文件信息字典
         """
-        if import_id not in self.excel_data:
+        meta = self.import_meta.get(import_id)
+        if meta is None:
             raise ValueError(f"导入ID不存在: {import_id}")
         
-        df = self.excel_data[import_id]
-        
-        return {
+        # 预览只由导入时缓存的预览行生成，并按索引列缓存，不访问完整数据
+        index_column = meta.get("index_column")
+        # JSON对象的键只能是字符串，None（导入副本第一列）与空字符串（行号）分开缓存
+        cache_key = json.dumps(index_column, ensure_ascii=False)
+        preview = meta["preview_cache"].get(cache_key)
+        if preview is None:
+            sample_df = self._apply_index_view(self._sample_frame(meta), index_column)
+            preview = {
+                "columns": [str(c) for c in list(sample_df.columns)],
+                "index_name": str(sample_df.index.name) if sample_df.index.name is not None else "",
+                "sample_data": sample_df.fillna("").astype(str).to_dict('records'),
+            }
+            meta["preview_cache"][cache_key] = preview
+            self.import_meta[import_id] = meta
+        info = {
             "import_id": import_id,
-            "shape": [int(df.shape[0]), int(df.shape[1])],
-            "columns": [str(c) for c in list(df.columns)],
-            "index_name": str(df.index.name) if df.index.name is not None else "",
-            "sample_data": df.head(5).fillna("").astype(str).to_dict('records'),
-            "data_types": {col: str(dtype) for col, dtype in df.dtypes.items()}
+            "shape": [int(meta["rows"]), len(preview["columns"])],
+            "columns": preview["columns"],
+            "index_name": preview["index_name"],
+            "sample_data": preview["sample_data"],
+            "data_types": {col: meta["dtypes"].get(col, "object") for col in preview["columns"]},
+            "profile": meta["profile"]
         }
+        info["chunked"] = bool(meta.get("chunked"))
+        info["sheets"] = meta.get("sheets", [])
+        info["sheet_name"] = meta.get("sheet_name") or ""
+        return info
+    
+    def set_index_column(self, import_id: str, index_column: Optional[str]):
+        """
+        修改导入数据的索引列
+        
+        只更新导入元数据，不改写内存数据与导入副本；加载与导出时再按元数据应用。
+        index_column 为空表示使用行号。
+        """
+        meta = self.import_meta.get(import_id)
+        if meta is None:
+            raise ValueError(f"导入ID不存在: {import_id}")
+        if index_column:
+            sample_df = self._sample_frame(meta)
+            available = [sample_df.index.name] + [str(c) for c in sample_df.columns]
+            if index_column not in available or index_column == ROW_INDEX_NAME:
+                raise ValueError(f"索引列不存在: {index_column}")
+        meta["index_column"] = index_column or ""
+        self.import_meta[import_id] = meta
+        self.log_manager.info(f"导入 {import_id} 的索引列已设置为: {index_column or '行号'}")
+    
+    def _apply_index_view(self, df: pd.DataFrame, index_column: Optional[str]) -> pd.DataFrame:
+        """按索引列返回数据视图（df 以导入副本第一列为索引）"""
+        if index_column is None or (index_column or ROW_INDEX_NAME) == df.index.name:
+            return df
+        flat = apply_index_column(df.reset_index(), index_column)
+        return flat.set_index(flat.columns[0])
     
-    def create_parsing_rule(self, source_column: str, target_columns: List[str], prompt: str) -> ParsingRule:
+    def create_parsing_rule(self, source_column: str, target_columns: List[str], prompt: str,
+                            column_types: Dict[str, str] = None) -> ParsingRule:
         """
         创建解析规则
         
@@ -179,6 +425,7 @@ class ExcelStructuredParser:
             source_column: 源列名
             target_columns: 目标列名列表
             prompt: 解析提示词
+            column_types: 目标列类型 {列名: int/float/date/category}
             
         Returns:
             解析规则对象
@@ -186,49 +433,182 @@ class ExcelStructuredParser:
         return ParsingRule(
             source_column=source_column,
             target_columns=target_columns,
-            prompt=prompt
+            prompt=prompt,
+            column_types=column_types
         )
     
-    def start_processing_task(self, import_id: str, parsing_rules: List[ParsingRule], threads: int = 1, checkpoint_every: int = 50, name: str = "") -> str:
+    def start_processing_task(self, import_id: str, parsing_rules: List[ParsingRule], threads: int = 1, checkpoint_every: int = 50, name: str = "", chunk_size: int = 0,
+                              output_format: str = DEFAULT_OUTPUT_FORMAT, priority: int = 0, weight: float = 1.0,
+                              preempt: bool = False) -> str:
         """
         启动异步处理任务
+        
+        chunk_size 大于0时以分块模式处理；分块导入的数据默认使用配置的块大小。
+        output_format 指定导出格式（xlsx/csv/csv.gz/parquet/jsonl）。
+        任务提交到全局调度器排队，priority 越大越先运行，weight 决定运行时分得的请求槽位比例；
+        preempt 为真时让优先级更低的执行中任务在检查点处让出运行位置（之后自动重新排队）。
         """
-        if import_id not in self.excel_data:
+        from config import Config
+        
+        meta = self.import_meta.get(import_id)
+        if meta is None:
             raise ValueError(f"导入ID不存在: {import_id}")
+        input_file = meta["input_file"]
+        total_records = int(meta["rows"])
+        if meta.get("chunked"):
+            chunk_size = chunk_size or Config.CHUNK_SIZE
+        chunk_size = max(0, int(chunk_size or 0))
+        suffix = output_suffix(output_format)
         task_id = str(uuid.uuid4())
-        output_filename = f"processed_{import_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+        output_filename = f"processed_{import_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}{suffix}"
         output_file = str(self.base_dir / "exports" / output_filename)
-        partial_output_file = str(self.base_dir / "temp" / f"{task_id}_partial.pkl")
+        partial_output_file = str(self.base_dir / "temp" / f"{task_id}_segments")
         progress_file = str(self.base_dir / "temp" / f"{task_id}_progress.json")
         task = ProcessingTask(
             task_id=task_id,
-            input_file=str(self.base_dir / "imports" / f"{import_id}.xlsx"),
+            input_file=input_file,
             output_file=output_file,
             parsing_rules=parsing_rules,
             status=TaskStatus.PENDING,
             progress=0.0,
-            total_records=len(self.excel_data[import_id]),
+            total_records=total_records,
             processed_records=0,
             start_time=datetime.now(),
             threads=max(1, int(threads)),
             checkpoint_every=max(1, int(checkpoint_every)),
             partial_output_file=partial_output_file,
             progress_file=progress_file,
-            name=str(name or "")
+            name=str(name or ""),
+            chunk_size=chunk_size,
+            output_format=output_format,
+            index_column=meta.get("index_column"),
+            priority=int(priority),
+            weight=max(float(weight), 0.01)
         )
+        task.memory_estimate = self._estimate_task_memory(task, meta.get("profile"))
+        if self.inline_execution:
+            self._check_memory_admission(task)
         with self._tasks_lock:
             self.tasks[task_id] = task
-        thread = threading.Thread(target=self._process_task, args=(task_id,))
-        thread.daemon = True
-        thread.start()
-        self.log_manager.info(f"处理任务已启动，任务ID: {task_id}")
+        self._save_progress(task)
+        self._schedule(task)
+        self.log_manager.info(f"处理任务已提交，任务ID: {task_id}, 优先级: {task.priority}")
+        if preempt:
+            self._preempt_for(task)
         return task_id
     
-    def _save_progress(self, task: ProcessingTask, result_df: pd.DataFrame):
-        """保存中间结果与进度文件"""
+    def _schedule(self, task: ProcessingTask):
+        """
+        安排任务执行
+        
+        inline 模式提交到本进程的全局调度器；external 模式只在注册表中登记为未分配的排队任务，
+        由独立执行进程领取，本进程不保留任务对象（状态统一从注册表读取）。
+        """
+        if self.inline_execution:
+            self.run_locally(task)
+            return
+        self._save_progress(task)
+        self.registry.set_owner(task.task_id, None)
+        with self._tasks_lock:
+            self.tasks.pop(task.task_id, None)
+    
+    def run_locally(self, task: ProcessingTask):
+        """把任务提交到本进程的全局调度器，轮到时在调度器的后台线程中执行"""
+        if not task.memory_estimate:
+            meta = self.import_meta.get(Path(task.input_file).stem, {})
+            task.memory_estimate = self._estimate_task_memory(task, meta.get("profile"))
+        with self._tasks_lock:
+            self.tasks[task.task_id] = task
+            self._start_owner_heartbeat()
+        self.registry.set_owner(task.task_id, self.owner_id)
+        self.scheduler.submit(task.task_id, priority=task.priority, weight=task.weight,
+                              max_in_flight=task.threads, provider=self.provider)
+    
+    def _estimate_task_memory(self, task: ProcessingTask, profile: Optional[Dict[str, Any]] = None) -> int:
+        """
+        估算任务运行时的内存占用（字节）
+        
+        同时在内存中的行数：整表模式为全部行，分块模式为一块，分布式模式为一个区间；
+        每行占用 = 规则引用的源列单元格（按列画像的平均长度）+ 目标列单元格；
+        另加进行中的请求（每个线程一批的提示词与响应）、排队中的检查点快照与固定开销。
+        """
+        from config import Config
+        if Config.EXECUTION_MODE == 'distributed':
+            rows = min(task.total_records, Config.LEASE_ROWS)
+        elif task.chunk_size > 0:
+            rows = min(task.total_records, task.chunk_size)
+        else:
+            rows = task.total_records
+        columns = (profile or {}).get("columns", {})
+        
+        def cell_bytes(avg_chars: float) -> float:
+            return STR_OBJECT_BYTES + 2 * avg_chars
+        
+        source_chars = []
+        for col in self._get_source_columns(task.parsing_rules):
+            stats = columns.get(col)
+            if stats is None:
+                source_chars.append(Config.MEMORY_DEFAULT_CELL_CHARS)
+            else:
+                source_chars.append(stats.get("avg_length", 0.0) * (1.0 - stats.get("null_rate", 0.0)))
+        targets = len(self._get_target_columns(task.parsing_rules))
+        row_bytes = sum(cell_bytes(c) for c in source_chars) + targets * cell_bytes(Config.MEMORY_RESULT_CELL_CHARS)
+        # 一批的提示词（源列文本）与响应（目标列文本），请求与解析时各有一份副本
+        batch_bytes = self.BATCH_SIZE * (2 * max(source_chars or [0]) + targets * 2 * Config.MEMORY_RESULT_CELL_CHARS)
+        in_flight = task.threads * 2 * batch_bytes
+        checkpoints = Config.WRITER_QUEUE_SIZE * min(task.checkpoint_every, rows) * row_bytes
+        return int(rows * row_bytes + in_flight + checkpoints + Config.TASK_BASE_MEMORY)
+    
+    def _check_memory_admission(self, task: ProcessingTask):
+        """
+        提交时的内存检查：预计占用超过整个预算时立即失败；
+        MEMORY_ADMISSION 为 fail 时当前可用内存不足也立即失败（queue 时在调度队列中等待）
+        """
+        from config import Config
+        label = f"任务 {task.name or task.task_id[:8]} "
+        self.memory.check_fits(task.memory_estimate, label)
+        if Config.MEMORY_ADMISSION == 'fail' and self.memory.enabled and task.memory_estimate > self.memory.available():
+            raise MemoryBudgetExceeded(
+                f"{label}需要内存 {format_bytes(task.memory_estimate)}，当前可用 "
+                f"{format_bytes(max(self.memory.available(), 0))}（预算 {format_bytes(self.memory.budget_bytes)}），请稍后重试")
+    
+    def _admit_task(self, task_id: str) -> bool:
+        """（调度器，持有调度锁）任务开始运行前按估算预留内存；不足时任务留在队首，内存释放后重试"""
+        task = self.tasks.get(task_id)
+        if task is None:
+            return True
+        if self.memory.try_reserve(task_id, task.memory_estimate, f"任务 {task.name or task_id[:8]}"):
+            waited_since = self._memory_waiting.pop(task_id, None)
+            if waited_since is not None:
+                self.log_manager.info(f"任务 {task_id} 等待内存 {time.time() - waited_since:.1f} 秒后开始运行")
+            return True
+        if task_id not in self._memory_waiting:
+            self._memory_waiting[task_id] = time.time()
+            self.log_manager.info(
+                f"任务 {task_id} 等待内存：需要 {format_bytes(task.memory_estimate)}，"
+                f"当前可用 {format_bytes(max(self.memory.available(), 0))}")
+        return False
+    
+    def task_memory(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """本进程中任务的内存占用：预留、实际（按组成部分）、估算，以及是否在等待内存"""
+        task = self.tasks.get(task_id)
+        if task is None:
+            return None
+        usage = self.memory.usage(task_id) or {'reserved_bytes': 0, 'used_bytes': 0, 'components': {}}
+        usage['estimate_bytes'] = task.memory_estimate
+        usage['waiting'] = self.scheduler.is_blocked(task_id)
+        return usage
+    
+    def _save_progress(self, task: ProcessingTask, processed_records: Optional[int] = None):
+        """
+        保存任务元数据与进度到任务注册表（部分结果已在检查点时追加到段日志）；
+        开启 WRITE_PROGRESS_FILES 时同时写出进度JSON文件
+        
+        Args:
+            processed_records: 已落盘的记录数；后台写入检查点时批次处理已继续推进，需记录检查点位置而非实时进度
+        """
+        from config import Config
         try:
-            # 保存部分结果
-            result_df.to_pickle(task.partial_output_file)
             # 保存进度元数据
             meta = {
                 "task_id": task.task_id,
@@ -238,180 +618,752 @@ class ExcelStructuredParser:
                 "progress_file": task.progress_file,
                 "status": task.status.value,
                 "total_records": task.total_records,
-                "processed_records": task.processed_records,
+                "processed_records": task.processed_records if processed_records is None else processed_records,
                 "threads": task.threads,
                                  "checkpoint_every": task.checkpoint_every,
                  "name": task.name,
+                 "chunk_size": task.chunk_size,
+                 "checkpoint_seq": task.checkpoint_seq,
+                 "output_format": task.output_format,
+                 "index_column": task.index_column,
+                 "priority": task.priority,
+                 "weight": task.weight,
                  "parsing_rules": [
                      {
                          "source_column": r.source_column,
                          "target_columns": r.target_columns,
                          "prompt": r.prompt,
                          "rule_id": r.rule_id,
+                         "column_types": r.column_types,
                      }
                      for r in task.parsing_rules
                  ],
+                 "start_time": task.start_time.isoformat(),
+                 "end_time": task.end_time.isoformat() if task.end_time else None,
+                 "error_message": task.error_message,
                  "timestamp": datetime.now().isoformat(),
              }
-            with open(task.progress_file, "w", encoding="utf-8") as f:
-                json.dump(meta, f, ensure_ascii=False)
+            self.registry.save(meta)
+            # 执行中的检查点保存不重复发布状态事件
+            if self._status_published.get(task.task_id) != meta["status"]:
+                self._publish_status(task, meta["processed_records"])
+                if task.status == TaskStatus.PROCESSING:
+                    self._status_published[task.task_id] = meta["status"]
+                else:
+                    self._status_published.pop(task.task_id, None)
+            if Config.WRITE_PROGRESS_FILES:
+                # 先写临时文件再原子替换，避免写入中途崩溃损坏进度文件
+                tmp_file = f"{task.progress_file}.tmp"
+                with open(tmp_file, "w", encoding="utf-8") as f:
+                    json.dump(meta, f, ensure_ascii=False)
+                os.replace(tmp_file, task.progress_file)
         except Exception as e:
             self.log_manager.error(f"保存进度失败: {e}")
     
-    def _load_progress(self, task: ProcessingTask) -> Optional[pd.DataFrame]:
-        """加载进度与部分结果，如存在则返回部分结果DataFrame"""
+    def _publish(self, task_id: str, kind: str, data: Dict[str, Any] = None):
+        """发布任务事件；事件只用于页面实时显示，发布失败不影响任务处理"""
         try:
-            if task.partial_output_file and os.path.exists(task.partial_output_file):
-                return pd.read_pickle(task.partial_output_file)
+            self.events.publish(task_id, kind, data)
         except Exception as e:
-            self.log_manager.error(f"加载部分结果失败: {e}")
-        return None
+            self.log_manager.warning(f"发布任务事件失败: {e}")
+    
+    def _publish_status(self, task: ProcessingTask, processed_records: Optional[int] = None):
+        """发布任务状态变化事件"""
+        processed = task.processed_records if processed_records is None else processed_records
+        self._publish(task.task_id, task_events.STATUS, {
+            "status": task.status.value,
+            "processed_records": processed,
+            "total_records": task.total_records,
+            "progress": round(100.0 * processed / task.total_records, 2) if task.total_records else 0.0,
+            "error_message": task.error_message,
+            "end_time": task.end_time.isoformat() if task.end_time else None,
+        })
+    
+    def _load_task_meta(self, task_id: str) -> Dict[str, Any]:
+        """读取任务元数据：优先任务注册表，其次进度JSON文件，都不存在时返回空字典"""
+        meta = self.registry.get(task_id)
+        if meta is None:
+            meta = self._read_progress_meta(self.base_dir / "temp" / f"{task_id}_progress.json")
+        return meta
+    
+    def _migrate_progress_files(self):
+        """把注册表中还没有的旧进度JSON文件导入任务注册表（启动时执行一次）"""
+        known = self.registry.task_ids()
+        metas = []
+        for file in (self.base_dir / "temp").glob("*_progress.json"):
+            if file.name[:-len("_progress.json")] in known:
+                continue
+            meta = self._read_progress_meta(file)
+            if meta.get("task_id"):
+                metas.append(meta)
+        if metas:
+            self.registry.save_many(metas)
+            self.log_manager.info(f"已将 {len(metas)} 个进度文件导入任务注册表")
+    
+    def _read_progress_meta(self, progress_file) -> Dict[str, Any]:
+        """读取进度元数据文件，不存在或损坏时返回空字典"""
+        try:
+            with open(progress_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception:
+            return {}
+    
+    def _open_segment_log(self, task: ProcessingTask, target_columns: List[str]) -> SegmentLog:
+        """
+        打开任务的检查点段日志并恢复到最后一个有效段
+        
+        旧版任务的整表pickle检查点会迁移为第一个段。
+        """
+        from config import Config
+        
+        legacy_file = None
+        if not task.partial_output_file or task.partial_output_file.endswith(".pkl"):
+            legacy_file = task.partial_output_file
+            task.partial_output_file = str(self.base_dir / "temp" / f"{task.task_id}_segments")
+        log = SegmentLog(task.partial_output_file, fanout=Config.SEGMENT_COMPACT_FANOUT,
+                         max_segment_rows=Config.SEGMENT_MAX_ROWS)
+        log.recover()
+        if legacy_file and log.end == 0 and os.path.exists(legacy_file):
+            done = int(self._load_task_meta(task.task_id).get('processed_records', 0))
+            legacy_df = pd.read_pickle(legacy_file).reindex(columns=target_columns, fill_value='')
+            log.append(0, legacy_df.iloc[:done])
+            os.remove(legacy_file)
+        task.processed_records = log.end
+        task.checkpoint_seq = log.sequence
+        return log
+    
+    def _open_exporter(self, task: ProcessingTask, log: SegmentLog) -> IncrementalExporter:
+        """
+        打开任务的增量导出器
+        
+        先把段日志中已完成的行重放写出，之后每个检查点追加写出新完成的行。
+        """
+        from config import Config
+        
+        return self._replay_segments(task.input_file, log, task.output_file, task.output_format,
+                                     task.chunk_size or Config.CHUNK_SIZE, task.index_column)
+    
+    def _replay_segments(self, input_file: str, log: SegmentLog, output_file: str, output_format: str,
+                         chunk_size: int, index_column: Optional[str] = None) -> IncrementalExporter:
+        """创建导出器并写出段日志中已完成的行（与原始列合并），返回尚未提交的导出器"""
+        exporter = IncrementalExporter(input_file, output_file, output_format, chunk_size, index_column)
+        try:
+            for frame in log.iter_frames():
+                exporter.write(frame)
+        except Exception:
+            exporter.abort()
+            raise
+        return exporter
+    
+    def _checkpoint(self, task: ProcessingTask, log: SegmentLog, exporter: Optional[IncrementalExporter],
+                    writer: BackgroundWriter, start: int, frames: List[pd.DataFrame]):
+        """把自上次检查点以来完成的行提交给后台写入线程，批次处理不等待落盘"""
+        # 复制一份快照，后续批次写入结果DataFrame时不影响排队中的检查点
+        frame = pd.concat(frames).copy()
+        self.memory.add(task.task_id, 'checkpoints', frame_nbytes(frame))
+        writer.submit(self._write_checkpoint, task, log, exporter, start, frame)
+    
+    def _write_checkpoint(self, task: ProcessingTask, log: SegmentLog, exporter: Optional[IncrementalExporter],
+                          start: int, frame: pd.DataFrame):
+        """（后台写入线程）追加一个段并写出到导出文件，然后更新进度文件"""
+        try:
+            task.checkpoint_seq = log.append(start, frame)
+            if exporter is not None:
+                exporter.write(frame)
+            self._save_progress(task, processed_records=start + len(frame))
+        finally:
+            self.memory.add(task.task_id, 'checkpoints', -frame_nbytes(frame))
+    
+    def get_writer_stats(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """运行中任务的后台写入统计（队列深度与写入滞后），任务未运行时返回None"""
+        writer = self._writers.get(task_id)
+        return writer.stats() if writer is not None else None
+    
+    def _discard_segment_log(self, partial_output_file: Optional[str]):
+        """删除任务的检查点段日志（任务完成后结果已在结果文件中）"""
+        if partial_output_file and not partial_output_file.endswith(".pkl"):
+            SegmentLog(partial_output_file).destroy()
+    
+    def _get_source_columns(self, parsing_rules: List[ParsingRule]) -> List[str]:
+        """规则引用的源列（去重且保持顺序）"""
+        return list(dict.fromkeys(rule.source_column for rule in parsing_rules))
+    
+    def _get_target_columns(self, parsing_rules: List[ParsingRule]) -> List[str]:
+        """规则产生的目标列（去重且保持顺序）；声明了列类型时追加类型转换错误列"""
+        columns = list(dict.fromkeys(col for rule in parsing_rules for col in rule.target_columns))
+        if self._get_column_types(parsing_rules):
+            columns.append(COERCION_ERROR_COLUMN)
+        return columns
+    
+    def _get_column_types(self, parsing_rules: List[ParsingRule]) -> Dict[str, str]:
+        """各规则声明的目标列类型"""
+        column_types = {}
+        for rule in parsing_rules:
+            column_types.update(rule.column_types)
+        return column_types
+    
+    def _new_result_frame(self, index: pd.Index, parsing_rules: List[ParsingRule]) -> pd.DataFrame:
+        """创建结果DataFrame：文本列初始化为空字符串，声明了类型的列初始化为对应类型的缺失值"""
+        result_df = pd.DataFrame('', index=index, columns=self._get_target_columns(parsing_rules), dtype=object)
+        for col, col_type in self._get_column_types(parsing_rules).items():
+            result_df[col] = empty_column(col_type, len(index))
+        return result_df
+    
+    def _load_projected_input(self, input_file: str, columns: List[str], index_column: Optional[str] = None) -> pd.DataFrame:
+        """
+        按列投影加载导入副本，只读取索引列与指定列
+        
+        导入副本以 index=True 写出，第一列为导入时的索引列；index_column 为元数据中的当前索引列。
+        """
+        header = read_header(input_file)
+        index_name = self._resolve_index_name(header, index_column)
+        self._check_columns(header, columns)
+        if index_name is None:
+            df = read_frame(input_file, columns)
+            df.index = pd.RangeIndex(len(df), name=ROW_INDEX_NAME)
+            return df
+        usecols = [index_name] + [c for c in columns if c != index_name]
+        df = read_frame(input_file, usecols)
+        return self._set_input_index(df, index_name, columns)
+    
+    def _set_input_index(self, df: pd.DataFrame, index_name: str, source_columns: List[str]) -> pd.DataFrame:
+        """把索引列设为行索引；规则以索引列为源列时同时保留为普通列，供构建提示词读取"""
+        return df.set_index(index_name, drop=index_name not in source_columns)
+    
+    def _resolve_index_name(self, header: List[str], index_column: Optional[str]) -> Optional[str]:
+        """导入副本中作为索引读取的列名，None表示按行号生成索引"""
+        if index_column is None:
+            return header[0]
+        if not index_column or index_column == ROW_INDEX_NAME:
+            return header[0] if header[0] == ROW_INDEX_NAME else None
+        self._check_columns(header, [index_column])
+        return index_column
     
-    def _process_task(self, task_id: str):
+    def _check_columns(self, header: List[str], columns: List[str]):
+        """校验规则引用的源列存在于导入副本中"""
+        missing = [c for c in columns if c not in header]
+        if missing:
+            raise ValueError(f"源列不存在: {missing}")
+    
+    def _join_source_columns(self, input_file: str, result_df: pd.DataFrame) -> pd.DataFrame:
+        """导出时将结果列按行位置合并回完整的原始数据"""
+        full_df = read_frame(input_file)
+        full_df = full_df.set_index(full_df.columns[0])
+        for col in result_df.columns:
+            full_df[col] = result_df[col].to_numpy()
+        return full_df
+    
+    def _process_task(self, task_id: str) -> Optional[Callable[[], None]]:
+        """
+        （调度器线程）执行任务
+
+        Returns:
+            任务让出运行位置时返回重新排队的函数，由调度器在释放运行位置后调用
+        """
+        from config import Config
         task = self.tasks[task_id]
         
         # 为任务创建独立的日志管理器
         task_log_manager = LogManager(task_id)
+        exporter = None
+        writer = BackgroundWriter(f"writer-{task_id[:8]}", Config.WRITER_QUEUE_SIZE)
+        self._writers[task_id] = writer
         
         try:
             task.status = TaskStatus.PROCESSING
+            self._save_progress(task)
             task_log_manager.info(f"开始处理任务: {task_id}")
+            # 排队期间其他进程提出的中断请求
+            self._check_control(task)
+            
+            if Config.EXECUTION_MODE == 'distributed' or task.chunk_size > 0:
+                if Config.EXECUTION_MODE == 'distributed':
+                    self._process_task_distributed(task, task_log_manager, writer)
+                else:
+                    self._process_task_chunked(task, task_log_manager, writer)
+                task.status = TaskStatus.COMPLETED
+                task.progress = 100.0
+                task.end_time = datetime.now()
+                self._save_progress(task)
+                self._discard_segment_log(task.partial_output_file)
+                task_log_manager.info(f"任务已完成，结果文件: {task.output_file}")
+                return
             
-            # 加载原始数据
-            df = pd.read_excel(task.input_file)
-            task_log_manager.info(f"加载Excel文件: {task.input_file}, 记录数: {len(df)}")
+            # 加载原始数据（仅加载索引列与规则引用的源列）
+            source_columns = self._get_source_columns(task.parsing_rules)
+            df = self._load_projected_input(task.input_file, source_columns, task.index_column)
+            self.memory.set(task_id, 'input', frame_nbytes(df))
+            task_log_manager.info(f"加载Excel文件: {task.input_file}, 记录数: {len(df)}, 加载列: {source_columns}")
             
-            # 初始化结果DataFrame（包含原始列）
-            result_df = self._load_progress(task)
-            if result_df is None:
-                result_df = df.copy()
-                # 添加目标列
-                for rule in task.parsing_rules:
-                    for target_col in rule.target_columns:
-                        if target_col not in result_df.columns:
-                            result_df[target_col] = ''
-                task.processed_records = 0
-                task_log_manager.info(f"初始化结果DataFrame，添加目标列: {[col for rule in task.parsing_rules for col in rule.target_columns]}")
+            # 初始化结果DataFrame（仅包含目标列，原始列在导出时合并），并重放检查点段
+            target_columns = self._get_target_columns(task.parsing_rules)
+            result_df = self._new_result_frame(df.index, task.parsing_rules)
+            log = self._open_segment_log(task, target_columns)
+            offset = 0
+            for frame in log.iter_frames():
+                self._write_batch_results(result_df, {col: frame[col].array for col in frame.columns}, offset)
+                offset += len(frame)
+            self.memory.set(task_id, 'results', frame_nbytes(result_df))
+            exporter = self._open_exporter(task, log)
+            if task.processed_records:
+                task_log_manager.info(f"从检查点恢复，已处理记录数: {task.processed_records}, 检查点序号: {task.checkpoint_seq}")
             else:
-                # 已有部分结果，推断已处理数量
-                task.processed_records = min(len(result_df) - df.shape[0], 0) or 0  # 兜底，不影响继续处理
-                # 简化：根据进度文件字段为准
-                if task.progress_file and os.path.exists(task.progress_file):
-                    try:
-                        meta = json.load(open(task.progress_file, 'r'))
-                        task.processed_records = int(meta.get('processed_records', 0))
-                    except Exception:
-                        pass
-                task_log_manager.info(f"从检查点恢复，已处理记录数: {task.processed_records}")
+                task_log_manager.info(f"初始化结果DataFrame，目标列: {target_columns}")
+            persisted = task.processed_records  # 已写入段日志的行数
             
             # 分批参数
-            batch_size = 10
+            batch_size = self.BATCH_SIZE
             total_len = len(df)
             # 从已处理记录继续
             start_batch = task.processed_records // batch_size
             task_log_manager.info(f"开始批次处理，总记录数: {total_len}, 批次大小: {batch_size}, 起始批次: {start_batch}")
             
             # 执行批次
-            for batch_idx in range(start_batch, (total_len + batch_size - 1) // batch_size):
-                start_idx = batch_idx * batch_size
-                end_idx = min(start_idx + batch_size, total_len)
-                batch_df = df.iloc[start_idx:end_idx]
-                
-                # 记录批次开始
-                task_log_manager.log_batch_start(
-                    batch_num=batch_idx + 1,
-                    batch_size=len(batch_df),
-                    total_records=total_len,
-                    start_index=start_idx,
-                    end_index=end_idx
-                )
-                
-                batch_start_time = time.time()
-                
-                # 并行按规则处理
-                aggregated_results: Dict[Any, Dict[str, Any]] = {}
-                rule_errors = []
-                
-                with ThreadPoolExecutor(max_workers=task.threads) as executor:
-                    futures = {
-                        executor.submit(self._process_rule_on_batch, rule, batch_df, task_log_manager): rule
-                        for rule in task.parsing_rules
-                    }
-                    for fut in as_completed(futures):
-                        rule = futures[fut]
-                        try:
-                            rule_result = fut.result()
-                            # 合并结果到 aggregated_results
-                            for i, (idx, _) in enumerate(batch_df.iterrows()):
-                                if i < len(rule_result):
-                                    if idx not in aggregated_results:
-                                        aggregated_results[idx] = {}
-                                    aggregated_results[idx].update(rule_result[i])
-                        except Exception as e:
-                            error_msg = f"规则 {rule.rule_id} 处理失败: {e}"
-                            task_log_manager.error(error_msg)
-                            rule_errors.append(error_msg)
-                            for idx in batch_df.index:
-                                if idx not in aggregated_results:
-                                    aggregated_results[idx] = {}
-                                for target_col in rule.target_columns:
-                                    aggregated_results[idx][target_col] = ''
-                
-                # 写入结果
-                for i, (idx, _) in enumerate(batch_df.iterrows()):
-                    global_pos = start_idx + i
-                    row_result = aggregated_results.get(idx, {})
-                    for k, v in row_result.items():
-                        if k in result_df.columns:
-                            result_df.iloc[global_pos, result_df.columns.get_loc(k)] = v
-                
-                # 计算批次处理时间
-                batch_processing_time = time.time() - batch_start_time
-                success_count = len([r for r in aggregated_results.values() if any(r.values())])
-                
-                # 记录批次完成
-                task_log_manager.log_batch_complete(
-                    batch_num=batch_idx + 1,
-                    success_count=success_count,
-                    total_count=len(batch_df),
-                    processing_time=batch_processing_time,
-                    errors=rule_errors
-                )
-                
-                # 更新进度
-                task.processed_records = end_idx
-                task.progress = (task.processed_records / task.total_records) * 100.0
-                
-                # 记录任务进度
-                task_log_manager.log_task_progress(
-                    task_id=task_id,
-                    processed_records=task.processed_records,
-                    total_records=task.total_records,
-                    progress_percentage=task.progress,
-                    current_status=task.status.value
-                )
-                
-                # 检查点保存
-                if (end_idx % task.checkpoint_every == 0) or (end_idx == total_len):
-                    self._save_progress(task, result_df)
-                    task_log_manager.info(f"已保存检查点 {end_idx}/{total_len}")
-            # 完成：导出Excel
-            result_df.to_excel(task.output_file, index=True)
+            try:
+                for batch_idx in range(start_batch, (total_len + batch_size - 1) // batch_size):
+                    self._check_control(task)
+                    start_idx = batch_idx * batch_size
+                    end_idx = min(start_idx + batch_size, total_len)
+                    batch_df = df.iloc[start_idx:end_idx]
+                    
+                    batch_columns = self._process_batch(task, batch_df, batch_idx, start_idx, total_len, task_log_manager)
+                    self._write_batch_results(result_df, batch_columns, start_idx)
+                    self.memory.add(task_id, 'results', self._columns_nbytes(batch_columns))
+                    self._advance_progress(task, end_idx, task_log_manager)
+                    
+                    # 检查点保存：只追加自上次检查点以来完成的行
+                    if (end_idx % task.checkpoint_every == 0) or (end_idx == total_len):
+                        self._checkpoint(task, log, exporter, writer, persisted, [result_df.iloc[persisted:end_idx]])
+                        persisted = end_idx
+                        task_log_manager.info(f"已提交检查点 {end_idx}/{total_len}")
+            except TaskInterrupted:
+                # 中断前已完成但尚未落盘的行提交为检查点，恢复时从这里继续
+                if task.processed_records > persisted:
+                    self._checkpoint(task, log, exporter, writer, persisted,
+                                     [result_df.iloc[persisted:task.processed_records]])
+                raise
+            # 完成：结果已在检查点时逐段写出，等待后台写入完成后关闭写入器并原子重命名
+            writer.submit(exporter.commit)
+            writer.flush()
             task.status = TaskStatus.COMPLETED
             task.progress = 100.0
             task.end_time = datetime.now()
-            self._save_progress(task, result_df)
+            self._save_progress(task)
+            self._discard_segment_log(task.partial_output_file)
             task_log_manager.info(f"任务已完成，结果文件: {task.output_file}")
+        except TaskInterrupted as e:
+            # 等待检查点写完，再丢弃未完成的导出文件（恢复时由段日志重新写出）
+            writer.close()
+            if exporter is not None:
+                exporter.abort()
+            return self._stop_interrupted(task, self._controls.get(task_id, e.action), task_log_manager)
         except Exception as e:
             task_log_manager.error(f"任务处理失败: {e}")
+            # 先让已提交的检查点写完，再丢弃未完成的导出文件
+            writer.close()
+            if exporter is not None:
+                exporter.abort()
             task.status = TaskStatus.FAILED
             task.error_message = str(e)
             task.end_time = datetime.now()
-            # 保存失败时的进度
+            # 保存失败时的进度（部分结果已在检查点时落盘）
+            self._save_progress(task, processed_records=self._persisted_records(task))
+        finally:
+            writer.close()
+            self._writers.pop(task_id, None)
+            self._live_synced.pop(task_id, None)
+            self._controls.pop(task_id, None)
+            self._control_checked.pop(task_id, None)
+            self._status_published.pop(task_id, None)
+            self._progress_published.pop(task_id, None)
+            self.memory.release(task_id)
+    
+    def _check_control(self, task: ProcessingTask):
+        """
+        批次前检查任务的中断请求，有请求时抛出 TaskInterrupted
+        
+        本进程提出的请求直接读取；其他进程（Web工作进程）的请求按 CONTROL_POLL_INTERVAL 从注册表读取。
+        同时通知调度器，任务正在等待的请求槽位立即放弃。
+        """
+        from config import Config
+        action = self._controls.get(task.task_id)
+        if action is None:
+            now = time.time()
+            if now - self._control_checked.get(task.task_id, 0.0) < Config.CONTROL_POLL_INTERVAL:
+                return
+            self._control_checked[task.task_id] = now
+            action = self.registry.get_control(task.task_id)
+            if not action:
+                return
+            self._controls[task.task_id] = action
+        self.scheduler.interrupt(task.task_id, action)
+        raise TaskInterrupted(action)
+    
+    def _stop_interrupted(self, task: ProcessingTask, action: str,
+                          task_log_manager: LogManager) -> Optional[Callable[[], None]]:
+        """
+        中断后的收尾：进度回到已落盘的检查点位置并保存任务状态
+        
+        暂停的任务可继续，取消的任务保留部分结果；让出运行位置的任务回到排队状态，
+        返回重新排队的函数（调度器释放运行位置、更高优先级的任务开始运行后调用）。
+        """
+        task.processed_records = self._persisted_records(task)
+        task.progress = (task.processed_records / task.total_records) * 100.0 if task.total_records else 0.0
+        if action == 'preempt':
+            task.status = TaskStatus.PENDING
+        elif action == 'cancel':
+            task.status = TaskStatus.CANCELLED
+            task.end_time = datetime.now()
+        else:
+            task.status = TaskStatus.PAUSED
+        self._save_progress(task)
+        task_log_manager.info(
+            f"任务已{CONTROL_ACTIONS.get(action, action)}，已落盘记录数: {task.processed_records}/{task.total_records}")
+        if action == 'preempt':
+            return lambda: self._schedule(task)
+        return None
+    
+    def _persisted_records(self, task: ProcessingTask) -> int:
+        """段日志中已落盘的记录数（批次处理可能已领先于最后一个检查点）"""
+        try:
+            if task.partial_output_file and not task.partial_output_file.endswith(".pkl"):
+                return SegmentLog(task.partial_output_file).recover(repair=False)
+        except Exception:
+            pass
+        return task.processed_records
+    
+    def _process_batch(self, task: ProcessingTask, batch_df: pd.DataFrame, batch_idx: int, start_idx: int,
+                       total_len: int, task_log_manager: LogManager) -> Dict[str, np.ndarray]:
+        """并行执行所有规则处理一个批次，返回按列组织的结果 {目标列: 长度为批次行数的数组}"""
+        batch_len = len(batch_df)
+        end_idx = start_idx + batch_len
+        
+        # 记录批次开始
+        task_log_manager.log_batch_start(
+            batch_num=batch_idx + 1,
+            batch_size=len(batch_df),
+            total_records=total_len,
+            start_index=start_idx,
+            end_index=end_idx
+        )
+        
+        batch_start_time = time.time()
+        
+        # 并行按规则处理
+        batch_columns: Dict[str, np.ndarray] = {}
+        rule_errors = []
+        interrupted = None
+        
+        with ThreadPoolExecutor(max_workers=task.threads) as executor:
+            futures = {
+                executor.submit(self._process_rule_with_slot, task, rule, batch_df, task_log_manager): rule
+                for rule in task.parsing_rules
+            }
+            for fut in as_completed(futures):
+                rule = futures[fut]
+                try:
+                    self._collect_rule_results(batch_columns, rule, fut.result(), batch_len)
+                except TaskInterrupted as e:
+                    interrupted = e
+                except Exception as e:
+                    error_msg = f"规则 {rule.rule_id} 处理失败: {e}"
+                    task_log_manager.error(error_msg)
+                    rule_errors.append(error_msg)
+                    self._collect_rule_results(batch_columns, rule, [], batch_len)
+        if interrupted is not None:
+            # 有规则在等待请求槽位时被中断，批次不完整，恢复后整批重新处理
+            raise interrupted
+        
+        # 计算批次处理时间
+        batch_processing_time = time.time() - batch_start_time
+        filled = np.zeros(batch_len, dtype=bool)
+        for values in batch_columns.values():
+            filled |= np.array([bool(v) for v in values], dtype=bool)
+        success_count = int(filled.sum())
+        self._coerce_batch(batch_columns, self._get_column_types(task.parsing_rules), batch_len)
+        
+        # 记录批次完成
+        task_log_manager.log_batch_complete(
+            batch_num=batch_idx + 1,
+            success_count=success_count,
+            total_count=len(batch_df),
+            processing_time=batch_processing_time,
+            errors=rule_errors
+        )
+        self._publish(task.task_id, task_events.BATCH, {
+            "batch": batch_idx + 1, "start": start_idx, "end": end_idx, "success": success_count,
+            "total": batch_len, "errors": len(rule_errors), "elapsed": round(batch_processing_time, 3)
+        })
+        if rule_errors:
+            self._publish(task.task_id, task_events.ERROR, {"batch": batch_idx + 1, "message": "; ".join(rule_errors)[:1000]})
+        return batch_columns
+    
+    def _collect_rule_results(self, batch_columns: Dict[str, np.ndarray], rule: ParsingRule,
+                              rule_result: List[Dict[str, Any]], batch_len: int):
+        """按行位置把单条规则的解析结果收集为列数组，缺失或失败的行填空字符串"""
+        for col in rule.target_columns:
+            values = np.full(batch_len, '', dtype=object)
+            for i, item in enumerate(rule_result[:batch_len]):
+                if isinstance(item, dict):
+                    values[i] = item.get(col, '')
+            batch_columns[col] = values
+    
+    def _coerce_batch(self, batch_columns: Dict[str, Any], column_types: Dict[str, str], batch_len: int):
+        """按声明的类型转换批次结果列，无法转换的原始值按行记录到类型转换错误列"""
+        if not column_types:
+            return
+        errors = [[] for _ in range(batch_len)]
+        for col, col_type in column_types.items():
+            if col not in batch_columns:
+                continue
+            raw = batch_columns[col]
+            batch_columns[col], failed = coerce_values(raw, col_type)
+            for i in np.flatnonzero(failed):
+                errors[i].append(f"{col}={raw[i]}")
+        batch_columns[COERCION_ERROR_COLUMN] = np.array(['; '.join(e) for e in errors], dtype=object)
+    
+    def _columns_nbytes(self, batch_columns: Dict[str, Any]) -> int:
+        """批次结果文本列的内存估算（写入结果DataFrame后新增的字符串对象）"""
+        return sum(STR_OBJECT_BYTES * len(values) + 2 * sum(len(v) for v in values if isinstance(v, str))
+                   for values in batch_columns.values())
+    
+    def _write_batch_results(self, result_df: pd.DataFrame, batch_columns: Dict[str, Any], offset: int):
+        """
+        将批次的列数组写入结果DataFrame，offset为批次首行在result_df中的位置
+        
+        文本列拼成二维数组一次性写入；声明了类型的列逐列写入以保持数据类型。
+        """
+        dtypes = result_df.dtypes
+        text_columns = []
+        for col, values in batch_columns.items():
+            if col not in dtypes.index:
+                continue
+            if dtypes[col] == object:
+                text_columns.append(col)
+            else:
+                assign_values(result_df, col, offset, values)
+        if not text_columns:
+            return
+        block = np.column_stack([np.asarray(batch_columns[col], dtype=object) for col in text_columns])
+        positions = [result_df.columns.get_loc(col) for col in text_columns]
+        result_df.iloc[offset:offset + len(block), positions] = block
+    
+    def _advance_progress(self, task: ProcessingTask, end_idx: int, task_log_manager: LogManager):
+        """更新并记录任务进度，并按间隔把实时进度同步到注册表（供其他进程查询）"""
+        from config import Config
+        task.processed_records = end_idx
+        task.progress = (task.processed_records / task.total_records) * 100.0
+        now = time.time()
+        if now - self._live_synced.get(task.task_id, 0.0) >= Config.PROGRESS_SYNC_INTERVAL:
+            self._live_synced[task.task_id] = now
             try:
-                self._save_progress(task, result_df if 'result_df' in locals() else pd.read_excel(task.input_file))
-            except Exception:
-                pass
+                self.registry.update_live(task.task_id, end_idx)
+            except Exception as e:
+                task_log_manager.warning(f"同步实时进度失败: {e}")
+        if now - self._progress_published.get(task.task_id, 0.0) >= Config.EVENT_PROGRESS_INTERVAL or end_idx >= task.total_records:
+            self._progress_published[task.task_id] = now
+            self._publish(task.task_id, task_events.PROGRESS, {
+                "processed_records": end_idx, "total_records": task.total_records, "progress": round(task.progress, 2)
+            })
+        
+        task_log_manager.log_task_progress(
+            task_id=task.task_id,
+            processed_records=task.processed_records,
+            total_records=task.total_records,
+            progress_percentage=task.progress,
+            current_status=task.status.value
+        )
+    
+    def _process_task_chunked(self, task: ProcessingTask, task_log_manager: LogManager, writer: BackgroundWriter):
+        """
+        分块（流式）处理任务
+        
+        输入按 chunk_size 行分块从磁盘读取，结果在检查点时追加到段日志并同时写出到导出文件，
+        内存占用只与块大小有关而与文件大小无关。
+        """
+        batch_size = self.BATCH_SIZE
+        # 块大小对齐到批次大小，保证批次不跨块
+        chunk_size = -(-task.chunk_size // batch_size) * batch_size
+        total_len = task.total_records
+        source_columns = self._get_source_columns(task.parsing_rules)
+        target_columns = self._get_target_columns(task.parsing_rules)
+        header = read_header(task.input_file)
+        index_name = self._resolve_index_name(header, task.index_column)
+        self._check_columns(header, source_columns)
+        
+        log = self._open_segment_log(task, target_columns)
+        exporter = self._open_exporter(task, log)
+        task_log_manager.info(
+            f"分块处理任务，总记录数: {total_len}, 块大小: {chunk_size}, 批次大小: {batch_size}, 已处理记录数: {task.processed_records}"
+        )
+        
+        try:
+            persisted = task.processed_records  # 已写入段日志的行数
+            pending: List[pd.DataFrame] = []  # 已处理但尚未落盘的结果
+            chunk_result = None
+            chunk_start = 0
+            if index_name is None:
+                usecols = source_columns
+            else:
+                usecols = [index_name] + [c for c in source_columns if c != index_name]
+            for chunk_df in iter_chunks(task.input_file, chunk_size, usecols):
+                chunk_end = chunk_start + len(chunk_df)
+                if index_name is None:
+                    chunk_df.index = pd.RangeIndex(chunk_start, chunk_end, name=ROW_INDEX_NAME)
+                else:
+                    chunk_df = self._set_input_index(chunk_df, index_name, source_columns)
+                if chunk_end <= task.processed_records:
+                    chunk_start = chunk_end
+                    continue
+                
+                chunk_result = self._new_result_frame(chunk_df.index, task.parsing_rules)
+                self.memory.set(task.task_id, 'input', frame_nbytes(chunk_df))
+                self.memory.set(task.task_id, 'results', frame_nbytes(chunk_result))
+                first_offset = max(task.processed_records - chunk_start, 0)
+                for offset in range(first_offset, len(chunk_df), batch_size):
+                    self._check_control(task)
+                    batch_df = chunk_df.iloc[offset:offset + batch_size]
+                    start_idx = chunk_start + offset
+                    end_idx = start_idx + len(batch_df)
+                    
+                    batch_columns = self._process_batch(task, batch_df, start_idx // batch_size, start_idx, total_len, task_log_manager)
+                    self._write_batch_results(chunk_result, batch_columns, offset)
+                    self.memory.add(task.task_id, 'results', self._columns_nbytes(batch_columns))
+                    self._advance_progress(task, end_idx, task_log_manager)
+                    
+                    # 检查点保存：追加自上次检查点以来完成的行
+                    if (end_idx % task.checkpoint_every == 0) or (end_idx == total_len):
+                        pending.append(chunk_result.iloc[max(persisted - chunk_start, 0):offset + len(batch_df)])
+                        self._checkpoint(task, log, exporter, writer, persisted, pending)
+                        pending = []
+                        persisted = end_idx
+                        task_log_manager.info(f"已提交检查点 {end_idx}/{total_len}")
+                
+                # 块结束时保留未落盘的结果，释放块数据
+                if persisted < chunk_end:
+                    pending.append(chunk_result.iloc[max(persisted - chunk_start, 0):])
+                chunk_start = chunk_end
+            
+            if pending:
+                self._checkpoint(task, log, exporter, writer, persisted, pending)
+            # 完成：结果已在检查点时逐段写出，等待后台写入完成后关闭写入器并原子重命名
+            writer.submit(exporter.commit)
+            writer.flush()
+        except TaskInterrupted:
+            # 中断前已完成但尚未落盘的行提交为检查点
+            if chunk_result is not None and task.processed_records > max(persisted, chunk_start):
+                pending.append(chunk_result.iloc[max(persisted - chunk_start, 0):task.processed_records - chunk_start])
+            if pending:
+                self._checkpoint(task, log, exporter, writer, persisted, pending)
+            writer.close()
+            exporter.abort()
+            raise
+        except Exception:
+            writer.close()
+            exporter.abort()
+            raise
+    
+    def _process_task_distributed(self, task: ProcessingTask, task_log_manager: LogManager, writer: BackgroundWriter):
+        """
+        分布式处理任务（协调进程）
+        
+        把未完成的行切分为区间写入租约表，由工作进程领取处理并各自写出结果段；
+        协调进程按行号顺序把连续完成的区间结果追加到任务的段日志并写出到导出文件。
+        """
+        from config import Config
+        
+        total_len = task.total_records
+        target_columns = self._get_target_columns(task.parsing_rules)
+        log = self._open_segment_log(task, target_columns)
+        exporter = self._open_exporter(task, log)
+        # 之前以其他方式（或其他区间大小）处理过时，已有区间与检查点位置对不齐，重新切分；
+        # 暂停前已领取的区间对齐时保留，恢复后合并其结果
+        rows = Config.LEASE_ROWS
+        if any(r["start"] < log.end or (r["start"] - log.end) % rows or r["end"] != min(r["start"] + rows, total_len)
+               for r in self.leases.ranges(task.task_id) if r["end"] > log.end):
+            self.leases.delete(task.task_id)
+        created = self.leases.create_ranges(task.task_id, log.end, total_len, Config.LEASE_ROWS, task.priority)
+        task_log_manager.info(
+            f"分布式处理任务，总记录数: {total_len}, 区间行数: {Config.LEASE_ROWS}, 新建区间: {created}, 已处理记录数: {log.end}"
+        )
+        
+        try:
+            persisted = log.end
+            last_notice = time.time()
+            while persisted < total_len:
+                self._check_control(task)
+                merged = False
+                for lease in self.leases.ranges(task.task_id, persisted):
+                    if lease["status"] == LEASE_FAILED:
+                        raise RuntimeError(f"区间 {lease['start']}-{lease['end']} 处理失败: {lease['error_message']}")
+                    if lease["start"] != persisted or lease["status"] != LEASE_DONE:
+                        break
+                    frames = self._read_lease_segment(lease, target_columns)
+                    if frames is None:
+                        task_log_manager.warning(f"区间 {lease['start']}-{lease['end']} 的结果段无效，重新处理")
+                        self.leases.reset(task.task_id, lease["start"])
+                        break
+                    self._checkpoint(task, log, exporter, writer, persisted, frames)
+                    # 结果段落盘到任务段日志后再删除
+                    writer.submit(shutil.rmtree, lease["segment_path"], True)
+                    persisted = lease["end"]
+                    self._advance_progress(task, persisted, task_log_manager)
+                    merged = True
+                if merged:
+                    last_notice = time.time()
+                    continue
+                if time.time() - last_notice > Config.LEASE_TTL and not self.leases.workers(Config.LEASE_TTL):
+                    task_log_manager.warning("没有活动的工作进程，等待 run.py --worker 领取区间")
+                    last_notice = time.time()
+                time.sleep(Config.LEASE_POLL_INTERVAL)
+            # 完成：等待后台写入完成后原子重命名，再清理区间与结果段目录
+            writer.submit(exporter.commit)
+            writer.flush()
+            self.leases.delete(task.task_id)
+            shutil.rmtree(self._lease_dir(task.task_id), ignore_errors=True)
+        except TaskInterrupted:
+            # 撤回未领取的区间；已领取的区间由工作进程处理完成，恢复后合并
+            withdrawn = self.leases.withdraw(task.task_id)
+            task_log_manager.info(f"已撤回未领取的区间: {withdrawn}")
+            writer.close()
+            exporter.abort()
+            raise
+        except Exception:
+            writer.close()
+            exporter.abort()
+            raise
+    
+    def _lease_dir(self, task_id: str) -> Path:
+        """工作进程写出区间结果段的目录"""
+        return self.base_dir / "temp" / f"{task_id}_leases"
+    
+    def _read_lease_segment(self, lease: Dict[str, Any], target_columns: List[str]) -> Optional[List[pd.DataFrame]]:
+        """读取工作进程写出的区间结果段，段缺失、校验失败或行数不符时返回None"""
+        path = lease.get("segment_path")
+        if not path or not os.path.isdir(path):
+            return None
+        segment = SegmentLog(path)
+        if segment.recover(repair=False) != lease["end"] - lease["start"]:
+            return None
+        return [frame.reindex(columns=target_columns, fill_value='') for frame in segment.iter_frames()]
+    
+    def _read_rows(self, task: ProcessingTask, start: int, end: int) -> pd.DataFrame:
+        """
+        读取导入副本中 [start, end) 行的索引列与源列（分块任务的工作进程使用，只解析该区间，不整表加载）
+        """
+        source_columns = self._get_source_columns(task.parsing_rules)
+        header = read_header(task.input_file)
+        index_name = self._resolve_index_name(header, task.index_column)
+        self._check_columns(header, source_columns)
+        if index_name is None:
+            usecols = source_columns
+        else:
+            usecols = [index_name] + [c for c in source_columns if c != index_name]
+        rows = read_rows(task.input_file, start, end, usecols)
+        if index_name is None:
+            rows.index = pd.RangeIndex(start, start + len(rows), name=ROW_INDEX_NAME)
+            return rows
+        return self._set_input_index(rows, index_name, source_columns)
     
     def _build_batch_prompt(self, rule: ParsingRule, batch_df: pd.DataFrame) -> str:
         """
@@ -440,9 +1392,8 @@ class ExcelStructuredParser:
 **待处理数据：**
 """
         
-        for i, (idx, row) in enumerate(batch_df.iterrows()):
-            source_value = str(row[rule.source_column])
-            prompt += f"记录 {i+1} (索引: {idx}):\n{source_value}\n\n"
+        for i, (idx, value) in enumerate(zip(batch_df.index, batch_df[rule.source_column])):
+            prompt += f"记录 {i+1} (索引: {idx}):\n{value}\n\n"
         
         prompt += """**输出格式示例：**
 ```json
@@ -487,6 +1438,15 @@ class ExcelStructuredParser:
             **Config.get_api_payload_template()
         }
         
+        # 从共享令牌桶取配额（按预估token数），请求结束后按实际用量结算
+        estimated = estimate_text_tokens(prompt) + Config.QUOTA_COMPLETION_TOKENS
+        if self.quota is not None:
+            waited = self.quota.acquire(self.quota_key, estimated, Config.MOONSHOT_RPM, Config.MOONSHOT_TPM,
+                                        label=self.provider, timeout=Config.QUOTA_WAIT_TIMEOUT)
+            if waited >= 1 and log_manager:
+                log_manager.info(f"等待提供方配额 {waited:.1f} 秒")
+        used_tokens = None
+        
         start_time = time.time()
         
         try:
@@ -500,6 +1460,7 @@ class ExcelStructuredParser:
             
             result = response.json()
             content = result.get('choices', [{}])[0].get('message', {}).get('content', '')
+            used_tokens = (result.get('usage') or {}).get('total_tokens')
             
             # 记录API响应
             if log_manager and rule_id:
@@ -512,6 +1473,12 @@ class ExcelStructuredParser:
             if log_manager and rule_id:
                 log_manager.log_llm_response(str(e), rule_id, batch_info, time.time() - start_time, False)
             raise
+        finally:
+            if self.quota is not None:
+                try:
+                    self.quota.settle(self.quota_key, estimated, used_tokens)
+                except Exception as e:
+                    self.log_manager.warning(f"结算提供方配额失败: {e}")
     
     def _parse_api_response(self, response: str, target_columns: List[str]) -> List[Dict[str, Any]]:
         """
@@ -557,10 +1524,21 @@ class ExcelStructuredParser:
             print(f"原始响应: {response}")
             return [{} for _ in range(len(target_columns))]
 
-    def _process_rule_on_batch(self, rule: ParsingRule, batch_df: pd.DataFrame, log_manager: LogManager = None) -> List[Dict[str, Any]]:
-        """对单条规则处理一批数据（供并发执行）"""
+    def _process_rule_with_slot(self, task: ProcessingTask, rule: ParsingRule, batch_df: pd.DataFrame,
+                                log_manager: LogManager = None) -> List[Dict[str, Any]]:
+        """占用调度器分配的一个请求槽位处理单条规则"""
+        with self.scheduler.request_slot(task.task_id):
+            return self._process_rule_on_batch(rule, batch_df, log_manager, memory_key=task.task_id)
+    
+    def _process_rule_on_batch(self, rule: ParsingRule, batch_df: pd.DataFrame, log_manager: LogManager = None,
+                               memory_key: Optional[str] = None) -> List[Dict[str, Any]]:
+        """对单条规则处理一批数据（供并发执行）；memory_key 为记录进行中请求内存占用的任务ID"""
+        in_flight = 0
         try:
             prompt = self._build_batch_prompt(rule, batch_df)
+            if memory_key:
+                in_flight = 2 * len(prompt)
+                self.memory.add(memory_key, 'in_flight', in_flight)
             
             # 构建批次信息
             batch_info = {
@@ -571,6 +1549,9 @@ class ExcelStructuredParser:
             }
             
             api_response = self._call_api(prompt, log_manager, rule.rule_id, batch_info)
+            if memory_key:
+                self.memory.add(memory_key, 'in_flight', 2 * len(api_response or ''))
+                in_flight += 2 * len(api_response or '')
             parsed_results = self._parse_api_response(api_response, rule.target_columns)
             
             # 记录规则处理结果
@@ -597,7 +1578,41 @@ class ExcelStructuredParser:
                     error_message=str(e)
                 )
             raise
+        finally:
+            if in_flight:
+                self.memory.add(memory_key, 'in_flight', -in_flight)
 
+    def referenced_files(self) -> List[str]:
+        """
+        当前被引用、不能被磁盘回收删除的路径或路径前缀
+        
+        包括未结束任务的输入、检查点段、进度文件与导出（含写入中的 .part 与部分结果版本），
+        以及仍存在的导入所对应的原始上传文件（重新导入其他工作表时需要）。
+        """
+        refs = [meta.get("source_file") for meta in list(self.import_meta.values())]
+        with self._tasks_lock:
+            tasks = [task for task in self.tasks.values()
+                     if task.status not in (TaskStatus.COMPLETED, TaskStatus.FAILED, TaskStatus.CANCELLED)]
+        # 其他进程（Web工作进程或独立执行进程）中排队、运行或暂停的任务
+        known = {task.task_id for task in tasks}
+        for meta in self.registry.metas([TaskStatus.PENDING.value, TaskStatus.PROCESSING.value, TaskStatus.PAUSED.value]):
+            if meta.get("task_id") not in known and meta.get("input_file") and meta.get("output_file"):
+                tasks.append(self._task_from_meta(meta["task_id"], meta))
+        for task in tasks:
+            refs += [task.input_file, task.output_file, task.partial_output_file, task.progress_file,
+                     str(self._lease_dir(task.task_id)), str(self.base_dir / "exports" / f"partial_{task.task_id}_")]
+        with self._partial_lock:
+            refs += [str(self.base_dir / "exports" / f"partial_{task_id}_") for task_id in self._partial_exports]
+        return [ref for ref in refs if ref]
+    
+    def release_import_file(self, path: str):
+        """导入副本被磁盘回收删除后，移除对应的导入记录"""
+        path = os.path.abspath(path)
+        for import_id, meta in list(self.import_meta.items()):
+            if os.path.abspath(meta["input_file"]) == path:
+                self.import_meta.pop(import_id, None)
+                self.log_manager.info(f"导入副本已回收，移除导入: {import_id}")
+    
     def get_task_status(self, task_id: str) -> Optional[ProcessingTask]:
         """
         获取任务状态
@@ -606,63 +1621,291 @@ class ExcelStructuredParser:
             task_id: 任务ID
             
         Returns:
-            任务对象，如果不存在则返回None
+            任务对象，如果不存在则返回None；不在本进程中的任务由注册表中的元数据与实时进度还原
         """
-        return self.tasks.get(task_id)
+        task = self.tasks.get(task_id)
+        if task is not None:
+            return task
+        meta = self._load_task_meta(task_id)
+        if not meta or not meta.get("input_file"):
+            return None
+        return self._task_snapshot(meta)
+    
+    def _task_snapshot(self, meta: Dict[str, Any]) -> ProcessingTask:
+        """由注册表元数据还原任务状态（只读快照）"""
+        task = self._task_from_meta(meta["task_id"], meta)
+        task.status = TaskStatus(meta.get("status") or TaskStatus.PENDING.value)
+        processed = int(meta.get("processed_records") or 0)
+        if task.status == TaskStatus.PROCESSING:
+            processed = max(processed, int(meta.get("live_records") or 0))
+        elif task.status == TaskStatus.COMPLETED:
+            processed = task.total_records
+        task.processed_records = processed
+        task.progress = round(100.0 * processed / task.total_records, 2) if task.total_records else 0.0
+        if meta.get("start_time"):
+            task.start_time = datetime.fromisoformat(meta["start_time"])
+        task.end_time = datetime.fromisoformat(meta["end_time"]) if meta.get("end_time") else None
+        task.error_message = meta.get("error_message")
+        return task
     
-    def list_tasks(self) -> List[Dict[str, Any]]:
-        """列出所有任务（包含磁盘上的历史任务）"""
+    def list_tasks(self, offset: int = 0, limit: Optional[int] = None, status: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        分页列出任务（按开始时间倒序，可按状态筛选）
+        
+        任务列表来自任务注册表的一次分页查询；内存中的任务用实时进度覆盖注册表中的检查点进度。
+        """
         tasks_info: List[Dict[str, Any]] = []
-        # 内存任务
-        with self._tasks_lock:
-            for task in self.tasks.values():
-                tasks_info.append({
-                    "task_id": task.task_id,
-                    "name": task.name,
-                    "status": task.status.value,
-                    "progress": task.progress,
-                    "total_records": task.total_records,
-                    "processed_records": task.processed_records,
-                    "start_time": task.start_time.isoformat(),
-                    "end_time": task.end_time.isoformat() if task.end_time else None,
-                    "error_message": task.error_message
-                })
-        # 磁盘历史任务
-        temp_dir = self.base_dir / "temp"
-        for file in temp_dir.glob("*_progress.json"):
-            try:
-                meta = json.load(open(file, 'r'))
-                # 去重：内存已有则跳过
-                if any(t["task_id"] == meta.get("task_id") for t in tasks_info):
-                    continue
-                tasks_info.append({
-                    "task_id": meta.get("task_id"),
-                    "name": meta.get("name", ""),
-                    "status": meta.get("status"),
-                    "progress": round(100.0 * float(meta.get("processed_records", 0)) / float(meta.get("total_records", 1)), 2),
-                    "total_records": meta.get("total_records"),
-                    "processed_records": meta.get("processed_records"),
-                    "start_time": meta.get("timestamp"),
-                    "end_time": None,
-                    "error_message": None
-                })
-            except Exception:
+        for row in self.registry.list(offset, limit, status):
+            task = self.tasks.get(row["task_id"])
+            if task is not None:
+                tasks_info.append(self._task_summary(task))
                 continue
+            total = float(row["total_records"] or 0)
+            row["progress"] = round(100.0 * float(row["processed_records"]) / total, 2) if total else 0.0
+            tasks_info.append(row)
         return tasks_info
     
+    def task_counts(self) -> Dict[str, int]:
+        """各状态的任务数与总数"""
+        counts = self.registry.counts()
+        counts["total"] = sum(counts.values())
+        return counts
+    
+    def _task_summary(self, task: ProcessingTask) -> Dict[str, Any]:
+        """内存任务的列表信息（含实时进度、后台写入与排队状态）"""
+        return {
+            "task_id": task.task_id,
+            "name": task.name,
+            "status": task.status.value,
+            "progress": task.progress,
+            "total_records": task.total_records,
+            "processed_records": task.processed_records,
+            "start_time": task.start_time.isoformat(),
+            "end_time": task.end_time.isoformat() if task.end_time else None,
+            "error_message": task.error_message,
+            "writer": self.get_writer_stats(task.task_id),
+            "priority": task.priority,
+            # 排队中的任务在调度队列中的位置（从1开始）
+            "queue_position": self.scheduler.queue_position(task.task_id),
+            "memory": self.task_memory(task.task_id)
+        }
+    
+    def delete_task_record(self, task_id: str):
+        """从任务注册表删除任务及其分布式区间与检查点段日志"""
+        self._discard_segment_log(self._load_task_meta(task_id).get("partial_output_file"))
+        self.registry.delete(task_id)
+        self.leases.delete(task_id)
+        shutil.rmtree(self._lease_dir(task_id), ignore_errors=True)
+        self._publish(task_id, task_events.DELETED)
+    
+    def create_disk_janitor(self, log_manager: LogManager = None) -> DiskJanitor:
+        """数据目录磁盘回收：按目录配额清理，未结束任务与仍存在的导入所引用的文件不删除"""
+        from config import Config
+        
+        return DiskJanitor(
+            self.base_dir, Config.RETENTION_POLICIES,
+            referenced=lambda: self.referenced_files() + [str(self.base_dir / p) for p in Config.RETENTION_PINNED],
+            min_free_bytes=Config.RETENTION_MIN_FREE_BYTES,
+            on_delete=self.release_import_file,
+            log_manager=log_manager or self.log_manager
+        )
+    
+    def start_maintenance(self, disk_janitor: DiskJanitor):
+        """
+        启动后台磁盘回收与中断任务的恢复
+        
+        每个部署只在一个进程中调用：inline 模式为Web进程（python run.py），
+        external 模式为独立执行进程（run.py --executor），多个WSGI工作进程不重复扫描与接管。
+        """
+        from config import Config
+        
+        if Config.RETENTION_INTERVAL > 0:
+            disk_janitor.start(Config.RETENTION_INTERVAL)
+        # 进程退出（容器重启、崩溃）时未完成的任务从最后一个检查点自动继续
+        if Config.RECOVER_ON_STARTUP:
+            self.start_recovery()
+    
+    def start_recovery(self):
+        """
+        启动时恢复中断的任务（Web服务与独立执行进程启动时调用）
+        
+        启动时持有进程心跳尚未超时的任务（上一个进程刚退出）在超时后再检查一次。
+        """
+        from config import Config
+        
+        def recover():
+            try:
+                self.recover_interrupted_tasks()
+            except Exception as e:
+                self.log_manager.error(f"恢复中断的任务失败: {e}")
+        
+        def recover_later():
+            time.sleep(Config.OWNER_TIMEOUT + Config.OWNER_HEARTBEAT_INTERVAL)
+            recover()
+        
+        recover()
+        threading.Thread(target=recover_later, name="task-recovery", daemon=True).start()
+    
+    def recover_interrupted_tasks(self) -> List[str]:
+        """
+        接管执行进程已退出（容器重启、进程崩溃）的排队与执行中任务并重新排队，返回重新排队的任务ID
+        
+        任务按优先级高、提交早的顺序提交到调度器（external 模式交回注册表由执行进程领取），
+        运行时从段日志中最后一个有效的检查点继续：写到一半的最后一个检查点（临时文件或校验失败的段）
+        在打开段日志时丢弃，这部分行重新处理。崩溃前已提出的暂停、取消请求直接生效。
+        """
+        from config import Config
+        recovered = []
+        for meta in self.registry.claim_orphaned(self.owner_id, Config.OWNER_TIMEOUT,
+                                                 include_unassigned=self.inline_execution):
+            task_id = meta.pop("task_id")
+            control = meta.pop("control", None)
+            # 本进程中排队或运行的任务（持有进程标识相同）
+            if task_id in self.tasks or self.scheduler.is_scheduled(task_id):
+                continue
+            try:
+                task = self._task_from_meta(task_id, meta)
+                task.processed_records = self._persisted_records(task)
+                task.progress = (task.processed_records / task.total_records) * 100.0 if task.total_records else 0.0
+            except Exception as e:
+                # 元数据损坏、无法重建的任务标记为失败，不在每次启动时重复尝试
+                self.log_manager.error(f"无法恢复任务 {task_id}: {e}")
+                self.registry.save(dict(meta, task_id=task_id, status=TaskStatus.FAILED.value,
+                                        error_message=f"进程退出后无法恢复: {e}"))
+                self.registry.set_owner(task_id, None)
+                continue
+            if control in ('pause', 'cancel'):
+                task.status = TaskStatus.CANCELLED if control == 'cancel' else TaskStatus.PAUSED
+                if control == 'cancel':
+                    task.end_time = datetime.now()
+                self._save_progress(task)
+                self.registry.set_owner(task_id, None)
+                self.log_manager.info(f"中断的任务已{CONTROL_ACTIONS[control]}: {task_id}")
+                continue
+            # 先以排队状态保存（实时进度回到检查点位置），再提交调度
+            self._save_progress(task)
+            self._schedule(task)
+            recovered.append(task_id)
+            self.log_manager.info(
+                f"已恢复中断的任务: {task_id}, 优先级: {task.priority}, "
+                f"从检查点继续: {task.processed_records}/{task.total_records}")
+        if recovered:
+            self.log_manager.info(f"共恢复 {len(recovered)} 个中断的任务")
+        return recovered
+
     def restart_task(self, task_id: str) -> str:
         """从进度文件恢复并重启任务"""
-        # 若内存中存在且未完成，直接返回
-        with self._tasks_lock:
-            if task_id in self.tasks and self.tasks[task_id].status == TaskStatus.PROCESSING:
+        from config import Config
+        # 已在排队或运行中，直接返回
+        if self.scheduler.is_scheduled(task_id):
+            return task_id
+        meta = self._load_task_meta(task_id)
+        if not meta:
+            raise ValueError("未找到可恢复的任务记录")
+        # 在其他进程中排队或运行（执行进程仍有心跳，或在等待独立执行进程领取）
+        if meta.get("status") in (TaskStatus.PENDING.value, TaskStatus.PROCESSING.value):
+            owner = meta.get("owner")
+            if (owner is None and meta.get("status") == TaskStatus.PENDING.value and not self.inline_execution) or (
+                    owner and owner != self.owner_id and time.time() - (meta.get("owner_seen") or 0) < Config.OWNER_TIMEOUT):
                 return task_id
-        progress_file = self.base_dir / "temp" / f"{task_id}_progress.json"
-        if not progress_file.exists():
-            raise ValueError("未找到可恢复的进度文件")
-        meta = json.load(open(progress_file, 'r'))
+        task = self._task_from_meta(task_id, meta)
+        self._schedule(task)
+        return task_id
+    
+    def control_task(self, task_id: str, action: str) -> str:
+        """
+        暂停（pause）、取消（cancel）任务，或让执行中的任务让出运行位置（preempt），返回任务当前状态
+        
+        排队中的任务直接移出队列；执行中的任务在下一个批次前停止（等待请求槽位的请求立即放弃，
+        已发出的请求正常完成），停止前把已完成的行提交为检查点。其他进程中的任务通过注册表传递请求。
+        """
+        if action not in CONTROL_ACTIONS:
+            raise ValueError(f"不支持的操作: {action}")
+        stopped = TaskStatus.CANCELLED if action == 'cancel' else TaskStatus.PAUSED
+        task = self.tasks.get(task_id)
+        if task is not None:
+            if action != 'preempt' and self.scheduler.cancel(task_id):
+                # 在本进程调度队列中尚未运行
+                self._memory_waiting.pop(task_id, None)
+                task.status = stopped
+                if stopped == TaskStatus.CANCELLED:
+                    task.end_time = datetime.now()
+                self._save_progress(task)
+                self.log_manager.info(f"排队中的任务已{CONTROL_ACTIONS[action]}: {task_id}")
+                return task.status.value
+            if self.scheduler.is_scheduled(task_id):
+                if self.scheduler.queue_position(task_id) is None:
+                    self._controls[task_id] = action
+                    self.registry.set_control(task_id, action)
+                    self.scheduler.interrupt(task_id, action)
+                    self.log_manager.info(f"已请求任务{CONTROL_ACTIONS[action]}: {task_id}")
+                return task.status.value
+        meta = self._load_task_meta(task_id)
+        if not meta:
+            raise ValueError(f"任务不存在: {task_id}")
+        status = meta.get("status")
+        if status == TaskStatus.PENDING.value and action != 'preempt' and self.registry.stop_pending(task_id, stopped.value):
+            snapshot = self._task_snapshot(self._load_task_meta(task_id))
+            self._publish_status(snapshot)
+            return stopped.value
+        if status in (TaskStatus.PENDING.value, TaskStatus.PROCESSING.value):
+            self.registry.set_control(task_id, action)
+            return status
+        if status == TaskStatus.PAUSED.value and action == 'cancel':
+            task = task or self._task_snapshot(meta)
+            task.status = TaskStatus.CANCELLED
+            task.end_time = datetime.now()
+            self._save_progress(task)
+            return task.status.value
+        raise ValueError(f"任务状态为 {status}，无法{CONTROL_ACTIONS[action]}")
+    
+    def resume_task(self, task_id: str) -> str:
+        """从检查点继续已暂停的任务"""
+        meta = self._load_task_meta(task_id)
+        if not meta:
+            raise ValueError(f"任务不存在: {task_id}")
+        if meta.get("status") != TaskStatus.PAUSED.value:
+            raise ValueError(f"任务状态为 {meta.get('status')}，只能继续已暂停的任务")
+        return self.restart_task(task_id)
+    
+    def wait_stopped(self, task_id: str, timeout: float) -> bool:
+        """等待本进程中的任务离开调度器（运行结束或被中断），超时返回False"""
+        deadline = time.time() + timeout
+        while self.scheduler.is_scheduled(task_id):
+            if time.time() >= deadline:
+                return False
+            time.sleep(0.1)
+        return True
+    
+    def _preempt_for(self, task: ProcessingTask) -> Optional[str]:
+        """
+        为高优先级任务腾出运行位置：让优先级最低（且低于该任务）的执行中任务在检查点处让出，返回其任务ID
+        
+        inline 模式只在运行位置已满、新任务仍在排队时抢占；external 模式看不到执行进程的空闲容量，直接抢占。
+        """
+        if self.inline_execution:
+            if self.scheduler.queue_position(task.task_id) is None:
+                return None
+            running = [self.tasks[t] for t in self.scheduler.stats()["running"] if t in self.tasks]
+            if len(running) < self.scheduler.max_running:
+                return None
+            candidates = [{"task_id": t.task_id, "priority": t.priority}
+                          for t in sorted(running, key=lambda t: t.priority) if t.task_id not in self._controls]
+        else:
+            candidates = self.registry.running_tasks()
+        if not candidates or candidates[0]["priority"] >= task.priority:
+            return None
+        victim = candidates[0]["task_id"]
+        self.control_task(victim, 'preempt')
+        self.log_manager.info(f"任务 {task.task_id}（优先级 {task.priority}）抢占任务 {victim} 的运行位置")
+        return victim
+    
+    def _task_from_meta(self, task_id: str, meta: Dict[str, Any]) -> ProcessingTask:
+        """由持久化的任务元数据重建待运行的任务对象"""
         # 重建规则
-        rules = [ParsingRule(r["source_column"], r["target_columns"], r["prompt"], r.get("rule_id")) for r in meta.get("parsing_rules", [])]
-        task = ProcessingTask(
+        rules = [ParsingRule(r["source_column"], r["target_columns"], r["prompt"], r.get("rule_id"), r.get("column_types"))
+                 for r in meta.get("parsing_rules", [])]
+        return ProcessingTask(
             task_id=task_id,
             input_file=meta["input_file"],
             output_file=meta["output_file"],
@@ -675,43 +1918,119 @@ class ExcelStructuredParser:
             threads=int(meta.get("threads", 1)),
             checkpoint_every=int(meta.get("checkpoint_every", 50)),
             partial_output_file=meta.get("partial_output_file"),
-            progress_file=str(progress_file),
-            name=meta.get("name", "")
+            progress_file=str(self.base_dir / "temp" / f"{task_id}_progress.json"),
+            name=meta.get("name", ""),
+            chunk_size=int(meta.get("chunk_size", 0)),
+            checkpoint_seq=int(meta.get("checkpoint_seq", 0)),
+            output_format=meta.get("output_format") or DEFAULT_OUTPUT_FORMAT,
+            index_column=meta.get("index_column"),
+            priority=int(meta.get("priority", 0)),
+            weight=float(meta.get("weight", 1.0))
         )
-        with self._tasks_lock:
-            self.tasks[task_id] = task
-        thread = threading.Thread(target=self._process_task, args=(task_id,))
-        thread.daemon = True
-        thread.start()
-        return task_id
     
     def download_partial_result(self, task_id: str) -> Optional[str]:
-        """导出当前任务已处理的部分结果为Excel并返回路径。若完整结果已生成则返回完整结果。"""
-        # 若任务存在且已完成，直接返回完整结果
+        """
+        获取任务部分结果文件的路径，若完整结果已生成则返回完整结果
+        
+        当前检查点版本尚未生成时在后台生成，并先返回最近一个已生成的旧版本（没有则返回None）。
+        """
+        return self.get_partial_export(task_id)["file"]
+    
+    def get_partial_export(self, task_id: str) -> Dict[str, Any]:
+        """
+        查询（必要时在后台生成）任务的部分结果导出
+        
+        部分结果按检查点序号版本化为 partial_{task_id}_seq{序号}{扩展名}，
+        检查点没有推进时直接复用已有文件，不重复导出。
+        
+        Returns:
+            {"status": completed/ready/pending/unavailable, "file": 可下载的文件路径或None,
+             "checkpoint_seq": 当前检查点序号, "file_seq": 返回文件对应的检查点序号}
+        """
         task = self.tasks.get(task_id)
         if task and task.status == TaskStatus.COMPLETED and os.path.exists(task.output_file):
-            return task.output_file
-        # 尝试从进度文件读取部分结果
-        progress_file_path = self.base_dir / "temp" / f"{task_id}_progress.json"
-        partial_file_path = self.base_dir / "temp" / f"{task_id}_partial.pkl"
-        # 若内存任务存在也尝试其部分结果路径
-        if task and task.partial_output_file:
-            partial_file_path = Path(task.partial_output_file)
-        if os.path.exists(str(partial_file_path)):
-            try:
-                df = pd.read_pickle(str(partial_file_path))
-                export_path = self.base_dir / "exports" / f"partial_{task_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-                df.to_excel(str(export_path), index=True)
-                return str(export_path)
-            except Exception:
-                return None
-        # 如果没有部分结果但完整结果存在
-        if task and os.path.exists(task.output_file):
-            return task.output_file
-        # 兜底：若进度文件存在但没有partial，则返回None
-        if os.path.exists(str(progress_file_path)):
-            return None
-        return None
+            return {"status": "completed", "file": task.output_file,
+                    "checkpoint_seq": task.checkpoint_seq, "file_seq": task.checkpoint_seq}
+        meta = self._load_task_meta(task_id) if task is None else {}
+        partial_file_path = (task.partial_output_file if task else meta.get("partial_output_file")) \
+            or str(self.base_dir / "temp" / f"{task_id}_segments")
+        input_file = task.input_file if task else meta.get("input_file")
+        seq = task.checkpoint_seq if task else int(meta.get("checkpoint_seq", 0))
+        if not (os.path.exists(partial_file_path) and input_file and os.path.exists(input_file)):
+            # 没有部分结果但完整结果存在
+            if task and os.path.exists(task.output_file):
+                return {"status": "completed", "file": task.output_file, "checkpoint_seq": seq, "file_seq": seq}
+            return {"status": "unavailable", "file": None, "checkpoint_seq": seq, "file_seq": None}
+        
+        output_format = (task.output_format if task else meta.get("output_format")) or DEFAULT_OUTPUT_FORMAT
+        # 旧版整表pickle检查点固定导出为xlsx
+        suffix = output_suffix(output_format) if os.path.isdir(partial_file_path) else ".xlsx"
+        export_path = self.base_dir / "exports" / f"partial_{task_id}_seq{seq:06d}{suffix}"
+        if export_path.exists():
+            return {"status": "ready", "file": str(export_path), "checkpoint_seq": seq, "file_seq": seq}
+        
+        chunk_size = task.chunk_size if task else int(meta.get("chunk_size", 0))
+        index_column = task.index_column if task else meta.get("index_column")
+        self._schedule_partial_export(task_id, str(export_path), partial_file_path, input_file, output_format,
+                                      chunk_size, index_column)
+        latest = self._latest_partial_export(task_id)
+        return {"status": "pending", "file": latest[1] if latest else None,
+                "checkpoint_seq": seq, "file_seq": latest[0] if latest else None}
+    
+    def _partial_export_versions(self, task_id: str) -> List[tuple]:
+        """已生成的部分结果版本列表 [(检查点序号, 路径)]，按序号升序"""
+        versions = []
+        for path in (self.base_dir / "exports").glob(f"partial_{task_id}_seq*"):
+            match = re.match(r"partial_.+_seq(\d+)\.", path.name)
+            if match and not path.name.endswith(".part"):
+                versions.append((int(match.group(1)), str(path)))
+        return sorted(versions)
+    
+    def _latest_partial_export(self, task_id: str) -> Optional[tuple]:
+        versions = self._partial_export_versions(task_id)
+        return versions[-1] if versions else None
+    
+    def _schedule_partial_export(self, task_id: str, export_path: str, partial_file_path: str, input_file: str,
+                                 output_format: str, chunk_size: int, index_column: Optional[str]):
+        """在后台线程生成部分结果；同一任务同时只生成一个版本"""
+        with self._partial_lock:
+            if task_id in self._partial_exports:
+                return
+            thread = threading.Thread(
+                target=self._build_partial_export,
+                args=(task_id, export_path, partial_file_path, input_file, output_format, chunk_size, index_column),
+            )
+            thread.daemon = True
+            self._partial_exports[task_id] = thread
+            thread.start()
+    
+    def _build_partial_export(self, task_id: str, export_path: str, partial_file_path: str, input_file: str,
+                              output_format: str, chunk_size: int, index_column: Optional[str]):
+        """生成一个部分结果版本，成功后删除该任务的旧版本"""
+        from config import Config
+        
+        try:
+            if os.path.isdir(partial_file_path):
+                # 只读重放段日志（不清理文件，任务可能仍在写入），逐块合并原始列按任务的导出格式写出
+                log = SegmentLog(partial_file_path)
+                log.recover(repair=False)
+                self._replay_segments(input_file, log, export_path, output_format,
+                                      chunk_size or Config.CHUNK_SIZE, index_column).commit()
+            else:
+                # 旧版整表pickle检查点
+                df = self._join_source_columns(input_file, pd.read_pickle(partial_file_path))
+                tmp_path = f"{export_path}.part"
+                df.to_excel(tmp_path, index=True, engine="openpyxl")
+                os.replace(tmp_path, export_path)
+            for _, old_path in self._partial_export_versions(task_id):
+                if old_path != export_path:
+                    os.remove(old_path)
+            self.log_manager.info(f"部分结果已生成: {export_path}")
+        except Exception as e:
+            self.log_manager.error(f"生成部分结果失败: {task_id}, {e}")
+        finally:
+            with self._partial_lock:
+                self._partial_exports.pop(task_id, None)
 
     def download_result(self, task_id: str) -> Optional[str]:
         """
@@ -724,35 +2043,42 @@ class ExcelStructuredParser:
             结果文件路径，如果任务未完成则返回None
         """
         task = self.tasks.get(task_id)
-        if not task or task.status != TaskStatus.COMPLETED:
+        if task is not None:
+            status, output_file = task.status.value, task.output_file
+        else:
+            # 服务重启后的历史任务从任务注册表查询
+            meta = self._load_task_meta(task_id)
+            status, output_file = meta.get("status"), meta.get("output_file")
+        if status != TaskStatus.COMPLETED.value or not output_file:
             return None
         
-        if os.path.exists(task.output_file):
-            return task.output_file
+        if os.path.exists(output_file):
+            return output_file
         else:
             return None
 
-def main():
-    """主函数 - 演示用法"""
-    print("=" * 60)
-    print("Excel半结构化数据解析工具")
-    print("=" * 60)
-    
-    # 配置
-    api_key = "gJrVzbTcTtitntvY5sdNE2tMHdM2O8AH8j9l5q48TV3gJNkh"
-    
-    # 创建解析器
-    parser = ExcelStructuredParser(api_key)
-    
-    # 示例用法
-    print("\n1. 导入Excel文件")
-    print("2. 创建解析规则")
-    print("3. 启动处理任务")
-    print("4. 监控任务进度")
-    print("5. 下载处理结果")
-    
-    # 这里可以添加交互式操作或API接口
-    print("\n工具已初始化完成，可以通过API接口或修改代码来使用具体功能")
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    命令行入口
+
+    python -m excel_structured_parser run --rules rule_templates/medical_record_rules.json --input dir/ --out out/ --concurrency 16
+    """
+    import argparse
+    from batch_runner import add_run_arguments, run_batch
+    
+    arg_parser = argparse.ArgumentParser(prog="python -m excel_structured_parser",
+                                         description="Excel半结构化数据解析工具（命令行批量处理，Web界面请运行 run.py）")
+    commands = arg_parser.add_subparsers(dest="command")
+    add_run_arguments(commands.add_parser("run", help="按规则模板批量处理目录中的数据文件"))
+    args = arg_parser.parse_args(argv)
+    if args.command != "run":
+        arg_parser.print_help()
+        return 2
+    try:
+        return run_batch(args)
+    except (ValueError, OSError) as e:
+        print(f"错误: {e}")
+        return 2
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    sys.exit(main())
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分布式执行的行区间租约表
+协调进程把任务按固定行数切分为区间写入共享的SQLite表，工作进程（可在其他节点，共享数据卷）
+领取区间租约、定期续约并写出结果段；租约过期未续约的区间可被其他工作进程重新领取。
+每次领取递增 attempt，续约与完成都按 (worker_id, attempt) 校验，过期后被接管的旧租约无法再提交结果
+"""
+
+import os
+import socket
+import time
+from typing import Any, Dict, List, Optional
+
+from task_registry import SQLiteStore
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS leases (
+    task_id TEXT NOT NULL,
+    start INTEGER NOT NULL,
+    end INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    priority INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    worker_id TEXT,
+    attempt INTEGER NOT NULL DEFAULT 0,
+    expires_at REAL,
+    segment_path TEXT,
+    error_message TEXT,
+    PRIMARY KEY (task_id, start)
+);
+CREATE INDEX IF NOT EXISTS idx_leases_claim ON leases (status, priority, created_at);
+CREATE TABLE IF NOT EXISTS workers (
+    worker_id TEXT PRIMARY KEY,
+    host TEXT,
+    pid INTEGER,
+    started_at REAL,
+    last_seen REAL,
+    current TEXT
+);
+"""
+
+# 区间状态
+PENDING = 'pending'
+LEASED = 'leased'
+DONE = 'done'
+FAILED = 'failed'
+
+
+def default_worker_id() -> str:
+    """主机名+进程号，同一节点上的多个工作进程互不冲突"""
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class LeaseTable(SQLiteStore):
+    """行区间租约表"""
+
+    def __init__(self, db_path: str, max_attempts: int = 3):
+        """
+        Args:
+            db_path: SQLite 数据库路径（与任务注册表共用，多节点时须位于支持POSIX文件锁的共享卷）
+            max_attempts: 一个区间最多领取的次数，处理出错超过该次数后区间标记为失败
+        """
+        super().__init__(db_path, _SCHEMA)
+        self.max_attempts = max(int(max_attempts), 1)
+
+    def create_ranges(self, task_id: str, start: int, total: int, range_rows: int, priority: int = 0) -> int:
+        """把 [start, total) 按 range_rows 行切分为待领取区间（已存在的区间保留原状态），返回新建的区间数"""
+        range_rows = max(int(range_rows), 1)
+        now = time.time()
+        rows = [(task_id, s, min(s + range_rows, total), int(priority), now) for s in range(start, total, range_rows)]
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            before = conn.total_changes
+            conn.executemany(
+                'INSERT OR IGNORE INTO leases (task_id, start, end, priority, created_at) VALUES (?, ?, ?, ?, ?)', rows)
+            created = conn.total_changes - before
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return created
+
+    def claim(self, worker_id: str, ttl: float) -> Optional[Dict[str, Any]]:
+        """
+        领取一个区间租约：优先级高、创建早、起始行小的待领取区间优先，过期的租约视为待领取
+
+        Returns:
+            {'task_id', 'start', 'end', 'attempt'}，没有可领取的区间时返回None
+        """
+        now = time.time()
+        conn = self._conn()
+        # IMMEDIATE 事务在读之前就拿到写锁，多个工作进程不会领到同一区间
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                """
+                SELECT task_id, start, end, attempt FROM leases
+                WHERE status = ? OR (status = ? AND expires_at < ?)
+                ORDER BY priority DESC, created_at, start LIMIT 1
+                """,
+                (PENDING, LEASED, now),
+            ).fetchone()
+            if row is None:
+                conn.execute('COMMIT')
+                return None
+            attempt = row['attempt'] + 1
+            conn.execute(
+                """
+                UPDATE leases SET status = ?, worker_id = ?, attempt = ?, expires_at = ?, segment_path = NULL
+                WHERE task_id = ? AND start = ?
+                """,
+                (LEASED, worker_id, attempt, now + ttl, row['task_id'], row['start']),
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return {'task_id': row['task_id'], 'start': row['start'], 'end': row['end'], 'attempt': attempt}
+
+    def heartbeat(self, lease: Dict[str, Any], worker_id: str, ttl: float) -> bool:
+        """续约，返回租约是否仍归该工作进程所有"""
+        cur = self._conn().execute(
+            'UPDATE leases SET expires_at = ? WHERE task_id = ? AND start = ? AND status = ? AND worker_id = ? AND attempt = ?',
+            (time.time() + ttl, lease['task_id'], lease['start'], LEASED, worker_id, lease['attempt']),
+        )
+        return cur.rowcount == 1
+
+    def complete(self, lease: Dict[str, Any], worker_id: str, segment_path: str) -> bool:
+        """提交区间结果段，租约已被接管或区间已删除时返回False（结果应丢弃）"""
+        cur = self._conn().execute(
+            """
+            UPDATE leases SET status = ?, segment_path = ?, expires_at = NULL
+            WHERE task_id = ? AND start = ? AND status = ? AND worker_id = ? AND attempt = ?
+            """,
+            (DONE, segment_path, lease['task_id'], lease['start'], LEASED, worker_id, lease['attempt']),
+        )
+        return cur.rowcount == 1
+
+    def release(self, lease: Dict[str, Any], worker_id: str, error: str):
+        """处理出错时归还租约；领取次数达到上限的区间标记为失败"""
+        self._conn().execute(
+            """
+            UPDATE leases SET status = CASE WHEN attempt >= ? THEN ? ELSE ? END, error_message = ?, expires_at = NULL
+            WHERE task_id = ? AND start = ? AND status = ? AND worker_id = ? AND attempt = ?
+            """,
+            (self.max_attempts, FAILED, PENDING, error, lease['task_id'], lease['start'], LEASED, worker_id,
+             lease['attempt']),
+        )
+
+    def ranges(self, task_id: str, start: int = 0) -> List[Dict[str, Any]]:
+        """任务从 start 行起的区间（按起始行排序）"""
+        rows = self._conn().execute(
+            'SELECT start, end, status, segment_path, error_message FROM leases WHERE task_id = ? AND start >= ? ORDER BY start',
+            (task_id, start),
+        )
+        return [dict(row) for row in rows]
+
+    def reset(self, task_id: str, start: int):
+        """结果段无效时把区间重新置为待领取"""
+        self._conn().execute(
+            'UPDATE leases SET status = ?, segment_path = NULL, worker_id = NULL, expires_at = NULL WHERE task_id = ? AND start = ?',
+            (PENDING, task_id, start),
+        )
+
+    def delete(self, task_id: str):
+        self._conn().execute('DELETE FROM leases WHERE task_id = ?', (task_id,))
+
+    def withdraw(self, task_id: str) -> int:
+        """任务暂停时撤回尚未领取的区间（已领取的区间继续处理完成，恢复后合并），返回撤回的区间数"""
+        cur = self._conn().execute('DELETE FROM leases WHERE task_id = ? AND status = ?', (task_id, PENDING))
+        return cur.rowcount
+
+    def progress(self, task_id: str) -> Dict[str, Any]:
+        """任务各状态的区间数与行数，以及持有租约的工作进程"""
+        rows = self._conn().execute(
+            'SELECT status, COUNT(*) AS n, SUM(end - start) AS rows_ FROM leases WHERE task_id = ? GROUP BY status',
+            (task_id,),
+        )
+        ranges = {row['status']: {'ranges': row['n'], 'rows': row['rows_']} for row in rows}
+        workers = [row['worker_id'] for row in self._conn().execute(
+            'SELECT DISTINCT worker_id FROM leases WHERE task_id = ? AND status = ?', (task_id, LEASED))]
+        return {'ranges': ranges, 'workers': workers}
+
+    def register_worker(self, worker_id: str, current: Optional[str] = None):
+        """登记或刷新工作进程（心跳时调用）"""
+        now = time.time()
+        self._conn().execute(
+            """
+            INSERT INTO workers (worker_id, host, pid, started_at, last_seen, current) VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(worker_id) DO UPDATE SET last_seen = excluded.last_seen, current = excluded.current
+            """,
+            (worker_id, socket.gethostname(), os.getpid(), now, now, current),
+        )
+
+    def workers(self, active_within: float) -> List[Dict[str, Any]]:
+        """最近 active_within 秒内有心跳的工作进程"""
+        rows = self._conn().execute(
+            'SELECT worker_id, host, pid, started_at, last_seen, current FROM workers WHERE last_seen >= ? ORDER BY worker_id',
+            (time.time() - active_within,),
+        )
+        return [dict(row) for row in rows]
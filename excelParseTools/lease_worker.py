@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分布式工作进程
+从租约表领取任务的行区间，按任务规则调用大模型处理，把区间结果写成段文件后提交；
+处理期间定期续约，租约丢失（过期被其他进程接管或任务被删除）时放弃该区间的结果
+"""
+
+import shutil
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import pandas as pd
+
+from config import Config
+from logger_manager import LogManager
+from segment_log import SegmentLog
+from job_leases import default_worker_id
+
+
+class LeaseWorker:
+    """领取并处理行区间的工作进程"""
+
+    # 缓存的任务输入（非分块任务整表按列投影加载一次，后续区间直接切片）
+    INPUT_CACHE_SIZE = 2
+
+    def __init__(self, parser, worker_id: Optional[str] = None):
+        """
+        Args:
+            parser: ExcelStructuredParser，提供任务元数据、租约表与批次处理
+            worker_id: 工作进程标识，默认为 主机名-进程号
+        """
+        self.parser = parser
+        self.leases = parser.leases
+        self.worker_id = worker_id or default_worker_id()
+        self.ttl = Config.LEASE_TTL
+        self.log_manager = parser.log_manager
+        self._inputs: "OrderedDict[str, pd.DataFrame]" = OrderedDict()
+        self._inputs_lock = threading.Lock()
+        self.stop_event = threading.Event()
+
+    def run(self, threads: int = 1):
+        """启动 threads 个领取线程并阻塞到 stop_event 被设置"""
+        workers = [threading.Thread(target=self._loop, name=f"lease-worker-{i}", daemon=True)
+                   for i in range(max(int(threads), 1))]
+        for thread in workers:
+            thread.start()
+        self.log_manager.info(f"工作进程已启动: {self.worker_id}, 线程数: {len(workers)}")
+        try:
+            while any(thread.is_alive() for thread in workers):
+                self.stop_event.wait(1.0)
+        except KeyboardInterrupt:
+            self.stop_event.set()
+        for thread in workers:
+            thread.join()
+
+    def _loop(self):
+        while not self.stop_event.is_set():
+            try:
+                self.leases.register_worker(self.worker_id)
+                lease = self.leases.claim(self.worker_id, self.ttl)
+            except Exception as e:
+                self.log_manager.error(f"领取区间失败: {e}")
+                self.stop_event.wait(Config.LEASE_POLL_INTERVAL)
+                continue
+            if lease is None:
+                self.stop_event.wait(Config.LEASE_POLL_INTERVAL)
+                continue
+            try:
+                self.run_lease(lease)
+            except Exception as e:
+                self.log_manager.error(f"区间 {lease['task_id']}:{lease['start']}-{lease['end']} 处理失败: {e}")
+                self.leases.release(lease, self.worker_id, str(e))
+
+    def run_lease(self, lease: Dict[str, Any]) -> bool:
+        """处理一个区间并提交结果段，返回结果是否被接受"""
+        task_id = lease['task_id']
+        meta = self.parser._load_task_meta(task_id)
+        if not meta:
+            raise ValueError(f"任务不存在: {task_id}")
+        task = self.parser._task_from_meta(task_id, meta)
+        lost = threading.Event()
+        done = threading.Event()
+        current = f"{task_id}:{lease['start']}-{lease['end']}"
+
+        def heartbeat():
+            while not done.wait(self.ttl / 3):
+                if not self.leases.heartbeat(lease, self.worker_id, self.ttl):
+                    lost.set()
+                    return
+                self.leases.register_worker(self.worker_id, current)
+
+        thread = threading.Thread(target=heartbeat, name=f"lease-heartbeat-{task_id[:8]}", daemon=True)
+        thread.start()
+        try:
+            self.leases.register_worker(self.worker_id, current)
+            frame = self._process_range(task, lease['start'], lease['end'], lost)
+        finally:
+            done.set()
+            thread.join()
+        if frame is None:
+            self.log_manager.warning(f"区间 {current} 的租约已丢失，放弃结果")
+            return False
+
+        segment_dir = self.parser._lease_dir(task_id) / f"{lease['start']:012d}_{lease['attempt']}"
+        shutil.rmtree(segment_dir, ignore_errors=True)
+        SegmentLog(segment_dir).append(0, frame)
+        if not self.leases.complete(lease, self.worker_id, str(segment_dir)):
+            shutil.rmtree(segment_dir, ignore_errors=True)
+            self.log_manager.warning(f"区间 {current} 已被接管或任务已删除，放弃结果")
+            return False
+        return True
+
+    def _process_range(self, task, start: int, end: int, lost: threading.Event) -> Optional[pd.DataFrame]:
+        """按批次处理 [start, end) 行，返回区间结果；租约丢失时返回None"""
+        rows = self._input_rows(task, start, end)
+        result_df = self.parser._new_result_frame(rows.index, task.parsing_rules)
+        task_log_manager = LogManager(task.task_id)
+        batch_size = self.parser.BATCH_SIZE
+        for offset in range(0, len(rows), batch_size):
+            if lost.is_set():
+                return None
+            batch_df = rows.iloc[offset:offset + batch_size]
+            start_idx = start + offset
+            batch_columns = self.parser._process_batch(task, batch_df, start_idx // batch_size, start_idx,
+                                                       task.total_records, task_log_manager)
+            self.parser._write_batch_results(result_df, batch_columns, offset)
+        return None if lost.is_set() else result_df
+
+    def _input_rows(self, task, start: int, end: int) -> pd.DataFrame:
+        """读取区间对应的输入行：分块任务流式读取，其他任务缓存按列投影加载的整表"""
+        if task.chunk_size > 0:
+            return self.parser._read_rows(task, start, end)
+        with self._inputs_lock:
+            df = self._inputs.get(task.task_id)
+            if df is None:
+                source_columns = self.parser._get_source_columns(task.parsing_rules)
+                df = self.parser._load_projected_input(task.input_file, source_columns, task.index_column)
+                self._inputs[task.task_id] = df
+                while len(self._inputs) > self.INPUT_CACHE_SIZE:
+                    self._inputs.popitem(last=False)
+            else:
+                self._inputs.move_to_end(task.task_id)
+        return df.iloc[start:end]
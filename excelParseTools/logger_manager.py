@@ -2,16 +2,111 @@
 # -*- coding: utf-8 -*-
 """
 Excel解析工具日志管理器
-提供可配置的日志记录功能，支持大模型交互日志、批次处理日志等
+提供可配置的日志记录功能，支持大模型交互日志、批次处理日志等；
+日志查看缓存与日志开关保存在共享的日志索引中，多个进程写入的日志可在任一进程查看
 """
 
 import logging
 import os
 import json
+import threading
 from datetime import datetime
 from pathlib import Path
 from typing import Dict, Any, Optional, List
 from config import Config
+from task_registry import SQLiteStore
+
+# 可在运行时切换、在各进程间共享的日志开关
+LOG_OPTIONS = ('ENABLE_LLM_LOGGING', 'ENABLE_BATCH_LOGGING', 'ENABLE_DETAILED_LOGGING',
+               'LOG_API_REQUESTS', 'LOG_API_RESPONSES')
+
+_LOG_SCHEMA = """
+CREATE TABLE IF NOT EXISTS logs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    task_key TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    level TEXT NOT NULL,
+    message TEXT NOT NULL,
+    extra_data TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_logs_task ON logs (task_key, id);
+CREATE TABLE IF NOT EXISTS log_options (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+class LogIndex(SQLiteStore):
+    """共享日志索引：按任务保存最近的日志条目（全局日志的任务键为空字符串）"""
+
+    PRUNE_EVERY = 200  # 每个任务每追加多少条清理一次超出上限的旧条目
+
+    def __init__(self, db_path: str, max_entries: int = 1000):
+        super().__init__(db_path, _LOG_SCHEMA)
+        self.max_entries = max(int(max_entries), 1)
+        self._appends: Dict[str, int] = {}
+
+    def append(self, task_key: str, entry: Dict[str, Any]):
+        self._conn().execute(
+            'INSERT INTO logs (task_key, timestamp, level, message, extra_data) VALUES (?, ?, ?, ?, ?)',
+            (task_key, entry['timestamp'], entry['level'], entry['message'],
+             json.dumps(entry['extra_data'], ensure_ascii=False, default=str)),
+        )
+        count = self._appends.get(task_key, 0) + 1
+        self._appends[task_key] = count
+        if count % self.PRUNE_EVERY == 0:
+            self._conn().execute(
+                """
+                DELETE FROM logs WHERE task_key = ? AND id <= (
+                    SELECT id FROM logs WHERE task_key = ? ORDER BY id DESC LIMIT 1 OFFSET ?)
+                """,
+                (task_key, task_key, self.max_entries),
+            )
+
+    def recent(self, task_key: str, level: Optional[str] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """最近的日志条目（按时间正序）"""
+        sql = 'SELECT timestamp, level, message, extra_data FROM logs WHERE task_key = ?'
+        params: List[Any] = [task_key]
+        if level:
+            sql += ' AND level = ?'
+            params.append(level)
+        sql += ' ORDER BY id DESC LIMIT ?'
+        params.append(int(limit or self.max_entries))
+        rows = self._conn().execute(sql, params).fetchall()
+        return [{'timestamp': row['timestamp'], 'level': row['level'], 'message': row['message'],
+                 'extra_data': json.loads(row['extra_data']) if row['extra_data'] else {}}
+                for row in reversed(rows)]
+
+    def clear(self, task_key: str):
+        self._conn().execute('DELETE FROM logs WHERE task_key = ?', (task_key,))
+
+    def options(self) -> Dict[str, bool]:
+        """运行时修改过的日志开关"""
+        return {row['name']: bool(row['value']) for row in self._conn().execute('SELECT name, value FROM log_options')}
+
+    def set_option(self, name: str, value: bool):
+        self._conn().execute(
+            'INSERT INTO log_options (name, value) VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET value = excluded.value',
+            (name, int(bool(value))),
+        )
+
+
+_shared_index: Optional[LogIndex] = None
+_shared_index_lock = threading.Lock()
+
+
+def shared_log_index() -> Optional[LogIndex]:
+    """进程内共用的日志索引，未启用时返回None"""
+    global _shared_index
+    if not Config.LOG_INDEX_ENABLED:
+        return None
+    with _shared_index_lock:
+        if _shared_index is None:
+            Config.init_directories()
+            _shared_index = LogIndex(Config.LOG_INDEX_PATH or Config.LOG_DIR / "log_index.db")
+        return _shared_index
+
 
 class LogManager:
     """日志管理器类"""
@@ -25,6 +120,8 @@ class LogManager:
         """
         self.task_id = task_id
         self.config = Config()
+        self.index = shared_log_index()
+        self.refresh_options()
         self._setup_loggers()
         
         # 日志缓存，用于实时查看
@@ -115,6 +212,32 @@ class LogManager:
         # 限制缓存大小
         if len(self.log_cache) > self.max_cache_size:
             self.log_cache = self.log_cache[-self.max_cache_size:]
+        
+        if self.index is not None:
+            try:
+                self.index.append(self.task_id or '', log_entry)
+            except Exception:
+                # 日志索引不可用时不影响日志记录本身
+                pass
+    
+    def set_option(self, name: str, value: bool):
+        """修改日志开关（同时写入日志索引，其他进程新建的日志管理器沿用该设置）"""
+        if name not in LOG_OPTIONS:
+            raise ValueError(f"未知的日志开关: {name}")
+        setattr(self.config, name, bool(value))
+        if self.index is not None:
+            self.index.set_option(name, value)
+    
+    def refresh_options(self):
+        """从日志索引读取其他进程修改过的日志开关"""
+        if self.index is None:
+            return
+        try:
+            for name, value in self.index.options().items():
+                if name in LOG_OPTIONS:
+                    setattr(self.config, name, value)
+        except Exception:
+            pass
     
     def info(self, message: str, extra_data: Dict[str, Any] = None):
         """记录信息日志"""
@@ -249,7 +372,9 @@ class LogManager:
         })
     
     def get_log_cache(self, level: str = None, limit: int = None) -> List[Dict[str, Any]]:
-        """获取日志缓存"""
+        """获取日志缓存（启用日志索引时读取所有进程写入的日志）"""
+        if self.index is not None:
+            return self.index.recent(self.task_id or '', level, limit or self.max_cache_size)
         if level:
             filtered_logs = [log for log in self.log_cache if log['level'] == level]
         else:
@@ -263,6 +388,8 @@ class LogManager:
     def clear_log_cache(self):
         """清空日志缓存"""
         self.log_cache.clear()
+        if self.index is not None:
+            self.index.clear(self.task_id or '')
     
     def export_logs(self, file_path: str = None) -> str:
         """导出日志到文件"""
@@ -270,11 +397,12 @@ class LogManager:
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
             file_path = self.config.LOG_DIR / f"exported_logs_{timestamp}.json"
         
+        logs = self.get_log_cache()
         export_data = {
             'export_time': datetime.now().isoformat(),
             'task_id': self.task_id,
-            'log_count': len(self.log_cache),
-            'logs': self.log_cache
+            'log_count': len(logs),
+            'logs': logs
         }
         
         with open(file_path, 'w', encoding='utf-8') as f:
@@ -284,17 +412,18 @@ class LogManager:
     
     def get_log_summary(self) -> Dict[str, Any]:
         """获取日志摘要统计"""
-        if not self.log_cache:
+        logs = self.get_log_cache()
+        if not logs:
             return {}
         
         level_counts = {}
-        for log in self.log_cache:
+        for log in logs:
             level = log['level']
             level_counts[level] = level_counts.get(level, 0) + 1
         
         return {
-            'total_logs': len(self.log_cache),
+            'total_logs': len(logs),
             'level_counts': level_counts,
-            'first_log_time': self.log_cache[0]['timestamp'] if self.log_cache else None,
-            'last_log_time': self.log_cache[-1]['timestamp'] if self.log_cache else None
+            'first_log_time': logs[0]['timestamp'] if logs else None,
+            'last_log_time': logs[-1]['timestamp'] if logs else None
         } 
\ No newline at end of file
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+进程内存预算与准入控制
+任务与导入在开始前按估算预留内存，运行中按组成部分（输入帧、结果帧、进行中的提示词与响应、
+排队中的检查点）记录实际占用；已提交内存 = 启动时的基础内存 + 各项的 max(预留, 实际)。
+超出预算时新任务在调度队列中等待（或立即失败），导入等待或失败，不再把进程推过上限
+"""
+
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import pandas as pd
+
+
+class MemoryBudgetExceeded(RuntimeError):
+    """内存预算不足：所需内存超过预算，或等待可用内存超时"""
+
+
+def container_memory_limit() -> int:
+    """容器（cgroup v2/v1）的内存上限（字节），未设置上限或无法读取时返回0"""
+    for path in ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes'):
+        try:
+            with open(path, 'r') as f:
+                value = f.read().strip()
+        except OSError:
+            continue
+        if value.isdigit() and int(value) < 1 << 60:
+            return int(value)
+    return 0
+
+
+def current_rss() -> int:
+    """当前进程的常驻内存（字节）；无法读取 /proc 时退化为峰值常驻内存"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        try:
+            import resource
+        except ImportError:
+            return 0
+        # Linux 上 ru_maxrss 单位为KB
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def frame_nbytes(df: pd.DataFrame) -> int:
+    """DataFrame 占用的内存（含索引与字符串对象）"""
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+def format_bytes(nbytes: float) -> str:
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if abs(nbytes) < 1024 or unit == 'GB':
+            return f"{nbytes:.0f}{unit}" if unit == 'B' else f"{nbytes:.1f}{unit}"
+        nbytes /= 1024.0
+    return f"{nbytes:.1f}GB"
+
+
+class MemoryBudget:
+    """按键（任务ID或导入）记账的内存预算"""
+
+    def __init__(self, budget_bytes: int, baseline_bytes: int = 0):
+        """
+        Args:
+            budget_bytes: 内存预算（字节），0 表示不限制（仍记录各任务的内存占用）
+            baseline_bytes: 不归属任何任务的基础内存（启动时的常驻内存）
+        """
+        self.budget_bytes = max(int(budget_bytes), 0)
+        self.baseline_bytes = max(int(baseline_bytes), 0)
+        self._reserved: Dict[str, int] = {}
+        self._used: Dict[str, Dict[str, int]] = {}
+        self._labels: Dict[str, str] = {}
+        self._cond = threading.Condition()
+        self._listeners: List[Callable[[], None]] = []
+
+    @property
+    def enabled(self) -> bool:
+        return self.budget_bytes > 0
+
+    def on_release(self, callback: Callable[[], None]):
+        """内存释放后调用（在锁外），调度器据此重新尝试启动等待内存的任务"""
+        self._listeners.append(callback)
+
+    def check_fits(self, nbytes: int, what: str):
+        """所需内存超过整个预算（扣除基础内存）时立即失败，这类任务或导入永远无法开始"""
+        if self.enabled and nbytes > self.budget_bytes - self.baseline_bytes:
+            raise MemoryBudgetExceeded(
+                f"{what}预计占用内存 {format_bytes(nbytes)}，超过内存预算 {format_bytes(self.budget_bytes)}"
+                f"（基础占用 {format_bytes(self.baseline_bytes)}）；请使用分块处理或调大 MEMORY_BUDGET")
+
+    def try_reserve(self, key: str, nbytes: int, label: str = '') -> bool:
+        """预留内存，可用内存不足时返回False"""
+        nbytes = max(int(nbytes), 0)
+        with self._cond:
+            if key in self._reserved:
+                return True
+            if self.enabled and nbytes > self.budget_bytes - self._committed():
+                return False
+            self._reserved[key] = nbytes
+            self._labels[key] = label
+            return True
+
+    def reserve(self, key: str, nbytes: int, label: str = '', timeout: float = 0.0):
+        """预留内存，不足时最多等待 timeout 秒，仍不足时抛出 MemoryBudgetExceeded"""
+        self.check_fits(nbytes, label)
+        deadline = time.time() + max(float(timeout), 0.0)
+        with self._cond:
+            while not self.try_reserve(key, nbytes, label):
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise MemoryBudgetExceeded(
+                        f"{label}需要内存 {format_bytes(nbytes)}，当前可用 {format_bytes(self.available())}"
+                        f"（预算 {format_bytes(self.budget_bytes)}），请稍后重试")
+                self._cond.wait(min(remaining, 1.0))
+
+    def add(self, key: str, component: str, delta: int):
+        """增减某项的实际占用（只记录已预留的键，未经准入运行的处理如租约工作进程不记账）"""
+        with self._cond:
+            if key not in self._reserved:
+                return
+            used = self._used.setdefault(key, {})
+            used[component] = max(used.get(component, 0) + int(delta), 0)
+
+    def set(self, key: str, component: str, nbytes: int):
+        """设置某项的实际占用"""
+        with self._cond:
+            if key not in self._reserved:
+                return
+            self._used.setdefault(key, {})[component] = max(int(nbytes), 0)
+
+    def release(self, key: str):
+        """释放预留与实际占用记录，并通知等待内存的调度器与导入"""
+        with self._cond:
+            self._reserved.pop(key, None)
+            self._used.pop(key, None)
+            self._labels.pop(key, None)
+            self._cond.notify_all()
+        for callback in self._listeners:
+            callback()
+
+    def available(self) -> int:
+        with self._cond:
+            return self.budget_bytes - self._committed() if self.enabled else -1
+
+    def usage(self, key: str) -> Optional[Dict[str, Any]]:
+        """某项的预留与实际占用，没有记录时返回None"""
+        with self._cond:
+            if key not in self._reserved:
+                return None
+            used = dict(self._used.get(key, {}))
+            return {'reserved_bytes': self._reserved.get(key, 0), 'used_bytes': sum(used.values()),
+                    'components': used}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                'budget_bytes': self.budget_bytes,
+                'baseline_bytes': self.baseline_bytes,
+                'committed_bytes': self._committed(),
+                'entries': {key: {'label': self._labels.get(key, ''), 'charged_bytes': self._charged(key)}
+                            for key in self._reserved},
+            }
+
+    def _charged(self, key: str) -> int:
+        return max(self._reserved.get(key, 0), sum(self._used.get(key, {}).values()))
+
+    def _committed(self) -> int:
+        return self.baseline_bytes + sum(self._charged(key) for key in self._reserved)
+
+
+def default_budget_bytes(configured: int, fraction: float) -> int:
+    """配置的预算；未配置（0）时取容器内存上限的 fraction，没有上限时不限制"""
+    if configured > 0:
+        return configured
+    limit = container_memory_limit()
+    return int(limit * fraction) if limit else 0
+
+
+def import_memory_estimate(file_path: str) -> int:
+    """整表导入的内存估算：文件大小乘以格式的膨胀系数（xlsx为压缩格式，展开为Python对象后膨胀最大）"""
+    suffix = os.path.splitext(str(file_path))[1].lower()
+    factor = {'.xlsx': 12, '.xls': 6, '.parquet': 8}.get(suffix, 4)
+    return os.path.getsize(file_path) * factor
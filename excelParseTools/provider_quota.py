@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+跨进程共享的大模型提供方配额（令牌桶）
+同一个API密钥的每分钟请求数（RPM）与每分钟token数（TPM）保存在共享的SQLite表中，
+所有调用该密钥的进程（Excel解析的Web/执行/工作进程、ai-model-compare 服务）在发请求前
+从同一个桶中取令牌；请求完成后按实际用量结算，各密钥的用量按分钟汇总在同一张表中。
+
+ai-model-compare/app/quota.py 使用相同的表结构与算法，两个服务把 QUOTA_DB_PATH 指向同一个文件即可共享。
+"""
+
+import hashlib
+import time
+from typing import Any, Dict, List, Optional
+
+from task_registry import SQLiteStore
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS quota_buckets (
+    key_id TEXT PRIMARY KEY,
+    label TEXT NOT NULL DEFAULT '',
+    rpm INTEGER NOT NULL DEFAULT 0,
+    tpm INTEGER NOT NULL DEFAULT 0,
+    request_tokens REAL NOT NULL DEFAULT 0,
+    token_tokens REAL NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS quota_usage (
+    key_id TEXT NOT NULL,
+    minute INTEGER NOT NULL,
+    client TEXT NOT NULL,
+    requests INTEGER NOT NULL DEFAULT 0,
+    tokens INTEGER NOT NULL DEFAULT 0,
+    waited REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (key_id, minute, client)
+);
+"""
+
+
+def quota_key_id(api_key: str) -> str:
+    """API密钥的标识（哈希前缀，表中不保存密钥本身）；各服务对同一个 Bearer 令牌得到相同的标识"""
+    return hashlib.sha256(str(api_key or '').encode('utf-8')).hexdigest()[:16]
+
+
+class QuotaExceeded(Exception):
+    """在超时时间内没有取到配额"""
+
+
+class ProviderQuota(SQLiteStore):
+    """按API密钥共享的令牌桶"""
+
+    PRUNE_EVERY = 500  # 每发放多少次清理一次过期的用量记录
+
+    def __init__(self, db_path: str, client: str, retention_minutes: int = 7 * 24 * 60):
+        """
+        Args:
+            db_path: SQLite 数据库路径（多个服务共享同一文件，多节点时须位于支持POSIX文件锁的共享卷）
+            client: 调用方名称，用量按调用方分开统计
+            retention_minutes: 用量记录的保留分钟数
+        """
+        super().__init__(db_path, _SCHEMA)
+        self.client = client
+        self.retention_minutes = max(int(retention_minutes), 1)
+        self._grants = 0
+
+    def try_acquire(self, key_id: str, tokens: float, rpm: Optional[int] = None, tpm: Optional[int] = None,
+                    label: str = '', waited: float = 0.0) -> float:
+        """
+        尝试取一次请求的配额
+
+        Args:
+            tokens: 本次请求预估的token数（请求完成后用 settle 按实际用量结算）
+            rpm/tpm: 该密钥的每分钟请求数/token数上限，0 表示不限；None 表示沿用其他进程登记的上限
+            waited: 本次请求此前已等待的秒数（取到配额时计入用量统计）
+
+        Returns:
+            0 表示已取到配额，否则为建议的等待秒数
+        """
+        now = time.time()
+        conn = self._conn()
+        # IMMEDIATE 事务在读之前就取得写锁，多个进程的扣减串行执行
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT * FROM quota_buckets WHERE key_id = ?', (key_id,)).fetchone()
+            if row is None:
+                rpm, tpm = int(rpm or 0), int(tpm or 0)
+                # 新桶从满额开始
+                requests_left, tokens_left = float(rpm), float(tpm)
+            else:
+                rpm = int(row['rpm'] if rpm is None else rpm)
+                tpm = int(row['tpm'] if tpm is None else tpm)
+                elapsed = max(now - row['updated_at'], 0.0)
+                requests_left = min(row['request_tokens'] + elapsed * rpm / 60.0, rpm)
+                tokens_left = min(row['token_tokens'] + elapsed * tpm / 60.0, tpm)
+            # 超过整桶容量的请求按整桶计，避免永远取不到
+            need = min(float(tokens), tpm) if tpm else 0.0
+            wait = 0.0
+            if rpm and requests_left < 1:
+                wait = (1 - requests_left) * 60.0 / rpm
+            if tpm and tokens_left < need:
+                wait = max(wait, (need - tokens_left) * 60.0 / tpm)
+            if wait == 0.0:
+                if rpm:
+                    requests_left -= 1
+                if tpm:
+                    tokens_left -= need
+            conn.execute(
+                """
+                INSERT INTO quota_buckets (key_id, label, rpm, tpm, request_tokens, token_tokens, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(key_id) DO UPDATE SET
+                    label = CASE WHEN excluded.label != '' THEN excluded.label ELSE label END,
+                    rpm = excluded.rpm, tpm = excluded.tpm, request_tokens = excluded.request_tokens,
+                    token_tokens = excluded.token_tokens, updated_at = excluded.updated_at
+                """,
+                (key_id, label or '', rpm, tpm, requests_left, tokens_left, now),
+            )
+            if wait == 0.0:
+                self._record(conn, key_id, now, requests=1, waited=waited)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        if wait == 0.0:
+            self._grants += 1
+            if self._grants % self.PRUNE_EVERY == 0:
+                self.prune()
+        return wait
+
+    def acquire(self, key_id: str, tokens: float, rpm: Optional[int] = None, tpm: Optional[int] = None,
+                label: str = '', timeout: Optional[float] = None) -> float:
+        """取一次请求的配额（阻塞等待），返回等待的秒数；超过 timeout 仍未取到时抛出 QuotaExceeded"""
+        start = time.time()
+        waited = 0.0
+        while True:
+            wait = self.try_acquire(key_id, tokens, rpm, tpm, label, waited)
+            if wait == 0.0:
+                return waited
+            if timeout is not None and waited + wait > timeout:
+                raise QuotaExceeded(f"等待配额超过 {timeout} 秒（密钥 {label or key_id}）")
+            # 其他进程可能同时在等待，分段睡眠后重新竞争
+            time.sleep(min(wait, 1.0))
+            waited = time.time() - start
+
+    def settle(self, key_id: str, estimated: float, actual: Optional[float]):
+        """请求完成后按实际token数结算：预估多扣的退回桶中，少扣的从桶中补扣（可暂时为负）"""
+        if actual is None:
+            actual = estimated
+        now = time.time()
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute(
+                """
+                UPDATE quota_buckets SET token_tokens = MIN(token_tokens + MIN(?, tpm) - ?, tpm)
+                WHERE key_id = ? AND tpm > 0
+                """,
+                (float(estimated), float(actual), key_id),
+            )
+            self._record(conn, key_id, now, tokens=int(actual))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def usage(self, minutes: int = 60) -> List[Dict[str, Any]]:
+        """各密钥的上限，最近 minutes 分钟各调用方的请求数/token数/等待秒数，以及当前这一分钟的用量"""
+        since = int(time.time() // 60) - max(int(minutes), 1) + 1
+        conn = self._conn()
+        keys = {row['key_id']: dict(row, requests=0, tokens=0, waited=0.0, clients={})
+                for row in conn.execute('SELECT key_id, label, rpm, tpm FROM quota_buckets ORDER BY label, key_id')}
+        rows = conn.execute(
+            """
+            SELECT key_id, client, SUM(requests) AS requests, SUM(tokens) AS tokens, SUM(waited) AS waited
+            FROM quota_usage WHERE minute >= ? GROUP BY key_id, client
+            """,
+            (since,),
+        )
+        for row in rows:
+            item = keys.get(row['key_id'])
+            if item is None:
+                continue
+            item['clients'][row['client']] = {'requests': row['requests'], 'tokens': row['tokens'],
+                                              'waited': round(row['waited'], 2)}
+            item['requests'] += row['requests']
+            item['tokens'] += row['tokens']
+            item['waited'] = round(item['waited'] + row['waited'], 2)
+        # 最近一分钟的用量，与每分钟上限对照
+        current = {row['key_id']: (row['requests'], row['tokens']) for row in conn.execute(
+            'SELECT key_id, SUM(requests) AS requests, SUM(tokens) AS tokens FROM quota_usage WHERE minute = ? GROUP BY key_id',
+            (int(time.time() // 60),))}
+        for key_id, item in keys.items():
+            item['current_minute'] = dict(zip(('requests', 'tokens'), current.get(key_id, (0, 0))))
+        return list(keys.values())
+
+    def prune(self):
+        """删除超过保留时长的用量记录"""
+        self._conn().execute('DELETE FROM quota_usage WHERE minute < ?',
+                             (int(time.time() // 60) - self.retention_minutes,))
+
+    def _record(self, conn, key_id: str, now: float, requests: int = 0, tokens: int = 0, waited: float = 0.0):
+        conn.execute(
+            """
+            INSERT INTO quota_usage (key_id, minute, client, requests, tokens, waited) VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(key_id, minute, client) DO UPDATE SET
+                requests = requests + excluded.requests, tokens = tokens + excluded.tokens,
+                waited = waited + excluded.waited
+            """,
+            (key_id, int(now // 60), self.client, requests, tokens, waited),
+        )
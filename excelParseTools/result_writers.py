@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+结果流式导出工具
+支持 xlsx（openpyxl只写模式）、CSV（可gzip压缩）、Parquet 与 JSONL，
+逐块写出，内存占用与结果总行数无关
+"""
+
+import gzip
+import os
+from typing import Dict, Optional
+
+import pandas as pd
+
+from data_readers import iter_chunks, apply_index_column
+
+# 导出格式 -> 文件扩展名
+OUTPUT_FORMATS: Dict[str, str] = {
+    'xlsx': '.xlsx',
+    'csv': '.csv',
+    'csv.gz': '.csv.gz',
+    'parquet': '.parquet',
+    'jsonl': '.jsonl',
+}
+DEFAULT_OUTPUT_FORMAT = 'xlsx'
+XLSX_MAX_ROWS = 1048576  # 含表头
+
+
+def output_suffix(fmt: str) -> str:
+    """返回导出格式对应的文件扩展名"""
+    if fmt not in OUTPUT_FORMATS:
+        raise ValueError(f"不支持的导出格式: {fmt}，可选: {', '.join(OUTPUT_FORMATS)}")
+    return OUTPUT_FORMATS[fmt]
+
+
+class ResultWriter:
+    """流式结果写入器基类：多次 write 逐块追加，close 结束写入"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.rows = 0
+
+    def write(self, df: pd.DataFrame):
+        if df.empty:
+            return
+        self._write(df)
+        self.rows += len(df)
+
+    def _write(self, df: pd.DataFrame):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class XlsxStreamWriter(ResultWriter):
+    """openpyxl只写模式：行写入后即序列化到临时文件，不在内存中保留单元格对象"""
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        from openpyxl import Workbook
+        self.workbook = Workbook(write_only=True)
+        self.sheet = self.workbook.create_sheet()
+        self.header_written = False
+
+    def _write(self, df: pd.DataFrame):
+        if self.rows + len(df) + 1 > XLSX_MAX_ROWS:
+            raise ValueError("结果超过xlsx行数上限，请选择 csv/csv.gz/parquet/jsonl 导出格式")
+        if not self.header_written:
+            self.sheet.append([str(c) for c in df.columns])
+            self.header_written = True
+        values = df.astype(object).where(df.notna(), None)
+        for row in values.itertuples(index=False, name=None):
+            self.sheet.append(list(row))
+
+    def close(self):
+        self.workbook.save(self.path)
+
+
+class CsvStreamWriter(ResultWriter):
+    """CSV写入器，compress=True 时使用gzip压缩；带BOM便于Excel直接打开中文"""
+
+    def __init__(self, path: str, compress: bool = False):
+        super().__init__(path)
+        if compress:
+            self.file = gzip.open(path, 'wt', encoding='utf-8-sig', newline='')
+        else:
+            self.file = open(path, 'w', encoding='utf-8-sig', newline='')
+
+    def _write(self, df: pd.DataFrame):
+        df.to_csv(self.file, header=(self.rows == 0), index=False)
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetStreamWriter(ResultWriter):
+    """
+    Parquet写入器：每次 write 写出一个行组
+
+    表结构随数据放宽：第一块中全空（null）的列、先整数后小数的列等在后续块出现更宽的类型时，
+    已写出的行组按新结构重写一遍（只在结构变化时发生，逐行组读写）；转换始终为安全转换，不截断数值。
+    """
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ValueError("导出Parquet需要安装 pyarrow")
+        self.pa = pa
+        self.pq = pq
+        self.writer = None
+        self.schema = None
+        self._file = path  # 当前写入的文件（表结构放宽重写后为另一个文件，关闭时改名为 path）
+
+    def _write(self, df: pd.DataFrame):
+        table = self.pa.Table.from_pandas(df, preserve_index=False)
+        if self.writer is None:
+            self.schema = table.schema
+            self.writer = self.pq.ParquetWriter(self._file, self.schema)
+        else:
+            schema = self._widen(self.schema, table.schema)
+            if not schema.equals(self.schema, check_metadata=False):
+                self._rewrite(schema)
+            table = table.cast(self.schema)
+        self.writer.write_table(table)
+
+    def _widen(self, current, incoming):
+        """合并两块的表结构：null 取另一方的类型，整数之间取 int64，含小数的数值取 float64，其余不一致的类型取字符串"""
+        pa = self.pa
+        fields = []
+        for field in current:
+            old, other = field.type, incoming.field(field.name).type
+            if old.equals(other) or pa.types.is_null(other):
+                new = old
+            elif pa.types.is_null(old):
+                new = other
+            elif self._is_number(old) and self._is_number(other):
+                new = pa.float64() if pa.types.is_floating(old) or pa.types.is_floating(other) else pa.int64()
+            else:
+                new = pa.large_string()
+            fields.append(pa.field(field.name, new))
+        return pa.schema(fields, metadata=current.metadata)
+
+    def _is_number(self, t) -> bool:
+        return self.pa.types.is_integer(t) or self.pa.types.is_floating(t) or self.pa.types.is_boolean(t)
+
+    def _rewrite(self, schema):
+        """按放宽后的表结构把已写出的行组逐个转换写到另一个文件，之后在新文件上继续追加"""
+        self.writer.close()
+        source_file = self._file
+        self._file = f"{self.path}.widen" if source_file == self.path else self.path
+        source = self.pq.ParquetFile(source_file)
+        self.writer = self.pq.ParquetWriter(self._file, schema)
+        try:
+            for i in range(source.num_row_groups):
+                self.writer.write_table(source.read_row_group(i).cast(schema))
+        finally:
+            source.close()
+        os.remove(source_file)
+        self.schema = schema
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            if self._file != self.path:
+                os.replace(self._file, self.path)
+        else:
+            open(self.path, 'wb').close()
+
+
+class JsonlStreamWriter(ResultWriter):
+    """JSON Lines写入器：每行一个JSON对象"""
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self.file = open(path, 'w', encoding='utf-8')
+
+    def _write(self, df: pd.DataFrame):
+        text = df.to_json(orient='records', lines=True, force_ascii=False, date_format='iso')
+        self.file.write(text if text.endswith('\n') else text + '\n')
+
+    def close(self):
+        self.file.close()
+
+
+_WRITERS = {
+    'xlsx': XlsxStreamWriter,
+    'csv': CsvStreamWriter,
+    'csv.gz': lambda path: CsvStreamWriter(path, compress=True),
+    'parquet': ParquetStreamWriter,
+    'jsonl': JsonlStreamWriter,
+}
+
+
+def open_writer(path: str, fmt: str) -> ResultWriter:
+    """按导出格式创建流式写入器"""
+    output_suffix(fmt)
+    return _WRITERS[fmt](path)
+
+
+class IncrementalExporter:
+    """
+    增量导出器
+
+    每次检查点把新完成的结果行与导入副本中对应位置的原始行合并后立即写出，
+    最终导出只需关闭写入器并把临时文件原子重命名为结果文件。
+    """
+
+    def __init__(self, input_file: str, output_file: str, fmt: str, chunk_size: int,
+                 index_column: Optional[str] = None):
+        self.output_file = output_file
+        self.index_column = index_column
+        self.tmp_file = f"{output_file}.part"
+        self.writer = open_writer(self.tmp_file, fmt)
+        self._source = iter_chunks(input_file, chunk_size)
+        self._pending: Optional[pd.DataFrame] = None
+
+    @property
+    def rows_written(self) -> int:
+        return self.writer.rows
+
+    def write(self, result_frame: pd.DataFrame):
+        """写出一段结果（按行位置紧接上一段）"""
+        if result_frame.empty:
+            return
+        source_df = apply_index_column(self._take_source_rows(len(result_frame)), self.index_column,
+                                       start=self.rows_written)
+        for col in result_frame.columns:
+            source_df[col] = result_frame[col].array
+        self.writer.write(source_df)
+
+    def _take_source_rows(self, count: int) -> pd.DataFrame:
+        parts = []
+        needed = count
+        while needed > 0:
+            if self._pending is None or self._pending.empty:
+                self._pending = next(self._source, None)
+                if self._pending is None:
+                    raise ValueError("结果行数超过导入数据行数")
+            part = self._pending.iloc[:needed]
+            self._pending = self._pending.iloc[needed:]
+            parts.append(part)
+            needed -= len(part)
+        return pd.concat(parts, ignore_index=True) if len(parts) > 1 else parts[0].reset_index(drop=True)
+
+    def commit(self) -> str:
+        """完成写入并原子替换为结果文件"""
+        self.writer.close()
+        os.replace(self.tmp_file, self.output_file)
+        return self.output_file
+
+    def abort(self):
+        """放弃本次导出并清理临时文件"""
+        try:
+            self.writer.close()
+        except Exception:
+            pass
+        if os.path.exists(self.tmp_file):
+            os.remove(self.tmp_file)
@@ -4,6 +4,7 @@
 Excel半结构化数据解析工具启动脚本
 """
 
+import argparse
 import os
 import sys
 from pathlib import Path
@@ -13,10 +14,48 @@ project_root = Path(__file__).parent
 sys.path.insert(0, str(project_root))
 
 from config import get_config, Config
-from web_interface import app
+
+def run_worker(worker_id=None, threads=None):
+    """以工作进程模式运行：领取分布式任务的行区间并处理，不启动Web服务"""
+    from excel_structured_parser import ExcelStructuredParser
+    from lease_worker import LeaseWorker
+    
+    Config.init_directories()
+    worker = LeaseWorker(ExcelStructuredParser(), worker_id)
+    threads = threads or Config.WORKER_THREADS
+    print(f"工作进程: {worker.worker_id}, 线程数: {threads}, 数据目录: {Config.DATA_DIR}")
+    worker.run(threads)
+
+def run_executor():
+    """以独立执行进程模式运行：领取Web进程登记的排队任务并运行，不启动Web服务"""
+    from excel_structured_parser import ExcelStructuredParser
+    from task_executor import TaskExecutor
+    
+    Config.init_directories()
+    executor = TaskExecutor(ExcelStructuredParser())
+    # Web层的多个工作进程不运行后台回收与任务恢复，由执行进程负责
+    executor.parser.start_maintenance(executor.parser.create_disk_janitor())
+    print(f"任务执行进程: {executor.parser.owner_id}, 同时运行任务数: {Config.MAX_RUNNING_TASKS}, 数据目录: {Config.DATA_DIR}")
+    executor.run()
 
 def main():
     """主函数"""
+    arg_parser = argparse.ArgumentParser(description="Excel半结构化数据解析工具")
+    arg_parser.add_argument("--worker", action="store_true", help="以工作进程模式运行（领取分布式任务的行区间）")
+    arg_parser.add_argument("--worker-id", default=None, help="工作进程标识，默认为 主机名-进程号")
+    arg_parser.add_argument("--threads", type=int, default=None, help="工作进程同时处理的区间数")
+    arg_parser.add_argument("--executor", action="store_true",
+                            help="以独立执行进程模式运行（领取 TASK_EXECUTOR=external 时Web进程登记的任务）")
+    args = arg_parser.parse_args()
+    if args.worker:
+        run_worker(args.worker_id, args.threads)
+        return
+    if args.executor:
+        run_executor()
+        return
+    
+    from web_interface import app
+    
     print("=" * 60)
     print("Excel半结构化数据解析工具")
     print("=" * 60)
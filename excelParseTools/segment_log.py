@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+检查点段日志
+每次检查点只追加新完成的行（一个段文件），写入采用临时文件+原子重命名，
+段内容带SHA-256校验；恢复时按行号顺序重放有效段，并按层级定期合并小段
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import shutil
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+import pandas as pd
+
+SEGMENT_SUFFIX = ".seg"
+
+
+@dataclass
+class Segment:
+    """段文件描述：覆盖结果的行区间 [start, end)"""
+    path: Path
+    start: int
+    end: int
+    seq: int
+    level: int
+
+    @property
+    def rows(self) -> int:
+        return self.end - self.start
+
+
+class SegmentLog:
+    """追加式检查点段日志"""
+
+    def __init__(self, directory: str, fanout: int = 8, max_segment_rows: int = 100000):
+        """
+        Args:
+            directory: 段文件目录（每个任务一个，写入第一个段时创建，只读扫描不创建目录）
+            fanout: 同一层级的段累计到该数量时合并为上一层级的一个段
+            max_segment_rows: 合并后单个段的最大行数，保证重放时单段内存可控
+        """
+        self.directory = Path(directory)
+        self.fanout = max(2, int(fanout))
+        self.max_segment_rows = max(1, int(max_segment_rows))
+        self.segments: List[Segment] = []
+        self.sequence = 0
+
+    @property
+    def end(self) -> int:
+        """已持久化的连续行数"""
+        return self.segments[-1].end if self.segments else 0
+
+    def recover(self, repair: bool = True) -> int:
+        """
+        扫描并校验段文件，恢复连续的段序列
+
+        repair=True 时清理未完成的临时文件、校验失败的段、被合并段覆盖的残留段，
+        以及第一个缺口之后的所有段；repair=False 只读扫描（供并发读取者使用）。
+        返回已持久化的连续行数。
+        """
+        def discard(path: Path):
+            if repair:
+                path.unlink()
+
+        for tmp in self.directory.glob("*.tmp"):
+            discard(tmp)
+
+        candidates = []
+        for path in self.directory.glob(f"*{SEGMENT_SUFFIX}"):
+            header = self._read_header(path, verify=True)
+            if header is None:
+                discard(path)
+                continue
+            candidates.append(Segment(path, header["start"], header["end"], header["seq"], header["level"]))
+
+        # 起始行升序、结束行降序：合并段排在被它覆盖的残留段之前
+        candidates.sort(key=lambda s: (s.start, -s.end))
+        self.segments = []
+        cursor = 0
+        for segment in candidates:
+            if segment.start == cursor and segment.end > cursor:
+                self.segments.append(segment)
+                cursor = segment.end
+            else:
+                discard(segment.path)
+        self.sequence = max((s.seq for s in self.segments), default=0)
+        return cursor
+
+    def append(self, start: int, frame: pd.DataFrame) -> int:
+        """追加一段结果（必须紧接已持久化的行），返回新的检查点序号"""
+        if start != self.end:
+            raise ValueError(f"段不连续: 期望起始行 {self.end}, 实际 {start}")
+        if frame.empty:
+            return self.sequence
+        self.sequence += 1
+        segment = self._write(start, frame, self.sequence, level=0)
+        self.segments.append(segment)
+        self._maybe_compact()
+        return self.sequence
+
+    def iter_frames(self, limit: Optional[int] = None) -> Iterator[pd.DataFrame]:
+        """按行号顺序重放各段，可只读取前 limit 行"""
+        for segment in list(self.segments):
+            if limit is not None and segment.start >= limit:
+                return
+            frame = self._read_frame(segment.path)
+            if limit is not None and segment.end > limit:
+                frame = frame.iloc[:limit - segment.start]
+            yield frame
+
+    def iter_chunks(self, chunk_size: int, limit: Optional[int] = None) -> Iterator[pd.DataFrame]:
+        """按固定行数重新切分重放结果，便于与输入分块逐块对齐"""
+        buffer: List[pd.DataFrame] = []
+        buffered = 0
+        for frame in self.iter_frames(limit):
+            buffer.append(frame)
+            buffered += len(frame)
+            while buffered >= chunk_size:
+                merged = pd.concat(buffer)
+                yield merged.iloc[:chunk_size]
+                rest = merged.iloc[chunk_size:]
+                buffer = [rest] if len(rest) else []
+                buffered = len(rest)
+        if buffered:
+            yield pd.concat(buffer)
+
+    def destroy(self):
+        """删除段目录"""
+        shutil.rmtree(self.directory, ignore_errors=True)
+        self.segments = []
+
+    def _maybe_compact(self):
+        """同层级的尾部段达到 fanout 个时合并为上一层级的一个段"""
+        while len(self.segments) >= self.fanout:
+            group = self.segments[-self.fanout:]
+            level = group[-1].level
+            if any(s.level != level for s in group):
+                return
+            if sum(s.rows for s in group) > self.max_segment_rows:
+                return
+            merged = pd.concat([self._read_frame(s.path) for s in group])
+            segment = self._write(group[0].start, merged, group[-1].seq, level=level + 1)
+            for old in group:
+                old.path.unlink()
+            self.segments[-self.fanout:] = [segment]
+
+    def _write(self, start: int, frame: pd.DataFrame, seq: int, level: int) -> Segment:
+        """写入段文件：头部JSON一行 + pickle负载，临时文件fsync后原子重命名"""
+        end = start + len(frame)
+        payload = pickle.dumps(frame, protocol=pickle.HIGHEST_PROTOCOL)
+        header = {
+            "start": start,
+            "end": end,
+            "seq": seq,
+            "level": level,
+            "size": len(payload),
+            "sha256": hashlib.sha256(payload).hexdigest(),
+        }
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f"{start:012d}_{end:012d}{SEGMENT_SUFFIX}"
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(json.dumps(header).encode("utf-8") + b"\n")
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        return Segment(path, start, end, seq, level)
+
+    def _read_header(self, path: Path, verify: bool = False) -> Optional[dict]:
+        """读取段头部，verify=True 时校验负载长度与SHA-256，失败返回None"""
+        try:
+            with open(path, "rb") as f:
+                header = json.loads(f.readline().decode("utf-8"))
+                if verify:
+                    payload = f.read()
+                    if len(payload) != header["size"] or hashlib.sha256(payload).hexdigest() != header["sha256"]:
+                        return None
+            return header
+        except Exception:
+            return None
+
+    def _read_frame(self, path: Path) -> pd.DataFrame:
+        with open(path, "rb") as f:
+            f.readline()
+            return pickle.loads(f.read())
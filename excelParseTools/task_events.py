@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+任务事件流
+批次处理在发生时发布任务事件（进度、批次完成、错误、状态变化），事件按自增ID写入共享的SQLite表；
+任务页面通过 SSE（或长轮询）按事件ID增量读取，取代定时轮询任务列表与逐个任务的状态接口。
+同一进程内发布的事件立即唤醒等待中的连接，其他进程（执行进程、工作进程）发布的事件按轮询间隔读取
+"""
+
+import json
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from task_registry import SQLiteStore
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS task_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    task_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_task_events_task ON task_events (task_id, id);
+"""
+
+# 事件类型
+PROGRESS = 'progress'  # 实时进度 {processed_records, total_records, progress}
+BATCH = 'batch'  # 批次完成 {batch, start, end, success, total, errors, elapsed}
+ERROR = 'batch_error'  # 批次中有规则出错 {batch, message}（不用 error，避免与浏览器 EventSource 的连接错误事件同名）
+STATUS = 'status'  # 状态变化 {status, processed_records, total_records, progress, error_message}
+DELETED = 'deleted'  # 任务被删除
+
+
+class TaskEventLog(SQLiteStore):
+    """任务事件表"""
+
+    PRUNE_EVERY = 500  # 每发布多少个事件清理一次超出上限的旧事件
+
+    def __init__(self, db_path: str, max_events: int = 20000):
+        """
+        Args:
+            db_path: SQLite 数据库路径（与任务注册表共用）
+            max_events: 保留的事件数，断线重连时更早的事件不再补发（页面重新加载任务列表）
+        """
+        super().__init__(db_path, _SCHEMA)
+        self.max_events = max(int(max_events), 100)
+        self._published = 0
+        self._cond = threading.Condition()
+
+    def publish(self, task_id: str, kind: str, data: Optional[Dict[str, Any]] = None) -> int:
+        """发布一个事件，返回事件ID"""
+        cur = self._conn().execute(
+            'INSERT INTO task_events (task_id, kind, created_at, data) VALUES (?, ?, ?, ?)',
+            (task_id, kind, time.time(), json.dumps(data or {}, ensure_ascii=False, default=str)),
+        )
+        self._published += 1
+        if self._published % self.PRUNE_EVERY == 0:
+            self._conn().execute('DELETE FROM task_events WHERE id <= ?', (cur.lastrowid - self.max_events,))
+        with self._cond:
+            self._cond.notify_all()
+        return cur.lastrowid
+
+    def last_id(self) -> int:
+        row = self._conn().execute('SELECT MAX(id) AS id FROM task_events').fetchone()
+        return int(row['id'] or 0)
+
+    def since(self, after_id: int, task_id: Optional[str] = None, limit: int = 500) -> List[Dict[str, Any]]:
+        """ID大于 after_id 的事件（按ID升序），可只取某个任务的事件"""
+        sql = 'SELECT id, task_id, kind, created_at, data FROM task_events WHERE id > ?'
+        params: list = [int(after_id)]
+        if task_id:
+            sql += ' AND task_id = ?'
+            params.append(task_id)
+        sql += ' ORDER BY id LIMIT ?'
+        params.append(int(limit))
+        return [{'id': row['id'], 'task_id': row['task_id'], 'kind': row['kind'], 'time': row['created_at'],
+                 'data': json.loads(row['data'])} for row in self._conn().execute(sql, params)]
+
+    def wait(self, after_id: int, timeout: float, poll_interval: float = 0.5,
+             task_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """等待 after_id 之后的事件，超时返回空列表"""
+        deadline = time.time() + timeout
+        while True:
+            events = self.since(after_id, task_id)
+            remaining = deadline - time.time()
+            if events or remaining <= 0:
+                return events
+            with self._cond:
+                self._cond.wait(min(poll_interval, remaining))
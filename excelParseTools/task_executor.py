@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+独立任务执行进程
+Web层以多个WSGI工作进程运行（TASK_EXECUTOR=external）时，Web进程只把任务登记到注册表；
+执行进程按调度器的空闲容量从注册表领取排队任务，在本进程的全局调度器中运行
+"""
+
+import threading
+
+from config import Config
+
+
+class TaskExecutor:
+    """从任务注册表领取排队任务并在本进程运行"""
+
+    def __init__(self, parser):
+        """
+        Args:
+            parser: ExcelStructuredParser，任务在它的调度器中运行
+        """
+        self.parser = parser
+        self.registry = parser.registry
+        self.scheduler = parser.scheduler
+        self.log_manager = parser.log_manager
+        self.stop_event = threading.Event()
+
+    def run(self, poll_interval: float = None):
+        """循环领取排队任务直到 stop_event 被设置"""
+        poll_interval = poll_interval or Config.EXECUTOR_POLL_INTERVAL
+        self.log_manager.info(f"任务执行进程已启动: {self.parser.owner_id}, 同时运行任务数: {self.scheduler.max_running}")
+        try:
+            while not self.stop_event.is_set():
+                try:
+                    self.poll()
+                except Exception as e:
+                    self.log_manager.error(f"领取排队任务失败: {e}")
+                self.stop_event.wait(poll_interval)
+        except KeyboardInterrupt:
+            self.stop_event.set()
+
+    def poll(self) -> int:
+        """按调度器空闲容量领取排队任务，返回领取的任务数"""
+        stats = self.scheduler.stats()
+        free = self.scheduler.max_running - len(stats['running']) - len(stats['queued'])
+        if free <= 0:
+            return 0
+        metas = self.registry.claim_pending(self.parser.owner_id, free)
+        for meta in metas:
+            task = self.parser._task_from_meta(meta['task_id'], meta)
+            self.parser.run_locally(task)
+            self.log_manager.info(f"已领取任务: {task.task_id}, 优先级: {task.priority}")
+        return len(metas)
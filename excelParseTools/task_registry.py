@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+任务注册表
+任务元数据与进度保存在SQLite（WAL模式）表中，按状态与开始时间建索引，
+任务列表是一次分页查询，不再逐个读取进度JSON文件；
+导入元数据也保存在同一数据库，多个Web工作进程共享任务与导入状态
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    task_id TEXT PRIMARY KEY,
+    name TEXT NOT NULL DEFAULT '',
+    status TEXT NOT NULL,
+    total_records INTEGER NOT NULL DEFAULT 0,
+    processed_records INTEGER NOT NULL DEFAULT 0,
+    start_time TEXT,
+    end_time TEXT,
+    error_message TEXT,
+    updated_at TEXT,
+    meta TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_start_time ON tasks (start_time);
+CREATE INDEX IF NOT EXISTS idx_tasks_status_start_time ON tasks (status, start_time);
+CREATE TABLE IF NOT EXISTS imports (
+    import_id TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    meta TEXT NOT NULL
+);
+"""
+
+# 后加的列：旧数据库在打开时补齐
+#   live_records 执行进程按间隔同步的实时进度（processed_records 是已落盘的检查点位置）
+#   owner/owner_seen 正在排队或执行该任务的进程及其最近心跳时间
+#   control 其他进程对执行中任务提出的中断请求（pause/cancel/preempt），执行进程在批次间读取
+_ADDED_COLUMNS = {
+    'priority': 'INTEGER NOT NULL DEFAULT 0',
+    'live_records': 'INTEGER NOT NULL DEFAULT 0',
+    'owner': 'TEXT',
+    'owner_seen': 'REAL',
+    'control': 'TEXT',
+}
+
+# 列表查询返回的列（完整元数据只在按任务ID读取时解析）
+LIST_COLUMNS = ('task_id', 'name', 'status', 'total_records', 'processed_records', 'start_time', 'end_time',
+                'error_message')
+
+
+class SQLiteStore:
+    """共享SQLite数据库的基类，每个线程使用独立连接"""
+
+    def __init__(self, db_path: str, schema: str):
+        self.db_path = str(db_path)
+        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.executescript(schema)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            # WAL 模式下 NORMAL 同步在进程崩溃时不丢已提交的事务
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+
+class TaskRegistry(SQLiteStore):
+    """SQLite任务注册表"""
+
+    def __init__(self, db_path: str):
+        super().__init__(db_path, _SCHEMA)
+        conn = self._conn()
+        existing = {row['name'] for row in conn.execute('PRAGMA table_info(tasks)')}
+        for column, decl in _ADDED_COLUMNS.items():
+            if column not in existing:
+                conn.execute(f'ALTER TABLE tasks ADD COLUMN {column} {decl}')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_tasks_claim ON tasks (status, owner, priority)')
+
+    def save(self, meta: Dict[str, Any]):
+        """
+        写入或更新一个任务（meta 为完整的进度元数据）；任务回到排队状态时实时进度重置为检查点位置，
+        任务离开执行状态时清除未处理的中断请求
+        """
+        self._conn().execute(
+            """
+            INSERT INTO tasks (task_id, name, status, total_records, processed_records, start_time, end_time,
+                               error_message, updated_at, meta, priority, live_records)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(task_id) DO UPDATE SET
+                name = excluded.name, status = excluded.status, total_records = excluded.total_records,
+                processed_records = excluded.processed_records, start_time = excluded.start_time,
+                end_time = excluded.end_time, error_message = excluded.error_message,
+                updated_at = excluded.updated_at, meta = excluded.meta, priority = excluded.priority,
+                live_records = CASE WHEN excluded.status = 'pending' THEN excluded.processed_records
+                                    ELSE MAX(live_records, excluded.processed_records) END,
+                control = CASE WHEN excluded.status = 'processing' THEN control ELSE NULL END
+            """,
+            self._row(meta),
+        )
+
+    def save_many(self, metas: Iterable[Dict[str, Any]]):
+        """批量写入（迁移旧进度文件时使用），已存在的任务不覆盖"""
+        conn = self._conn()
+        conn.execute('BEGIN')
+        try:
+            conn.executemany(
+                """
+                INSERT OR IGNORE INTO tasks (task_id, name, status, total_records, processed_records, start_time,
+                                             end_time, error_message, updated_at, meta, priority, live_records)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                [self._row(meta) for meta in metas],
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """
+        读取任务的完整元数据（附带实时进度 live_records、执行进程 owner/owner_seen 与中断请求 control），不存在返回None
+
+        状态以 status 列为准（排队中的任务可能由其他进程直接置为暂停或取消）。
+        """
+        row = self._conn().execute(
+            'SELECT meta, status, live_records, owner, owner_seen, control FROM tasks WHERE task_id = ?',
+            (task_id,)).fetchone()
+        if row is None:
+            return None
+        meta = json.loads(row['meta'])
+        meta.update(status=row['status'], live_records=row['live_records'], owner=row['owner'],
+                    owner_seen=row['owner_seen'], control=row['control'])
+        return meta
+
+    def delete(self, task_id: str):
+        self._conn().execute('DELETE FROM tasks WHERE task_id = ?', (task_id,))
+
+    def update_live(self, task_id: str, processed_records: int):
+        """同步执行中任务的实时进度（不改动检查点位置与元数据）"""
+        self._conn().execute('UPDATE tasks SET live_records = ? WHERE task_id = ?', (int(processed_records), task_id))
+
+    def list(self, offset: int = 0, limit: Optional[int] = None, status: Optional[str] = None) -> List[Dict[str, Any]]:
+        """按开始时间倒序分页列出任务摘要（执行中的任务 processed_records 为实时进度）"""
+        sql = f"SELECT {', '.join(LIST_COLUMNS)}, live_records FROM tasks"
+        params: List[Any] = []
+        if status:
+            sql += ' WHERE status = ?'
+            params.append(status)
+        sql += ' ORDER BY start_time DESC, task_id LIMIT ? OFFSET ?'
+        params += [-1 if limit is None else int(limit), max(int(offset), 0)]
+        rows = []
+        for row in self._conn().execute(sql, params):
+            row = dict(row)
+            live = row.pop('live_records')
+            if row['status'] == 'processing':
+                row['processed_records'] = max(row['processed_records'], live)
+            rows.append(row)
+        return rows
+
+    def counts(self) -> Dict[str, int]:
+        """各状态的任务数"""
+        rows = self._conn().execute('SELECT status, COUNT(*) AS n FROM tasks GROUP BY status')
+        return {row['status']: row['n'] for row in rows}
+
+    def task_ids(self) -> set:
+        return {row['task_id'] for row in self._conn().execute('SELECT task_id FROM tasks')}
+
+    def metas(self, statuses: Iterable[str]) -> List[Dict[str, Any]]:
+        """指定状态的所有任务的完整元数据（磁盘回收判断文件引用时使用）"""
+        statuses = list(statuses)
+        rows = self._conn().execute(
+            f"SELECT meta FROM tasks WHERE status IN ({', '.join('?' * len(statuses))})", statuses)
+        return [json.loads(row['meta']) for row in rows]
+
+    def set_owner(self, task_id: str, owner: Optional[str]):
+        """登记任务的执行进程；None 表示交给独立执行进程领取"""
+        self._conn().execute('UPDATE tasks SET owner = ?, owner_seen = ? WHERE task_id = ?',
+                             (owner, time.time() if owner else None, task_id))
+
+    def claim_pending(self, owner: str, limit: int) -> List[Dict[str, Any]]:
+        """
+        独立执行进程领取未分配的排队任务（优先级高、提交早的优先），返回任务元数据
+
+        IMMEDIATE 事务在读之前就取得写锁，多个执行进程不会领到同一任务。
+        """
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            rows = conn.execute(
+                """
+                SELECT task_id, meta FROM tasks WHERE status = 'pending' AND owner IS NULL
+                ORDER BY priority DESC, start_time LIMIT ?
+                """,
+                (max(int(limit), 0),),
+            ).fetchall()
+            now = time.time()
+            conn.executemany('UPDATE tasks SET owner = ?, owner_seen = ? WHERE task_id = ?',
+                             [(owner, now, row['task_id']) for row in rows])
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return [json.loads(row['meta']) for row in rows]
+
+    def claim_orphaned(self, owner: str, timeout: float, include_unassigned: bool = False) -> List[Dict[str, Any]]:
+        """
+        接管执行进程已退出的未完成任务（优先级高、提交早的优先），返回任务元数据（附带 control）
+
+        排队或执行中、持有进程超过 timeout 秒没有心跳（或持有进程标识与 owner 相同，即本进程重启前的
+        同名进程）的任务登记到 owner 名下；执行中但没有持有进程的任务（旧版进度文件）一并接管，
+        include_unassigned 为真时还接管等待独立执行进程领取的排队任务。
+        """
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            now = time.time()
+            rows = conn.execute(
+                """
+                SELECT task_id, meta, control FROM tasks WHERE status IN ('pending', 'processing') AND (
+                    (owner IS NOT NULL AND (owner = ? OR owner_seen IS NULL OR owner_seen < ?))
+                    OR (owner IS NULL AND (status = 'processing' OR ?)))
+                ORDER BY priority DESC, start_time
+                """,
+                (owner, now - timeout, int(bool(include_unassigned))),
+            ).fetchall()
+            conn.executemany('UPDATE tasks SET owner = ?, owner_seen = ? WHERE task_id = ?',
+                             [(owner, now, row['task_id']) for row in rows])
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return [dict(json.loads(row['meta']), control=row['control']) for row in rows]
+
+    def set_control(self, task_id: str, action: Optional[str]):
+        """登记对执行中任务的中断请求（None 清除），执行该任务的进程在批次间读取"""
+        self._conn().execute('UPDATE tasks SET control = ? WHERE task_id = ?', (action, task_id))
+
+    def get_control(self, task_id: str) -> Optional[str]:
+        row = self._conn().execute('SELECT control FROM tasks WHERE task_id = ?', (task_id,)).fetchone()
+        return row['control'] if row else None
+
+    def stop_pending(self, task_id: str, status: str) -> bool:
+        """把尚未被执行进程领取的排队任务直接置为 status（暂停/取消），返回是否更新"""
+        cur = self._conn().execute(
+            "UPDATE tasks SET status = ?, control = NULL WHERE task_id = ? AND status = 'pending' AND owner IS NULL",
+            (status, task_id))
+        return cur.rowcount == 1
+
+    def running_tasks(self) -> List[Dict[str, Any]]:
+        """执行中且没有未处理中断请求的任务（优先级低的在前），抢占时从中选择让出运行位置的任务"""
+        rows = self._conn().execute(
+            """
+            SELECT task_id, priority, owner FROM tasks WHERE status = 'processing' AND control IS NULL
+            ORDER BY priority, start_time DESC
+            """)
+        return [dict(row) for row in rows]
+
+    def touch_owner(self, owner: str):
+        """刷新执行进程所持有任务的心跳时间"""
+        self._conn().execute('UPDATE tasks SET owner_seen = ? WHERE owner = ?', (time.time(), owner))
+
+    @staticmethod
+    def _row(meta: Dict[str, Any]) -> tuple:
+        return (
+            meta['task_id'],
+            meta.get('name') or '',
+            meta.get('status') or 'pending',
+            int(meta.get('total_records') or 0),
+            int(meta.get('processed_records') or 0),
+            # 旧进度文件没有开始时间，用最后保存时间代替
+            meta.get('start_time') or meta.get('timestamp'),
+            meta.get('end_time'),
+            meta.get('error_message'),
+            meta.get('timestamp'),
+            json.dumps(meta, ensure_ascii=False),
+            int(meta.get('priority') or 0),
+            int(meta.get('processed_records') or 0),
+        )
+
+
+class ImportRegistry(SQLiteStore):
+    """
+    导入元数据表，接口与字典一致（get / [] / in / pop / items / values）
+
+    元数据在各Web工作进程间共享；读出的是副本，修改后需重新赋值写回。
+    """
+
+    def __init__(self, db_path: str):
+        super().__init__(db_path, _SCHEMA)
+
+    def get(self, import_id: str, default: Any = None) -> Any:
+        row = self._conn().execute('SELECT meta FROM imports WHERE import_id = ?', (import_id,)).fetchone()
+        return json.loads(row['meta']) if row else default
+
+    def __getitem__(self, import_id: str) -> Dict[str, Any]:
+        meta = self.get(import_id)
+        if meta is None:
+            raise KeyError(import_id)
+        return meta
+
+    def __setitem__(self, import_id: str, meta: Dict[str, Any]):
+        self._conn().execute(
+            """
+            INSERT INTO imports (import_id, created_at, meta) VALUES (?, ?, ?)
+            ON CONFLICT(import_id) DO UPDATE SET meta = excluded.meta
+            """,
+            (import_id, time.time(), json.dumps(meta, ensure_ascii=False, default=str)),
+        )
+
+    def __contains__(self, import_id: object) -> bool:
+        return self._conn().execute('SELECT 1 FROM imports WHERE import_id = ?', (import_id,)).fetchone() is not None
+
+    def pop(self, import_id: str, default: Any = None) -> Any:
+        meta = self.get(import_id, default)
+        self._conn().execute('DELETE FROM imports WHERE import_id = ?', (import_id,))
+        return meta
+
+    def items(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        for row in self._conn().execute('SELECT import_id, meta FROM imports ORDER BY created_at').fetchall():
+            yield row['import_id'], json.loads(row['meta'])
+
+    def values(self) -> Iterator[Dict[str, Any]]:
+        for _, meta in self.items():
+            yield meta
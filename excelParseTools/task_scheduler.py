@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+全局任务调度
+任务先进入按优先级排序的等待队列，同时运行的任务数有上限；运行中的任务每次调用大模型前
+申请所属提供方的请求槽位，槽位总数按提供方限制，在等待槽位的任务之间按权重公平分配；
+被中断（暂停/取消/抢占）的任务不再获得槽位，等待中的申请立即抛出 TaskInterrupted
+"""
+
+import heapq
+import itertools
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+
+# 运行中任务的中断操作：暂停、取消、让出运行位置（被更高优先级的任务抢占）
+CONTROL_ACTIONS = {'pause': '暂停', 'cancel': '取消', 'preempt': '让出运行位置'}
+
+
+class TaskInterrupted(Exception):
+    """任务被要求暂停、取消或让出运行位置（action 为 CONTROL_ACTIONS 中的操作）"""
+
+    def __init__(self, action: str):
+        super().__init__(f"任务已被要求{CONTROL_ACTIONS.get(action, action)}")
+        self.action = action
+
+
+class TaskScheduler:
+    """任务准入队列（优先级）+ 按提供方限流的请求槽位（加权公平分配）"""
+
+    def __init__(self, run_task: Callable[[str], None], max_running: int,
+                 provider_limits: Dict[str, int], default_limit: int,
+                 admit: Optional[Callable[[str], bool]] = None):
+        """
+        Args:
+            run_task: 执行任务的函数（参数为任务ID），在调度器启动的后台线程中调用；
+                返回可调用对象时，在任务离开调度器（释放运行位置）后调用它（用于重新排队被抢占的任务）
+            max_running: 同时运行的任务数上限
+            provider_limits: 各提供方同时进行的请求数上限 {提供方: 上限}
+            default_limit: 未单独配置的提供方的请求数上限
+            admit: 任务开始运行前的准入检查（如预留内存），返回False时队首任务继续等待，资源释放后调用 wake 重试
+        """
+        self._run_task = run_task
+        self._admit = admit
+        self._blocked: Optional[str] = None  # 未通过准入检查、等待资源的队首任务
+        self.max_running = max(int(max_running), 1)
+        self.provider_limits = dict(provider_limits)
+        self.default_limit = max(int(default_limit), 1)
+        self._cond = threading.Condition()
+        self._queue: List[tuple] = []  # 堆: (-优先级, 提交序号, 任务ID)
+        self._seq = itertools.count()
+        self._running: Dict[str, threading.Thread] = {}
+        self._tasks: Dict[str, Dict[str, Any]] = {}  # 任务ID -> 调度状态
+        self._in_flight: Dict[str, int] = {}  # 提供方 -> 进行中的请求数
+
+    def submit(self, task_id: str, priority: int = 0, weight: float = 1.0, max_in_flight: int = 1,
+               provider: str = 'default'):
+        """
+        提交任务到等待队列
+
+        Args:
+            priority: 优先级，越大越先运行
+            weight: 请求槽位的分配权重，多个任务争用时按权重比例获得槽位
+            max_in_flight: 该任务同时进行的请求数上限（任务的线程数）
+            provider: 任务调用的大模型提供方
+        """
+        with self._cond:
+            if task_id in self._tasks:
+                return
+            self._tasks[task_id] = {
+                'priority': int(priority),
+                'weight': max(float(weight), 0.01),
+                'max_in_flight': max(int(max_in_flight), 1),
+                'provider': provider,
+                'in_flight': 0,
+                'waiting': 0,
+                'requests': 0,
+                'pass': 0.0,
+                'interrupted': None,
+            }
+            heapq.heappush(self._queue, (-int(priority), next(self._seq), task_id))
+            self._dispatch()
+
+    def cancel(self, task_id: str) -> bool:
+        """从等待队列移除尚未运行的任务，返回是否移除"""
+        with self._cond:
+            if task_id in self._running or task_id not in self._tasks:
+                return False
+            self._queue = [item for item in self._queue if item[2] != task_id]
+            heapq.heapify(self._queue)
+            self._tasks.pop(task_id, None)
+            # 移除的可能是等待资源的队首任务
+            self._dispatch()
+            return True
+
+    def queue_position(self, task_id: str) -> Optional[int]:
+        """任务在等待队列中的位置（从1开始），不在队列中返回None"""
+        with self._cond:
+            for position, item in enumerate(sorted(self._queue), 1):
+                if item[2] == task_id:
+                    return position
+            return None
+
+    def interrupt(self, task_id: str, action: str):
+        """标记运行中的任务被中断：之后的槽位申请（包括正在等待的）抛出 TaskInterrupted"""
+        with self._cond:
+            state = self._tasks.get(task_id)
+            if state is not None:
+                state['interrupted'] = action
+                self._cond.notify_all()
+
+    def wake(self):
+        """资源释放后重新尝试启动等待中的任务"""
+        with self._cond:
+            self._dispatch()
+
+    def is_blocked(self, task_id: str) -> bool:
+        """任务是否为因准入检查未通过（资源不足）而等待的队首任务"""
+        with self._cond:
+            return self._blocked == task_id
+
+    def is_scheduled(self, task_id: str) -> bool:
+        """任务是否在等待队列中或正在运行"""
+        with self._cond:
+            return task_id in self._tasks
+
+    @contextmanager
+    def request_slot(self, task_id: str) -> Iterator[None]:
+        """
+        申请一次请求槽位（在 with 块内调用大模型）
+
+        提供方槽位已满或任务已达到自身并发上限时等待；多个任务等待同一提供方时，
+        按“已获得的槽位数/权重”最小者优先（步幅调度），实现按权重的公平分配。
+        """
+        with self._cond:
+            state = self._tasks.get(task_id)
+            if state is None:
+                # 未经调度器运行的任务（如直接调用处理函数）不受限制
+                managed = False
+            else:
+                managed = True
+                provider = state['provider']
+                state['waiting'] += 1
+                while not state['interrupted'] and not self._can_grant(state):
+                    self._cond.wait()
+                state['waiting'] -= 1
+                if state['interrupted']:
+                    # 不占用槽位，其他等待者可能因此满足条件
+                    self._cond.notify_all()
+                    raise TaskInterrupted(state['interrupted'])
+                state['in_flight'] += 1
+                state['requests'] += 1
+                state['pass'] += 1.0 / state['weight']
+                self._in_flight[provider] = self._in_flight.get(provider, 0) + 1
+                # 分配进度变化后，其他等待者可能满足条件
+                self._cond.notify_all()
+        try:
+            yield
+        finally:
+            if managed:
+                with self._cond:
+                    state['in_flight'] -= 1
+                    self._in_flight[provider] -= 1
+                    self._cond.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        """调度状态：运行中与排队的任务、各提供方的槽位占用、各任务的请求分配"""
+        with self._cond:
+            providers = {}
+            for state in self._tasks.values():
+                providers.setdefault(state['provider'], None)
+            providers.update({p: None for p in self._in_flight})
+            return {
+                'max_running': self.max_running,
+                'running': list(self._running),
+                'queued': [item[2] for item in sorted(self._queue)],
+                'blocked': self._blocked,
+                'providers': {
+                    provider: {'limit': self._limit(provider), 'in_flight': self._in_flight.get(provider, 0)}
+                    for provider in providers
+                },
+                'tasks': {
+                    task_id: {key: state[key] for key in
+                              ('priority', 'weight', 'provider', 'in_flight', 'waiting', 'requests')}
+                    for task_id, state in self._tasks.items() if task_id in self._running
+                },
+            }
+
+    def _limit(self, provider: str) -> int:
+        return max(int(self.provider_limits.get(provider, self.default_limit)), 1)
+
+    def _can_grant(self, state: Dict[str, Any]) -> bool:
+        provider = state['provider']
+        if self._in_flight.get(provider, 0) >= self._limit(provider):
+            return False
+        if state['in_flight'] >= state['max_in_flight']:
+            return False
+        contenders = [s['pass'] for s in self._tasks.values()
+                      if s['provider'] == provider and s['waiting'] and s['in_flight'] < s['max_in_flight']]
+        return state['pass'] <= min(contenders)
+
+    def _dispatch(self):
+        """（持有锁）按优先级启动等待中的任务直到达到运行上限"""
+        self._blocked = None
+        while self._queue and len(self._running) < self.max_running:
+            task_id = self._queue[0][2]
+            # 队首任务准入失败时整体等待，不越过它启动低优先级任务，避免大任务一直等不到资源
+            if self._admit is not None and not self._admit(task_id):
+                self._blocked = task_id
+                break
+            heapq.heappop(self._queue)
+            state = self._tasks[task_id]
+            # 新运行的任务从当前最小的已分配进度开始，既不透支也不积压槽位
+            active = [self._tasks[t]['pass'] for t in self._running if self._tasks[t]['provider'] == state['provider']]
+            state['pass'] = min(active) if active else 0.0
+            thread = threading.Thread(target=self._run, args=(task_id,), name=f"task-{task_id[:8]}", daemon=True)
+            self._running[task_id] = thread
+            thread.start()
+
+    def _run(self, task_id: str):
+        after = None
+        try:
+            after = self._run_task(task_id)
+        finally:
+            with self._cond:
+                self._running.pop(task_id, None)
+                self._tasks.pop(task_id, None)
+                self._dispatch()
+                self._cond.notify_all()
+        if callable(after):
+            after()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""测试公共夹具：在临时目录中创建解析器，大模型调用替换为本地函数"""
+
+import json
+import os
+import sys
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config  # noqa: E402
+
+
+def wait_until(condition, timeout: float = 10.0):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "等待超时"
+        time.sleep(0.01)
+
+
+class FakeModel:
+    """替代大模型：按记录索引返回目标列的值，记录每次调用的索引；hold 中的索引所在批次等待 release"""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.calls = []
+        self.hold = set()
+        self.held = threading.Event()
+        self.released = threading.Event()
+        self._lock = threading.Lock()
+
+    def __call__(self, prompt, log_manager=None, rule_id=None, batch_info=None):
+        indices = [str(i) for i in batch_info['record_indices']]
+        with self._lock:
+            self.calls.extend(indices)
+        if self.hold & set(indices):
+            self.held.set()
+            self.released.wait(10)
+        time.sleep(self.delay)
+        return json.dumps([{col: f"{col}-{i}" for col in batch_info['target_columns']} for i in indices],
+                          ensure_ascii=False)
+
+
+@pytest.fixture
+def make_parser(tmp_path, monkeypatch):
+    """返回创建解析器的函数（参数为要覆盖的配置项），数据与日志目录位于临时目录"""
+    data_dir = tmp_path / "data"
+    for name, path in (('DATA_DIR', data_dir), ('IMPORT_DIR', data_dir / "imports"),
+                       ('EXPORT_DIR', data_dir / "exports"), ('TEMP_DIR', data_dir / "temp"),
+                       ('LOG_DIR', tmp_path / "logs")):
+        monkeypatch.setattr(Config, name, path)
+    monkeypatch.setattr(Config, 'LOG_INDEX_ENABLED', False)
+    monkeypatch.setattr(Config, 'QUOTA_ENABLED', False)
+    monkeypatch.setattr(Config, 'TASK_DB_PATH', '')
+    Config.init_directories()
+
+    def make(**settings):
+        from excel_structured_parser import ExcelStructuredParser
+        for name, value in settings.items():
+            monkeypatch.setattr(Config, name, value)
+        return ExcelStructuredParser(api_key='test', base_dir=str(data_dir))
+
+    return make
+
+
+@pytest.fixture
+def write_input(tmp_path):
+    """写出以“编号”为索引列、“主诉”为源列的输入文件，返回文件路径"""
+    def write(prefix: str, rows: int) -> str:
+        path = tmp_path / f"{prefix}.csv"
+        pd.DataFrame({"编号": [f"{prefix}{i}" for i in range(rows)],
+                      "主诉": [f"记录{i}" for i in range(rows)]}).to_csv(path, index=False)
+        return str(path)
+
+    return write
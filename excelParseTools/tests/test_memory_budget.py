@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""内存预算与任务准入测试"""
+
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from memory_budget import MemoryBudget, MemoryBudgetExceeded  # noqa: E402
+from task_scheduler import TaskScheduler  # noqa: E402
+
+
+def _wait_until(condition, timeout: float = 5.0):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "等待超时"
+        time.sleep(0.01)
+
+
+def test_admission_waits_for_release():
+    """预算不足时队首任务等待（不越过它启动后面的任务），其他任务释放内存后自动开始"""
+    budget = MemoryBudget(1000)
+    sizes = {"big-1": 700, "big-2": 600, "small": 100}
+    started = []
+    gates = {task_id: threading.Event() for task_id in sizes}
+
+    def run(task_id):
+        started.append(task_id)
+        try:
+            gates[task_id].wait(5)
+        finally:
+            budget.release(task_id)
+
+    scheduler = TaskScheduler(run, max_running=3, provider_limits={}, default_limit=1,
+                              admit=lambda task_id: budget.try_reserve(task_id, sizes[task_id]))
+    budget.on_release(scheduler.wake)
+    scheduler.submit("big-1")
+    scheduler.submit("big-2")
+    scheduler.submit("small")
+    _wait_until(lambda: started == ["big-1"])
+    assert scheduler.is_blocked("big-2")
+    assert budget.stats()["committed_bytes"] == 700
+
+    gates["big-1"].set()
+    _wait_until(lambda: started == ["big-1", "big-2", "small"])
+    assert not scheduler.is_blocked("big-2")
+    assert budget.stats()["committed_bytes"] == 700
+    gates["big-2"].set()
+    gates["small"].set()
+    _wait_until(lambda: budget.stats()["committed_bytes"] == 0)
+
+
+def test_usage_counts_above_reservation():
+    """实际占用超过预留时按实际占用计入已提交内存；未预留的键不记账"""
+    budget = MemoryBudget(1000)
+    budget.reserve("task", 300)
+    budget.set("task", "input", 250)
+    budget.add("task", "results", 150)
+    budget.add("unreserved", "input", 500)
+    assert budget.usage("task")["used_bytes"] == 400
+    assert budget.available() == 600
+    assert budget.usage("unreserved") is None
+    assert not budget.try_reserve("other", 700)
+
+
+def test_reserve_timeout():
+    """等待超时或所需内存超过整个预算时抛出 MemoryBudgetExceeded"""
+    budget = MemoryBudget(1000, baseline_bytes=200)
+    with pytest.raises(MemoryBudgetExceeded):
+        budget.reserve("huge", 900, "导入 ")
+    budget.reserve("a", 700)
+    with pytest.raises(MemoryBudgetExceeded):
+        budget.reserve("b", 200, "导入 ", timeout=0.1)
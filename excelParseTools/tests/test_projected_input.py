@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""按列投影加载任务输入的测试"""
+
+import os
+import sys
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_readers import read_rows  # noqa: E402
+from excel_structured_parser import ExcelStructuredParser, ParsingRule  # noqa: E402
+
+
+def _parser() -> ExcelStructuredParser:
+    # 只用到按列加载与构建提示词，不需要完整初始化解析器
+    return ExcelStructuredParser.__new__(ExcelStructuredParser)
+
+
+def _import_copy(tmp_path) -> str:
+    path = str(tmp_path / "import.xlsx")
+    pd.DataFrame({"病历号": ["a1", "a2", "a3"], "主诉": ["头痛", "发热", "咳嗽"]}).set_index("病历号").to_excel(path)
+    return path
+
+
+def test_index_column_as_rule_source(tmp_path):
+    """规则的源列是索引列时，索引列同时保留为普通列，构建提示词不报错"""
+    parser = _parser()
+    rule = ParsingRule(source_column="病历号", target_columns=["科室"], prompt="按病历号前缀判断科室")
+    df = parser._load_projected_input(_import_copy(tmp_path), ["病历号", "主诉"])
+    assert list(df.index) == ["a1", "a2", "a3"]
+    assert list(df["病历号"]) == ["a1", "a2", "a3"]
+    assert "(索引: a2):\na2" in parser._build_batch_prompt(rule, df)
+
+
+def test_index_column_not_loaded_twice(tmp_path):
+    """规则不引用索引列时，索引列只作为行索引"""
+    df = _parser()._load_projected_input(_import_copy(tmp_path), ["主诉"])
+    assert list(df.columns) == ["主诉"]
+    assert list(df.index) == ["a1", "a2", "a3"]
+
+
+def _task(input_file: str, rules, index_column=None):
+    return SimpleNamespace(input_file=input_file, parsing_rules=rules, index_column=index_column)
+
+
+@pytest.mark.parametrize("suffix", [".csv", ".xlsx"])
+def test_read_rows_matches_range(tmp_path, suffix):
+    """分块任务按区间读取输入行，与整表加载后切片的结果一致（区间不从第0行开始、跨越块边界）"""
+    df = pd.DataFrame({"病历号": [f"p{i}" for i in range(23)], "主诉": [f"记录{i}" for i in range(23)]})
+    path = str(tmp_path / f"import{suffix}")
+    copy = df.set_index("病历号")
+    if suffix == ".csv":
+        copy.to_csv(path)
+    else:
+        copy.to_excel(path)
+    parser = _parser()
+    task = _task(path, [ParsingRule(source_column="主诉", target_columns=["科室"], prompt="科室")])
+    expected = parser._load_projected_input(path, ["主诉"]).iloc[7:18]
+    pd.testing.assert_frame_equal(parser._read_rows(task, 7, 18), expected)
+    assert parser._read_rows(task, 20, 30).index.tolist() == ["p20", "p21", "p22"]
+
+
+def test_read_rows_parquet_row_groups(tmp_path):
+    """Parquet按行组读取区间"""
+    pq = pytest.importorskip("pyarrow.parquet")
+    pa = pytest.importorskip("pyarrow")
+    df = pd.DataFrame({"a": range(50), "b": [f"v{i}" for i in range(50)]})
+    path = str(tmp_path / "rows.parquet")
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), path, row_group_size=8)
+    pd.testing.assert_frame_equal(read_rows(path, 13, 42, ["b"]), df[["b"]].iloc[13:42].reset_index(drop=True))
+    assert read_rows(path, 60, 70).empty
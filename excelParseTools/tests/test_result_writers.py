@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""结果流式导出测试"""
+
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from result_writers import ParquetStreamWriter  # noqa: E402
+
+pq = pytest.importorskip("pyarrow.parquet")
+
+
+def test_parquet_schema_widens_between_chunks(tmp_path):
+    """第一块全空的列后续出现文本、整数列后续出现小数时，已写出的行组按放宽后的类型重写，数值不截断"""
+    path = str(tmp_path / "out.parquet")
+    writer = ParquetStreamWriter(path)
+    writer.write(pd.DataFrame({"memo": [None, None], "score": [1, 2], "name": ["a", "b"]}))
+    writer.write(pd.DataFrame({"memo": ["x", None], "score": [1.5, 3.0], "name": ["c", "d"]}))
+    writer.write(pd.DataFrame({"memo": [None, "y"], "score": [4, 5], "name": ["e", "f"]}))
+    writer.close()
+
+    table = pq.read_table(path)
+    assert table.num_rows == 6
+    assert table.column("memo").to_pylist() == [None, None, "x", None, None, "y"]
+    assert table.column("score").to_pylist() == [1.0, 2.0, 1.5, 3.0, 4.0, 5.0]
+    assert table.column("name").to_pylist() == ["a", "b", "c", "d", "e", "f"]
+    assert os.listdir(tmp_path) == ["out.parquet"]
+
+
+def test_parquet_mixed_types_fall_back_to_string(tmp_path):
+    """同一列先为数值后为文本时写为字符串列"""
+    path = str(tmp_path / "out.parquet")
+    writer = ParquetStreamWriter(path)
+    writer.write(pd.DataFrame({"code": [1, 2]}))
+    writer.write(pd.DataFrame({"code": ["A3"]}))
+    writer.close()
+
+    assert pq.read_table(path).column("code").to_pylist() == ["1", "2", "A3"]
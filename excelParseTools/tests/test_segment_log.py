@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""检查点段日志测试"""
+
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from segment_log import SegmentLog  # noqa: E402
+
+
+def test_directory_created_on_first_append(tmp_path):
+    """只读扫描不创建段目录，第一次追加时创建，destroy 后删除"""
+    directory = tmp_path / "task_segments"
+    assert SegmentLog(str(directory)).recover(repair=False) == 0
+    assert not directory.exists()
+
+    log = SegmentLog(str(directory))
+    log.append(0, pd.DataFrame({"科室": ["内科", "外科"]}))
+    assert SegmentLog(str(directory)).recover(repair=False) == 2
+
+    log.destroy()
+    assert not directory.exists()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""任务抢占与启动恢复测试"""
+
+import time
+
+import pandas as pd
+
+from conftest import FakeModel, wait_until
+from excel_structured_parser import ParsingRule, TaskStatus
+from segment_log import SegmentLog
+
+RULES = [ParsingRule("主诉", ["科室"], "判断科室")]
+
+
+def _finished(parser, task_id) -> bool:
+    return parser.get_task_status(task_id).status in (TaskStatus.COMPLETED, TaskStatus.FAILED)
+
+
+def test_preempted_task_resumes_from_checkpoint(make_parser, write_input):
+    """高优先级任务抢占运行位置：被抢占的任务回到队列，等高优先级任务完成后从最后一个检查点继续"""
+    parser = make_parser(MAX_RUNNING_TASKS=1, TASK_EXECUTOR='inline')
+    model = FakeModel()
+    model.hold = {"L30"}
+    parser._call_api = model
+    low = parser.start_processing_task(parser.import_excel(write_input("L", 60), "编号"), RULES,
+                                       checkpoint_every=10, output_format="csv")
+    assert model.held.wait(10)
+
+    high = parser.start_processing_task(parser.import_excel(write_input("H", 20), "编号"), RULES,
+                                        checkpoint_every=10, output_format="csv", priority=5, preempt=True)
+    model.released.set()
+    wait_until(lambda: parser.get_task_status(low).status == TaskStatus.PENDING)
+    assert parser.get_task_status(low).processed_records == 40
+
+    wait_until(lambda: _finished(parser, high) and _finished(parser, low))
+    assert parser.get_task_status(low).status == TaskStatus.COMPLETED
+    # 被抢占前完成的行不重新请求，高优先级任务在被抢占任务恢复前运行
+    expected = [f"L{i}" for i in range(40)] + [f"H{i}" for i in range(20)] + [f"L{i}" for i in range(40, 60)]
+    assert model.calls == expected
+    result = pd.read_csv(parser.get_task_status(low).output_file, encoding="utf-8-sig")
+    assert result["科室"].tolist() == [f"科室-L{i}" for i in range(60)]
+
+
+def test_recover_task_with_stale_owner(make_parser, write_input):
+    """持有进程心跳超时的执行中任务在启动恢复时被接管，从段日志中的检查点继续"""
+    registrar = make_parser(TASK_EXECUTOR='external')
+    task_id = registrar.start_processing_task(registrar.import_excel(write_input("R", 30), "编号"), RULES,
+                                              checkpoint_every=10, output_format="csv")
+    meta = registrar.registry.get(task_id)
+    # 模拟崩溃的执行进程：已写出前10行的检查点，心跳停在一小时前
+    SegmentLog(meta["partial_output_file"]).append(0, pd.DataFrame({"科室": ["崩溃前"] * 10}))
+    registrar.registry._conn().execute(
+        "UPDATE tasks SET status = 'processing', owner = 'crashed-host-1', owner_seen = ? WHERE task_id = ?",
+        (time.time() - 3600, task_id))
+
+    parser = make_parser(TASK_EXECUTOR='inline')
+    model = FakeModel()
+    parser._call_api = model
+    assert parser.recover_interrupted_tasks() == [task_id]
+    wait_until(lambda: _finished(parser, task_id))
+    task = parser.get_task_status(task_id)
+    assert task.status == TaskStatus.COMPLETED
+    assert model.calls == [f"R{i}" for i in range(10, 30)]
+    result = pd.read_csv(task.output_file, encoding="utf-8-sig")
+    assert result["科室"].tolist() == ["崩溃前"] * 10 + [f"科室-R{i}" for i in range(10, 30)]
+    # 心跳未超时的任务不被接管
+    assert parser.recover_interrupted_tasks() == []
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""全局任务调度测试"""
+
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from task_scheduler import TaskScheduler  # noqa: E402
+
+
+def _wait_until(condition, timeout: float = 5.0):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "等待超时"
+        time.sleep(0.01)
+
+
+def test_priority_order():
+    """运行位置已满时，排队的任务按优先级高、提交早的顺序运行"""
+    started = []
+    gate = threading.Event()
+
+    def run(task_id):
+        started.append(task_id)
+        if task_id == "first":
+            gate.wait(5)
+
+    scheduler = TaskScheduler(run, max_running=1, provider_limits={}, default_limit=1)
+    scheduler.submit("first")
+    _wait_until(lambda: started == ["first"])
+    for task_id, priority in (("low", 0), ("high-a", 5), ("mid", 1), ("high-b", 5)):
+        scheduler.submit(task_id, priority=priority)
+    assert scheduler.queue_position("high-a") == 1
+    assert scheduler.queue_position("low") == 4
+    gate.set()
+    _wait_until(lambda: len(started) == 5)
+    assert started == ["first", "high-a", "high-b", "mid", "low"]
+
+
+def test_provider_slot_cap():
+    """同一提供方同时进行的请求数不超过上限，任务自身也不超过其线程数"""
+    lock = threading.Lock()
+    active = {"provider": 0, "peak": 0}
+    per_task_peak = {}
+
+    def run(task_id):
+        def request():
+            with scheduler.request_slot(task_id):
+                with lock:
+                    active["provider"] += 1
+                    active["peak"] = max(active["peak"], active["provider"])
+                    per_task_peak[task_id] = max(per_task_peak.get(task_id, 0),
+                                                 scheduler.stats()["tasks"][task_id]["in_flight"])
+                time.sleep(0.01)
+                with lock:
+                    active["provider"] -= 1
+
+        threads = [threading.Thread(target=lambda: [request() for _ in range(5)]) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    scheduler = TaskScheduler(run, max_running=3, provider_limits={"kimi": 3}, default_limit=1)
+    for task_id in ("a", "b", "c"):
+        scheduler.submit(task_id, max_in_flight=2, provider="kimi")
+    _wait_until(lambda: not scheduler.stats()["running"] and not scheduler.stats()["queued"], timeout=10)
+    assert active["peak"] == 3
+    assert max(per_task_peak.values()) <= 2
+
+
+def test_weighted_fair_share():
+    """两个任务争用一个请求槽位时按权重比例获得槽位"""
+    granted = {"heavy": 0, "light": 0}
+    total = 60
+    lock = threading.Lock()
+    both_running = threading.Barrier(2)
+
+    def run(task_id):
+        both_running.wait(5)
+        while True:
+            with scheduler.request_slot(task_id):
+                with lock:
+                    if sum(granted.values()) >= total:
+                        return
+                    granted[task_id] += 1
+                time.sleep(0.002)
+
+    scheduler = TaskScheduler(run, max_running=2, provider_limits={"kimi": 1}, default_limit=1)
+    scheduler.submit("heavy", weight=3, provider="kimi")
+    scheduler.submit("light", weight=1, provider="kimi")
+    _wait_until(lambda: not scheduler.stats()["running"], timeout=10)
+    # 权重 3:1，允许线程调度带来的少量偏差
+    assert 40 <= granted["heavy"] <= 50, granted
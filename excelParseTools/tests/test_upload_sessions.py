@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""分片上传会话测试"""
+
+import hashlib
+import io
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from upload_sessions import UploadError, UploadSessionManager  # noqa: E402
+
+
+def test_chunks_received_by_different_workers(tmp_path):
+    """同一会话的分片交替由两个进程（共享会话目录的两个管理器）接收，完成时哈希一致"""
+    data = os.urandom(10000)
+    workers = [UploadSessionManager(str(tmp_path / "uploads"), 1000, 10 ** 6) for _ in range(2)]
+    meta = workers[0].init("a.csv", len(data), hashlib.sha256(data).hexdigest())
+    for i, offset in enumerate(range(0, len(data), 1000)):
+        workers[i % 2].put_chunk(meta["upload_id"], offset, io.BytesIO(data[offset:offset + 1000]))
+    result = workers[0].complete(meta["upload_id"], str(tmp_path))
+    with open(result["file_path"], "rb") as f:
+        assert f.read() == data
+
+
+def test_concurrent_puts_are_serialized(tmp_path):
+    """两个管理器同时提交同一偏移量的分片，只有一个成功，另一个得到409与最新偏移量"""
+    data = os.urandom(4000)
+    workers = [UploadSessionManager(str(tmp_path / "uploads"), 2000, 10 ** 6) for _ in range(2)]
+    meta = workers[0].init("a.csv", len(data), hashlib.sha256(data).hexdigest())
+    errors = []
+
+    def put(worker):
+        try:
+            worker.put_chunk(meta["upload_id"], 0, io.BytesIO(data[:2000]))
+        except UploadError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=put, args=(w,)) for w in workers]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(errors) == 1 and errors[0].status == 409 and errors[0].offset == 2000
+    workers[1].put_chunk(meta["upload_id"], 2000, io.BytesIO(data[2000:]))
+    assert workers[0].complete(meta["upload_id"], str(tmp_path))["sha256"] == hashlib.sha256(data).hexdigest()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批次结果合并微基准
+对比旧的逐单元格 iloc 写入与按列批量写入在每个批次上的开销
+"""
+
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from excel_structured_parser import ExcelStructuredParser, ParsingRule
+
+
+def legacy_merge(result_df, batch_df, rules, rule_results, offset):
+    """旧实现：每条规则遍历两次 iterrows，再逐单元格 iloc 写入"""
+    aggregated_results = {}
+    for rule, rule_result in zip(rules, rule_results):
+        for i, (idx, _) in enumerate(batch_df.iterrows()):
+            if i < len(rule_result):
+                aggregated_results.setdefault(idx, {}).update(rule_result[i])
+    for i, (idx, _) in enumerate(batch_df.iterrows()):
+        for k, v in aggregated_results.get(idx, {}).items():
+            if k in result_df.columns:
+                result_df.iloc[offset + i, result_df.columns.get_loc(k)] = v
+
+
+def columnar_merge(parser, result_df, batch_len, rules, rule_results, offset):
+    """新实现：收集为列数组后按列一次写入"""
+    batch_columns = {}
+    for rule, rule_result in zip(rules, rule_results):
+        parser._collect_rule_results(batch_columns, rule, rule_result, batch_len)
+    parser._write_batch_results(result_df, batch_columns, offset)
+
+
+def main(total_rows: int = 20000, batch_size: int = 10, rules_count: int = 10, columns_per_rule: int = 4):
+    rules = [
+        ParsingRule(f"源列{r}", [f"字段{r}_{c}" for c in range(columns_per_rule)], "", rule_id=str(r))
+        for r in range(rules_count)
+    ]
+    target_columns = [col for rule in rules for col in rule.target_columns]
+    source_df = pd.DataFrame({rule.source_column: ["文本"] * total_rows for rule in rules},
+                             index=pd.Index([f"ID{i}" for i in range(total_rows)], name="病例编号"))
+    rule_results = [
+        [{col: f"{col}-{i}" for col in rule.target_columns} for i in range(batch_size)]
+        for rule in rules
+    ]
+    # 只使用合并相关方法，不初始化目录与日志
+    parser = ExcelStructuredParser.__new__(ExcelStructuredParser)
+    batches = total_rows // batch_size
+
+    print(f"行数: {total_rows}, 批次大小: {batch_size}, 规则数: {rules_count}, 目标列数: {len(target_columns)}")
+    timings = {}
+    for name in ("legacy", "columnar"):
+        result_df = pd.DataFrame('', index=source_df.index, columns=target_columns, dtype=object)
+        started = time.perf_counter()
+        for b in range(batches):
+            offset = b * batch_size
+            batch_df = source_df.iloc[offset:offset + batch_size]
+            if name == "legacy":
+                legacy_merge(result_df, batch_df, rules, rule_results, offset)
+            else:
+                columnar_merge(parser, result_df, len(batch_df), rules, rule_results, offset)
+        elapsed = time.perf_counter() - started
+        timings[name] = elapsed
+        print(f"{name:9} 总耗时: {elapsed:7.3f}秒, 每批次: {elapsed / batches * 1e6:8.1f}微秒, "
+              f"结果列类型: {sorted(set(str(t) for t in result_df.dtypes))}")
+    print(f"加速比: {timings['legacy'] / timings['columnar']:.1f}x")
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
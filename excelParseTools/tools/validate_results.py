@@ -9,6 +9,23 @@ import pandas as pd
 import sys
 from pathlib import Path
 
+def read_results(file_path):
+    """按扩展名读取处理结果（xlsx/csv/csv.gz/parquet/jsonl）"""
+    name = str(file_path).lower()
+    if name.endswith('.parquet'):
+        return pd.read_parquet(file_path)
+    if name.endswith('.jsonl'):
+        return pd.read_json(file_path, lines=True)
+    if name.endswith('.csv') or name.endswith('.csv.gz'):
+        return pd.read_csv(file_path)
+    return pd.read_excel(file_path)
+
+def as_numeric(series):
+    """已按列类型导出的数值列直接使用，文本列才需要解析"""
+    if pd.api.types.is_numeric_dtype(series):
+        return series
+    return pd.to_numeric(series, errors='coerce')
+
 def validate_medical_records(file_path):
     """
     验证医疗病例解析结果
@@ -22,7 +39,7 @@ def validate_medical_records(file_path):
     
     # 读取文件
     try:
-        df = pd.read_excel(file_path)
+        df = read_results(file_path)
         print(f"\n✓ 成功读取文件: {file_path}")
         print(f"  总记录数: {len(df)}")
         print(f"  总字段数: {len(df.columns)}")
@@ -85,7 +102,7 @@ def validate_medical_records(file_path):
     # 年龄验证
     if '年龄' in df.columns:
         try:
-            ages = pd.to_numeric(df['年龄'], errors='coerce')
+            ages = as_numeric(df['年龄'])
             valid_ages = (ages >= 0) & (ages <= 150)
             invalid_count = (~valid_ages & ages.notna()).sum()
             status = "✓" if invalid_count == 0 else "✗"
@@ -100,7 +117,7 @@ def validate_medical_records(file_path):
     # 体温验证
     if '体温' in df.columns:
         try:
-            temps = pd.to_numeric(df['体温'], errors='coerce')
+            temps = as_numeric(df['体温'])
             valid_temps = (temps >= 35.0) & (temps <= 42.0)
             invalid_count = (~valid_temps & temps.notna()).sum()
             status = "✓" if invalid_count == 0 else "✗"
@@ -115,7 +132,7 @@ def validate_medical_records(file_path):
     # 收缩压验证
     if '收缩压' in df.columns:
         try:
-            systolic = pd.to_numeric(df['收缩压'], errors='coerce')
+            systolic = as_numeric(df['收缩压'])
             valid_systolic = (systolic >= 60) & (systolic <= 250)
             invalid_count = (~valid_systolic & systolic.notna()).sum()
             status = "✓" if invalid_count == 0 else "✗"
@@ -130,7 +147,7 @@ def validate_medical_records(file_path):
     # 舒张压验证
     if '舒张压' in df.columns:
         try:
-            diastolic = pd.to_numeric(df['舒张压'], errors='coerce')
+            diastolic = as_numeric(df['舒张压'])
             valid_diastolic = (diastolic >= 40) & (diastolic <= 150)
             invalid_count = (~valid_diastolic & diastolic.notna()).sum()
             status = "✓" if invalid_count == 0 else "✗"
@@ -145,7 +162,7 @@ def validate_medical_records(file_path):
     # 心率验证
     if '心率' in df.columns:
         try:
-            heart_rates = pd.to_numeric(df['心率'], errors='coerce')
+            heart_rates = as_numeric(df['心率'])
             valid_hr = (heart_rates >= 40) & (heart_rates <= 200)
             invalid_count = (~valid_hr & heart_rates.notna()).sum()
             status = "✓" if invalid_count == 0 else "✗"
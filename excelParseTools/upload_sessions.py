@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分片断点续传上传
+客户端先初始化上传会话，再按偏移量顺序上传分片，分片直接追加写入磁盘，
+同时增量计算SHA-256；中断后可查询已接收的偏移量继续上传。
+会话状态全部在磁盘上，同一会话的分片可以由不同的Web工作进程接收（文件锁串行化）
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterator, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows 没有 fcntl，退化为进程内的锁
+    fcntl = None
+
+UPLOAD_BLOCK_SIZE = 1024 * 1024  # 从请求流读取并写盘的块大小
+
+
+class UploadError(ValueError):
+    """上传会话错误（status 为建议返回的HTTP状态码）"""
+
+    def __init__(self, message: str, status: int = 400, offset: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+        self.offset = offset
+
+
+class UploadSessionManager:
+    """分片上传会话管理：每个会话一个目录，包含 meta.json 与 data.part"""
+
+    def __init__(self, directory: str, chunk_size: int, max_size: int):
+        """
+        Args:
+            directory: 会话目录的父目录
+            chunk_size: 建议的分片大小（需小于 MAX_CONTENT_LENGTH）
+            max_size: 允许上传的最大文件字节数
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.chunk_size = int(chunk_size)
+        self.max_size = int(max_size)
+        self._lock = threading.Lock()
+        self._session_locks: Dict[str, threading.Lock] = {}
+        # 增量哈希缓存 {会话ID: (已计算到的偏移量, 哈希对象)}；其他进程接收了后续分片（或本进程重启）时
+        # 偏移量落后于会话的已接收字节数，从磁盘补算落后的部分
+        self._hashers: Dict[str, Tuple[int, Any]] = {}
+
+    def init(self, filename: str, total_size: int, sha256: Optional[str] = None) -> Dict[str, Any]:
+        """创建上传会话"""
+        filename = os.path.basename(filename or '')
+        if not filename:
+            raise UploadError('缺少文件名')
+        total_size = int(total_size)
+        if total_size <= 0:
+            raise UploadError('文件大小必须大于0')
+        if total_size > self.max_size:
+            raise UploadError(f'文件超过上传大小上限 {self.max_size // (1024 * 1024)}MB', status=413)
+        upload_id = uuid.uuid4().hex
+        session_dir = self.directory / upload_id
+        session_dir.mkdir()
+        meta = {
+            'upload_id': upload_id,
+            'filename': filename,
+            'total_size': total_size,
+            'chunk_size': self.chunk_size,
+            'offset': 0,
+            'expected_sha256': (sha256 or '').lower() or None,
+            'created_at': datetime.now().isoformat(),
+        }
+        (session_dir / 'data.part').touch()
+        self._save_meta(meta)
+        self._hashers[upload_id] = (0, hashlib.sha256())
+        return meta
+
+    def status(self, upload_id: str) -> Dict[str, Any]:
+        """查询会话状态（已接收的偏移量）"""
+        return self._load_meta(upload_id)
+
+    def put_chunk(self, upload_id: str, offset: int, stream: BinaryIO) -> Dict[str, Any]:
+        """
+        在指定偏移量写入一个分片
+
+        偏移量必须等于已接收的字节数；不一致时抛出409错误并带回当前偏移量，客户端据此续传。
+        """
+        with self._session_lock(upload_id):
+            meta = self._load_meta(upload_id)
+            if offset != meta['offset']:
+                raise UploadError(f"偏移量不一致: 期望 {meta['offset']}, 实际 {offset}", status=409,
+                                  offset=meta['offset'])
+            # 在副本上更新哈希，分片中途失败时不影响已确认的哈希状态
+            hasher = self._get_hasher(meta).copy()
+            data_path = self._data_path(upload_id)
+            received = meta['offset']
+            with open(data_path, 'r+b') as f:
+                # 截掉上次中断时可能写了一半的分片
+                f.truncate(received)
+                f.seek(received)
+                while True:
+                    block = stream.read(UPLOAD_BLOCK_SIZE)
+                    if not block:
+                        break
+                    received += len(block)
+                    if received > meta['total_size']:
+                        f.truncate(meta['offset'])
+                        raise UploadError('上传数据超过声明的文件大小', status=413, offset=meta['offset'])
+                    f.write(block)
+                    hasher.update(block)
+                f.flush()
+                os.fsync(f.fileno())
+            meta['offset'] = received
+            self._save_meta(meta)
+            self._hashers[upload_id] = (received, hasher)
+            return meta
+
+    def complete(self, upload_id: str, dest_dir: str) -> Dict[str, Any]:
+        """
+        完成上传：校验大小与SHA-256后把文件移动到 dest_dir，删除会话目录
+
+        Returns:
+            {'file_path': 文件路径, 'filename': 原始文件名, 'size': 字节数, 'sha256': 内容哈希}
+        """
+        with self._session_lock(upload_id):
+            meta = self._load_meta(upload_id)
+            if meta['offset'] != meta['total_size']:
+                raise UploadError(f"文件未上传完整: {meta['offset']}/{meta['total_size']}", status=409,
+                                  offset=meta['offset'])
+            digest = self._get_hasher(meta).hexdigest()
+            if meta['expected_sha256'] and digest != meta['expected_sha256']:
+                raise UploadError('文件校验失败：SHA-256不一致')
+            dest_path = Path(dest_dir) / f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{meta['filename']}"
+            os.replace(self._data_path(upload_id), dest_path)
+            self.abort(upload_id)
+            return {'file_path': str(dest_path), 'filename': meta['filename'],
+                    'size': meta['total_size'], 'sha256': digest}
+
+    def abort(self, upload_id: str):
+        """删除上传会话"""
+        self._check_id(upload_id)
+        shutil.rmtree(self.directory / upload_id, ignore_errors=True)
+        self._hashers.pop(upload_id, None)
+        with self._lock:
+            self._session_locks.pop(upload_id, None)
+
+    def _get_hasher(self, meta: Dict[str, Any]):
+        """
+        取得会话已接收数据的增量哈希对象（调用方持有会话锁）
+
+        已确认的字节不会再被改写，缓存的哈希落后于已接收的字节数时（分片由其他进程接收、服务重启）
+        只从磁盘补算落后的部分；缓存超前（不应发生）时整体重新计算。
+        """
+        upload_id = meta['upload_id']
+        hashed, hasher = self._hashers.get(upload_id, (0, None))
+        if hasher is None or hashed > meta['offset']:
+            hashed, hasher = 0, hashlib.sha256()
+        if hashed < meta['offset']:
+            remaining = meta['offset'] - hashed
+            with open(self._data_path(upload_id), 'rb') as f:
+                f.seek(hashed)
+                while remaining > 0:
+                    block = f.read(min(UPLOAD_BLOCK_SIZE, remaining))
+                    if not block:
+                        break
+                    hasher.update(block)
+                    remaining -= len(block)
+            self._hashers[upload_id] = (meta['offset'], hasher)
+        return hasher
+
+    @contextmanager
+    def _session_lock(self, upload_id: str) -> Iterator[None]:
+        """会话的跨进程排他锁：会话目录中 .lock 文件上的 flock（多个Web工作进程共享会话目录）"""
+        self._check_id(upload_id)
+        with self._lock:
+            thread_lock = self._session_locks.setdefault(upload_id, threading.Lock())
+        with thread_lock:
+            if fcntl is None:
+                yield
+                return
+            try:
+                lock_file = open(self.directory / upload_id / '.lock', 'a+b')
+            except FileNotFoundError:
+                raise UploadError('上传会话不存在', status=404)
+            try:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                yield
+            finally:
+                lock_file.close()
+
+    def _check_id(self, upload_id: str):
+        # 会话ID用于拼接路径，只允许 init 生成的十六进制ID
+        if not upload_id or not all(c in '0123456789abcdef' for c in upload_id):
+            raise UploadError('上传ID无效', status=404)
+
+    def _data_path(self, upload_id: str) -> Path:
+        return self.directory / upload_id / 'data.part'
+
+    def _load_meta(self, upload_id: str) -> Dict[str, Any]:
+        self._check_id(upload_id)
+        try:
+            with open(self.directory / upload_id / 'meta.json', 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise UploadError('上传会话不存在', status=404)
+
+    def _save_meta(self, meta: Dict[str, Any]):
+        path = self.directory / meta['upload_id'] / 'meta.json'
+        tmp_path = path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
@@ -5,13 +5,21 @@ Excel半结构化数据解析工具 - Web界面
 提供文件上传、规则配置、任务管理和结果下载功能
 """
 
-from flask import Flask, render_template, request, jsonify, send_file, redirect, url_for, Blueprint
+from flask import (Flask, render_template, request, jsonify, send_file, redirect, url_for, Blueprint, Response,
+                   stream_with_context)
 from flask_cors import CORS
 import os
 import json
 import time
+import shutil
+import mimetypes
+from urllib.parse import quote
 from datetime import datetime
 from excel_structured_parser import ExcelStructuredParser, ParsingRule
+from data_readers import is_supported
+from result_writers import OUTPUT_FORMATS
+from upload_sessions import UploadSessionManager, UploadError
+from memory_budget import MemoryBudgetExceeded, current_rss
 from logger_manager import LogManager
 import pandas as pd
 
@@ -35,8 +43,16 @@ global_log_manager = LogManager()
 
 @bp.route('/health')
 def health():
-    """健康检查接口"""
-    return jsonify({"status": "ok", "service": "excel-parse-tools"}), 200
+    """健康检查接口（附带进程内存与内存预算统计）"""
+    return jsonify({
+        "status": "ok",
+        "service": "excel-parse-tools",
+        "memory": {
+            "rss_bytes": current_rss(),
+            # 内存预算：预算、基础占用、已提交内存与各任务/导入的记账
+            "budget": parser.memory.stats()
+        }
+    }), 200
 
 @bp.route('/')
 def index():
@@ -113,7 +129,7 @@ def view_template():
 
 @bp.route('/upload', methods=['POST'])
 def upload_file():
-    """上传Excel文件"""
+    """上传数据文件（Excel/CSV/TSV/Parquet）"""
     try:
         if 'file' not in request.files:
             return jsonify({'error': '没有选择文件'}), 400
@@ -122,30 +138,131 @@ def upload_file():
         if file.filename == '':
             return jsonify({'error': '没有选择文件'}), 400
         
-        if not file.filename.endswith(('.xlsx', '.xls')):
-            return jsonify({'error': '只支持Excel文件格式(.xlsx, .xls)'}), 400
+        if not is_supported(file.filename):
+            return jsonify({'error': '只支持 .xlsx, .xls, .csv, .tsv, .parquet 格式'}), 400
         
         # 保存文件
         filename = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{file.filename}"
         file_path = os.path.join(str(parser.base_dir), "temp", filename)
         file.save(file_path)
         
-        # 导入Excel
-        index_column = request.form.get('index_column', None)
-        if index_column == '':
-            index_column = None
-        
-        import_id = parser.import_excel(file_path, index_column)
-        
-        # 获取Excel信息
-        excel_info = parser.get_excel_info(import_id)
+        return _import_uploaded_file(file_path, request.form)
         
+    except MemoryBudgetExceeded as e:
+        # 内存预算不足：稍后重试或改用分块处理
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def _import_uploaded_file(file_path, options, **extra):
+    """将已落盘的上传文件交给导入流程，返回导入结果响应"""
+    index_column = options.get('index_column', None)
+    if index_column == '':
+        index_column = None
+    sheet_name = options.get('sheet_name') or None
+    
+    # 大文件自动分块导入，也可通过 chunked=true 显式指定
+    chunked = str(options.get('chunked', '')).lower() == 'true' or os.path.getsize(file_path) > config.CHUNKED_IMPORT_THRESHOLD
+    chunk_size = config.CHUNK_SIZE if chunked else 0
+    
+    import_id = parser.import_excel(file_path, index_column, chunk_size=chunk_size, sheet_name=sheet_name)
+    
+    # 获取Excel信息
+    excel_info = parser.get_excel_info(import_id)
+    
+    return jsonify({
+        'success': True,
+        'import_id': import_id,
+        'excel_info': excel_info,
+        **extra
+    })
+
+# 分片断点续传上传：init -> PUT 分片 -> complete
+upload_sessions = UploadSessionManager(os.path.join(str(parser.base_dir), "temp", "uploads"),
+                                       chunk_size=config.UPLOAD_CHUNK_SIZE, max_size=config.MAX_UPLOAD_SIZE)
+
+def _upload_error(e):
+    body = {'error': str(e)}
+    if e.offset is not None:
+        body['offset'] = e.offset
+    return jsonify(body), e.status
+
+@bp.route('/upload/init', methods=['POST'])
+def upload_init():
+    """初始化分片上传会话，返回 upload_id 与建议的分片大小"""
+    try:
+        data = request.json or {}
+        filename = data.get('filename', '')
+        if not is_supported(filename):
+            return jsonify({'error': '只支持 .xlsx, .xls, .csv, .tsv, .parquet 格式'}), 400
+        meta = upload_sessions.init(filename, data.get('size', 0), data.get('sha256'))
         return jsonify({
             'success': True,
-            'import_id': import_id,
-            'excel_info': excel_info
+            'upload_id': meta['upload_id'],
+            'chunk_size': meta['chunk_size'],
+            'offset': meta['offset']
         })
-        
+    except UploadError as e:
+        return _upload_error(e)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/upload/<upload_id>', methods=['GET'])
+def upload_status(upload_id):
+    """查询分片上传进度（断点续传时从返回的 offset 继续）"""
+    try:
+        meta = upload_sessions.status(upload_id)
+        return jsonify({
+            'success': True,
+            'upload_id': upload_id,
+            'offset': meta['offset'],
+            'total_size': meta['total_size'],
+            'chunk_size': meta['chunk_size']
+        })
+    except UploadError as e:
+        return _upload_error(e)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/upload/<upload_id>', methods=['PUT'])
+def upload_chunk(upload_id):
+    """上传一个分片：请求体为原始字节，offset 参数为分片在文件中的起始位置"""
+    try:
+        offset = int(request.args.get('offset', -1))
+        meta = upload_sessions.put_chunk(upload_id, offset, request.stream)
+        return jsonify({
+            'success': True,
+            'offset': meta['offset'],
+            'total_size': meta['total_size']
+        })
+    except UploadError as e:
+        return _upload_error(e)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/upload/<upload_id>/complete', methods=['POST'])
+def upload_complete(upload_id):
+    """完成分片上传：校验文件并导入"""
+    try:
+        result = upload_sessions.complete(upload_id, os.path.join(str(parser.base_dir), "temp"))
+        return _import_uploaded_file(result['file_path'], request.json or {},
+                                     sha256=result['sha256'], size=result['size'])
+    except UploadError as e:
+        return _upload_error(e)
+    except MemoryBudgetExceeded as e:
+        # 内存预算不足：稍后重试或改用分块处理
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/upload/<upload_id>', methods=['DELETE'])
+def upload_abort(upload_id):
+    """取消分片上传并删除已接收的数据"""
+    try:
+        upload_sessions.abort(upload_id)
+        return jsonify({'success': True})
+    except UploadError as e:
+        return _upload_error(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -161,7 +278,7 @@ def create_rule():
         if not source_column or not target_columns or not prompt:
             return jsonify({'error': '缺少必要参数'}), 400
         
-        rule = parser.create_parsing_rule(source_column, target_columns, prompt)
+        rule = parser.create_parsing_rule(source_column, target_columns, prompt, data.get('column_types'))
         
         return jsonify({
             'success': True,
@@ -169,7 +286,8 @@ def create_rule():
                 'rule_id': rule.rule_id,
                 'source_column': rule.source_column,
                 'target_columns': rule.target_columns,
-                'prompt': rule.prompt
+                'prompt': rule.prompt,
+                'column_types': rule.column_types
             }
         })
         
@@ -185,6 +303,11 @@ def start_task():
         rules_data = data.get('rules', [])
         threads = int(data.get('threads', 1))
         checkpoint_every = int(data.get('checkpoint_every', 50))
+        chunk_size = int(data.get('chunk_size', 0) or 0)
+        output_format = data.get('output_format') or 'xlsx'
+        priority = int(data.get('priority', 0) or 0)
+        weight = float(data.get('weight', 1) or 1)
+        preempt = bool(data.get('preempt', False))
         
         if not import_id or not rules_data:
             return jsonify({'error': '缺少必要参数'}), 400
@@ -194,6 +317,14 @@ def start_task():
             return jsonify({'error': '线程数量必须在1-8之间'}), 400
         if checkpoint_every < 1 or checkpoint_every > 10000:
             return jsonify({'error': 'checkpoint_every 必须在1-10000之间'}), 400
+        if chunk_size < 0 or chunk_size > 1000000:
+            return jsonify({'error': 'chunk_size 必须在0-1000000之间（0表示不分块）'}), 400
+        if output_format not in OUTPUT_FORMATS:
+            return jsonify({'error': f"output_format 必须是 {', '.join(OUTPUT_FORMATS)} 之一"}), 400
+        if priority < -10 or priority > 10:
+            return jsonify({'error': 'priority 必须在-10到10之间'}), 400
+        if weight < 0.1 or weight > 10:
+            return jsonify({'error': 'weight 必须在0.1-10之间'}), 400
         
         # 创建解析规则对象
         parsing_rules = []
@@ -202,18 +333,25 @@ def start_task():
                 source_column=rule_data['source_column'],
                 target_columns=rule_data['target_columns'],
                 prompt=rule_data['prompt'],
-                rule_id=rule_data.get('rule_id')
+                rule_id=rule_data.get('rule_id'),
+                column_types=rule_data.get('column_types')
             )
             parsing_rules.append(rule)
         
         # 启动任务
-        task_id = parser.start_processing_task(import_id, parsing_rules, threads=threads, checkpoint_every=checkpoint_every)
+        task_id = parser.start_processing_task(import_id, parsing_rules, threads=threads, checkpoint_every=checkpoint_every, chunk_size=chunk_size,
+                                               output_format=output_format, priority=priority, weight=weight,
+                                               preempt=preempt)
         
         return jsonify({
             'success': True,
-            'task_id': task_id
+            'task_id': task_id,
+            'queue_position': parser.scheduler.queue_position(task_id)
         })
         
+    except MemoryBudgetExceeded as e:
+        # 内存预算不足：稍后重试或改用分块处理
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -225,34 +363,34 @@ def control_logging():
         action = data.get('action')
         
         if action == 'enable_llm':
-            global_log_manager.config.ENABLE_LLM_LOGGING = True
+            global_log_manager.set_option('ENABLE_LLM_LOGGING', True)
             return jsonify({'success': True, 'message': '大模型交互日志已启用'})
         elif action == 'disable_llm':
-            global_log_manager.config.ENABLE_LLM_LOGGING = False
+            global_log_manager.set_option('ENABLE_LLM_LOGGING', False)
             return jsonify({'success': True, 'message': '大模型交互日志已禁用'})
         elif action == 'enable_batch':
-            global_log_manager.config.ENABLE_BATCH_LOGGING = True
+            global_log_manager.set_option('ENABLE_BATCH_LOGGING', True)
             return jsonify({'success': True, 'message': '批次处理日志已启用'})
         elif action == 'disable_batch':
-            global_log_manager.config.ENABLE_BATCH_LOGGING = False
+            global_log_manager.set_option('ENABLE_BATCH_LOGGING', False)
             return jsonify({'success': True, 'message': '批次处理日志已禁用'})
         elif action == 'enable_detailed':
-            global_log_manager.config.ENABLE_DETAILED_LOGGING = True
+            global_log_manager.set_option('ENABLE_DETAILED_LOGGING', True)
             return jsonify({'success': True, 'message': '详细日志已启用'})
         elif action == 'disable_detailed':
-            global_log_manager.config.ENABLE_DETAILED_LOGGING = False
+            global_log_manager.set_option('ENABLE_DETAILED_LOGGING', False)
             return jsonify({'success': True, 'message': '详细日志已禁用'})
         elif action == 'enable_api_requests':
-            global_log_manager.config.LOG_API_REQUESTS = True
+            global_log_manager.set_option('LOG_API_REQUESTS', True)
             return jsonify({'success': True, 'message': 'API请求日志已启用'})
         elif action == 'disable_api_requests':
-            global_log_manager.config.LOG_API_REQUESTS = False
+            global_log_manager.set_option('LOG_API_REQUESTS', False)
             return jsonify({'success': True, 'message': 'API请求日志已禁用'})
         elif action == 'enable_api_responses':
-            global_log_manager.config.LOG_API_RESPONSES = True
+            global_log_manager.set_option('LOG_API_RESPONSES', True)
             return jsonify({'success': True, 'message': 'API响应日志已启用'})
         elif action == 'disable_api_responses':
-            global_log_manager.config.LOG_API_RESPONSES = False
+            global_log_manager.set_option('LOG_API_RESPONSES', False)
             return jsonify({'success': True, 'message': 'API响应日志已禁用'})
         else:
             return jsonify({'error': '无效的操作'}), 400
@@ -264,6 +402,8 @@ def control_logging():
 def get_logging_status():
     """获取当前日志配置状态"""
     try:
+        # 日志开关可能已被其他工作进程修改
+        global_log_manager.refresh_options()
         return jsonify({
             'enable_llm_logging': global_log_manager.config.ENABLE_LLM_LOGGING,
             'enable_batch_logging': global_log_manager.config.ENABLE_BATCH_LOGGING,
@@ -372,6 +512,41 @@ def restart_task(task_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
+@bp.route('/pause/<task_id>', methods=['POST'])
+def pause_task(task_id):
+    """暂停任务：排队中的任务移出队列，执行中的任务在下一个批次前提交检查点后停止"""
+    return _control_task(task_id, 'pause')
+
+@bp.route('/cancel/<task_id>', methods=['POST'])
+def cancel_task(task_id):
+    """取消任务，已落盘的部分结果保留（可下载或重启）"""
+    return _control_task(task_id, 'cancel')
+
+@bp.route('/preempt/<task_id>', methods=['POST'])
+def preempt_task(task_id):
+    """让执行中的任务在检查点处让出运行位置，之后自动重新排队"""
+    return _control_task(task_id, 'preempt')
+
+def _control_task(task_id, action):
+    try:
+        status = parser.control_task(task_id, action)
+        return jsonify({'success': True, 'task_id': task_id, 'status': status})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/resume/<task_id>', methods=['POST'])
+def resume_task(task_id):
+    """从检查点继续已暂停的任务"""
+    try:
+        parser.resume_task(task_id)
+        return jsonify({'success': True, 'task_id': task_id})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @bp.route('/task_status/<task_id>')
 def get_task_status(task_id):
     """获取任务状态"""
@@ -388,7 +563,14 @@ def get_task_status(task_id):
             'processed_records': task.processed_records,
             'start_time': task.start_time.isoformat(),
             'end_time': task.end_time.isoformat() if task.end_time else None,
-            'error_message': task.error_message
+            'error_message': task.error_message,
+            'checkpoint_seq': task.checkpoint_seq,
+            # 后台写入：排队中的检查点数与最早未落盘检查点的等待秒数（任务未运行时为null）
+            'writer': parser.get_writer_stats(task_id),
+            # 分布式执行：各状态的区间数/行数与持有租约的工作进程
+            'leases': parser.leases.progress(task_id) if config.EXECUTION_MODE == 'distributed' else None,
+            # 内存：预留与实际占用（按组成部分）、估算，以及是否在调度队列中等待内存（任务不在本进程时为null）
+            'memory': parser.task_memory(task_id)
         })
         
     except Exception as e:
@@ -396,30 +578,87 @@ def get_task_status(task_id):
 
 @bp.route('/tasks_list')
 def list_tasks():
-    """列出所有任务（API）"""
+    """分页列出任务（API），参数: page（从1开始）、page_size、status"""
     try:
-        tasks = parser.list_tasks()
+        page = max(int(request.args.get('page', 1)), 1)
+        page_size = min(max(int(request.args.get('page_size', 50)), 1), 1000)
+        status = request.args.get('status') or None
+        if status == 'all':
+            status = None
+        tasks = parser.list_tasks(offset=(page - 1) * page_size, limit=page_size, status=status)
+        counts = parser.task_counts()
         return jsonify({
             'success': True,
-            'tasks': tasks
+            'tasks': tasks,
+            'page': page,
+            'page_size': page_size,
+            'total': counts.get(status, 0) if status else counts['total'],
+            'counts': counts,
+            'scheduler': parser.scheduler.stats()
         })
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@bp.route('/events')
+def task_events():
+    """
+    任务事件流：默认以 SSE 推送进度、批次完成、错误与状态变化事件；参数 poll=1 时为长轮询，返回JSON
+
+    参数: after（从该事件ID之后开始，SSE 重连时取 Last-Event-ID 请求头，都没有时只推送新事件）、
+    task_id（只推送某个任务的事件）、wait（长轮询的最长等待秒数）
+    """
+    try:
+        task_id = request.args.get('task_id') or None
+        after = request.headers.get('Last-Event-ID') or request.args.get('after')
+        after = int(after) if after not in (None, '') else parser.events.last_id()
+        if request.args.get('poll'):
+            wait = min(max(float(request.args.get('wait', 25)), 0), 60)
+            events = parser.events.wait(after, wait, config.EVENT_POLL_INTERVAL, task_id)
+            return jsonify({'success': True, 'events': events, 'last_id': events[-1]['id'] if events else after})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+    def stream(last_id):
+        # 连接在 EVENT_STREAM_MAX_SECONDS 后结束，浏览器带 Last-Event-ID 自动重连，不长期占用工作线程
+        deadline = time.time() + config.EVENT_STREAM_MAX_SECONDS
+        yield f"retry: 3000\nid: {last_id}\n\n"
+        while time.time() < deadline:
+            events = parser.events.wait(last_id, min(config.EVENT_HEARTBEAT_INTERVAL, max(deadline - time.time(), 0)),
+                                        config.EVENT_POLL_INTERVAL, task_id)
+            if not events:
+                yield ": keepalive\n\n"
+                continue
+            for event in events:
+                last_id = event['id']
+                yield (f"id: {event['id']}\nevent: {event['kind']}\n"
+                       f"data: {json.dumps(event, ensure_ascii=False)}\n\n")
+    
+    return Response(stream_with_context(stream(after)), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @bp.route('/delete_task/<task_id>', methods=['DELETE'])
 def delete_task(task_id):
     """删除任务及其相关文件"""
     try:
+        # 排队中的任务先移出调度队列，执行中的任务先取消并等待停止，然后从任务注册表删除；
+        # 不在本进程中的任务（其他工作进程或执行进程中）按注册表中的元数据删除文件
+        parser.scheduler.cancel(task_id)
+        if parser.scheduler.is_scheduled(task_id):
+            parser.control_task(task_id, 'cancel')
+            if not parser.wait_stopped(task_id, 10):
+                return jsonify({'error': '任务正在停止，请稍后再删除'}), 409
+        stored_task = None if task_id in parser.tasks else parser.get_task_status(task_id)
+        parser.delete_task_record(task_id)
+        
         # 从内存中删除任务
         with parser._tasks_lock:
-            if task_id in parser.tasks:
-                task = parser.tasks[task_id]
+            if task_id in parser.tasks or stored_task is not None:
+                task = parser.tasks.get(task_id) or stored_task
                 
                 # 删除相关文件
-                import os
-                from pathlib import Path
-                
                 # 删除输出文件
                 if task.output_file and os.path.exists(task.output_file):
                     try:
@@ -427,8 +666,8 @@ def delete_task(task_id):
                     except:
                         pass
                 
-                # 删除部分结果文件
-                if task.partial_output_file and os.path.exists(task.partial_output_file):
+                # 删除旧版pickle部分结果（检查点段目录由 delete_task_record 删除）
+                if task.partial_output_file and os.path.isfile(task.partial_output_file):
                     try:
                         os.remove(task.partial_output_file)
                     except:
@@ -442,7 +681,7 @@ def delete_task(task_id):
                         pass
                 
                 # 从内存中删除
-                del parser.tasks[task_id]
+                parser.tasks.pop(task_id, None)
         
         # 删除磁盘上的进度文件（如果不在内存中）
         progress_file = parser.base_dir / "temp" / f"{task_id}_progress.json"
@@ -459,6 +698,14 @@ def delete_task(task_id):
                 os.remove(partial_file)
             except:
                 pass
+        shutil.rmtree(parser.base_dir / "temp" / f"{task_id}_segments", ignore_errors=True)
+        
+        # 删除部分结果导出的各个版本
+        for partial_export in (parser.base_dir / "exports").glob(f"partial_{task_id}_*"):
+            try:
+                os.remove(partial_export)
+            except:
+                pass
         
         return jsonify({
             'success': True,
@@ -476,7 +723,53 @@ def download_result(task_id):
         if not file_path:
             return jsonify({'error': '任务未完成或文件不存在'}), 404
         
-        return send_file(file_path, as_attachment=True)
+        return _send_export(file_path)
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def _send_export(file_path):
+    """
+    发送导出文件
+    
+    配置了 DOWNLOAD_ACCEL_PREFIX 时只返回 X-Accel-Redirect 头，由nginx用sendfile直接发送文件
+    （Range与ETag由nginx处理），不占用应用线程；否则由应用发送，支持Range分段下载与ETag条件请求。
+    """
+    file_path = os.path.abspath(file_path)
+    download_name = os.path.basename(file_path)
+    exports_dir = os.path.abspath(parser.base_dir / "exports")
+    if config.DOWNLOAD_ACCEL_PREFIX and os.path.dirname(file_path) == exports_dir:
+        response = Response(status=200, mimetype=mimetypes.guess_type(download_name)[0] or 'application/octet-stream')
+        response.headers['X-Accel-Redirect'] = config.DOWNLOAD_ACCEL_PREFIX.rstrip('/') + '/' + quote(download_name)
+        response.headers['Content-Disposition'] = f"attachment; filename*=UTF-8''{quote(download_name)}"
+        return response
+    # 导出文件写完后不再修改（部分结果按检查点序号生成新文件），客户端可凭ETag复用已下载的内容
+    return send_file(file_path, as_attachment=True, conditional=True, etag=True, max_age=0)
+
+@bp.route('/download_partial/<task_id>')
+def download_partial_result(task_id):
+    """
+    下载部分结果
+    
+    当前检查点版本已生成时直接返回；否则在后台生成，期间返回最近的旧版本，
+    没有可用版本时返回202，前端稍后重试。
+    """
+    try:
+        export = parser.get_partial_export(task_id)
+        if export['status'] == 'unavailable':
+            return jsonify({'error': '暂无可下载的部分结果'}), 404
+        if not export['file']:
+            return jsonify({
+                'success': True,
+                'status': 'pending',
+                'checkpoint_seq': export['checkpoint_seq'],
+                'message': '部分结果正在生成，请稍后再试'
+            }), 202
+        
+        response = _send_export(export['file'])
+        response.headers['X-Checkpoint-Seq'] = str(export['file_seq'])
+        response.headers['X-Partial-Stale'] = '1' if export['status'] == 'pending' else '0'
+        return response
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -494,6 +787,34 @@ def get_excel_info(import_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@bp.route('/import_sheet', methods=['POST'])
+def import_sheet():
+    """从已上传的Excel文件重新导入指定工作表"""
+    try:
+        data = request.json or {}
+        import_id = data.get('import_id')
+        sheet_name = data.get('sheet_name')
+        if not import_id or not sheet_name:
+            return jsonify({'error': '缺少 import_id 或 sheet_name'}), 400
+        meta = parser.import_meta.get(import_id)
+        if not meta:
+            return jsonify({'error': '导入ID不存在'}), 404
+        if sheet_name not in meta.get('sheets', []):
+            return jsonify({'error': f'工作表不存在: {sheet_name}'}), 400
+        chunk_size = config.CHUNK_SIZE if meta.get('chunked') else 0
+        new_import_id = parser.import_excel(meta['source_file'], data.get('index_column') or None,
+                                            chunk_size=chunk_size, sheet_name=sheet_name)
+        return jsonify({
+            'success': True,
+            'import_id': new_import_id,
+            'excel_info': parser.get_excel_info(new_import_id)
+        })
+    except MemoryBudgetExceeded as e:
+        # 内存预算不足：稍后重试或改用分块处理
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 # 新增：设置/重置索引列
 @bp.route('/set_index', methods=['POST'])
 def set_index():
@@ -504,29 +825,65 @@ def set_index():
         index_column = data.get('index_column')  # 可以为''/None 表示使用行号
         if not import_id:
             return jsonify({'error': '缺少 import_id'}), 400
-        # 读取当前DataFrame
-        if import_id not in parser.excel_data:
-            return jsonify({'error': '导入ID不存在'}), 404
-        df = parser.excel_data[import_id]
-        # 恢复索引为列，确保可以再次选择
-        df = df.reset_index()
-        # 如果指定了索引列
-        if index_column:
-            if index_column not in df.columns:
-                return jsonify({'error': f'索引列不存在: {index_column}'}), 400
-            df = df.set_index(index_column)
-        else:
-            # 使用行号作为索引
-            df = df.reset_index(drop=True)
-            df.index.name = 'Row_Index'
-        # 保存并更新内存
-        parser.excel_data[import_id] = df
-        # 覆盖导入副本，保持与内存一致
-        save_path = os.path.join(str(parser.base_dir), 'imports', f'{import_id}.xlsx')
-        df.to_excel(save_path, index=True)
+        # 只更新导入元数据，加载与导出时再应用，不改写导入副本
+        parser.set_index_column(import_id, index_column)
         # 返回最新excel信息
         info = parser.get_excel_info(import_id)
         return jsonify({'success': True, 'excel_info': info})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# 数据目录磁盘回收：按目录配额后台清理，运行中任务与仍在使用的导入所引用的文件不删除
+disk_janitor = parser.create_disk_janitor(global_log_manager)
+
+# 后台回收与中断任务的恢复只在一个进程中运行：external 模式下Web层有多个WSGI工作进程，
+# 由独立执行进程（run.py --executor）运行；本进程仍可通过接口查看占用与手动回收
+if parser.inline_execution:
+    parser.start_maintenance(disk_janitor)
+
+@bp.route('/workers')
+def list_workers():
+    """最近一个租约有效期内有心跳的分布式工作进程"""
+    try:
+        return jsonify({
+            'success': True,
+            'execution_mode': config.EXECUTION_MODE,
+            'workers': parser.leases.workers(config.LEASE_TTL)
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/quota')
+def quota_usage():
+    """各API密钥的共享配额上限与用量（含其他服务），参数: minutes（统计最近多少分钟，默认60）"""
+    try:
+        if parser.quota is None:
+            return jsonify({'success': True, 'enabled': False, 'keys': []})
+        minutes = min(max(int(request.args.get('minutes', 60)), 1), 7 * 24 * 60)
+        return jsonify({
+            'success': True,
+            'enabled': True,
+            'minutes': minutes,
+            'keys': parser.quota.usage(minutes)
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/disk_usage')
+def disk_usage():
+    """数据目录磁盘占用报告（各目录占用、被引用的占用、配额与最近一次回收结果）"""
+    try:
+        return jsonify({'success': True, **disk_janitor.report()})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/disk_usage/sweep', methods=['POST'])
+def disk_sweep():
+    """立即执行一次磁盘回收"""
+    try:
+        return jsonify({'success': True, 'sweep': disk_janitor.sweep()})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 